@@ -1,71 +1,279 @@
+import os
 import pandas as pd
 import numpy as np
-from typing import Dict, List
-import requests
+import pyarrow as pa
+from typing import Dict, List, Tuple
+
+from app.data import get_data_provider, peek_aggregate_table, rows_to_frame
+
+HISTORY_ROWS = int(os.getenv("ANALYTICS_HISTORY_ROWS", "200000"))
+# One row per day without a geo column.
+SERIES_HISTORY_ROWS = 1000
 
 #dada
-def get_covid_data_for_analysis(limit: int = 1000) -> pd.DataFrame:
+def get_covid_data_for_analysis(limit: int = SERIES_HISTORY_ROWS, max_points: int | None = None, value_col: str = 'CASES') -> pd.DataFrame:
+    """The latest ``limit`` days of ``value_col``, oldest first."""
     try:
-        response = requests.get("http://127.0.0.1:8000/covid/aggregate", 
-                              params={'date_col': 'DATE', 'value_col': 'CASES', 'limit': limit})
-        if response.status_code == 200:
-            data = response.json()
-            df = pd.DataFrame(data['rows'])
-            df['date'] = pd.to_datetime(df['date'])
-            return df
-        else:
-            return pd.DataFrame()
+        return get_data_provider().aggregate_frame('DATE', value_col, limit=limit, max_points=max_points, newest=True)
     except Exception as e:
         print(f"Error fetching data: {e}")
         return pd.DataFrame()
 
 
+def load_history(date_col: str, value_col: str, geo_col: str | None) -> Tuple[pd.DataFrame, bool]:
+    """The latest HISTORY_ROWS rows (SERIES_HISTORY_ROWS without a geo), oldest first.
+
+    Returns ``(history, truncated)``; ``truncated`` is True when the limit was
+    reached, i.e. older rows were left out. A truncated per-geo history starts
+    at its first complete day.
+    """
+    limit = HISTORY_ROWS if geo_col else SERIES_HISTORY_ROWS
+    history = get_data_provider().aggregate_frame(date_col, value_col, geo_col=geo_col, limit=limit, newest=True)
+    if history.empty:
+        raise ValueError("No data available")
+    truncated = len(history) >= limit
+    if truncated and geo_col:
+        # The cut can fall inside the earliest day, leaving only some of its geos.
+        first = history["date"].min()
+        history = history[history["date"] > first]
+    return history, truncated
+
+
+def mark_truncated(table: pa.Table, truncated: bool) -> pa.Table:
+    """Record on ``table`` that it was computed from a truncated history; cached along with it."""
+    if not truncated:
+        return table
+    return table.replace_schema_metadata({**(table.schema.metadata or {}), b"history_truncated": b"true"})
+
+
+def history_truncated(table: pa.Table) -> bool:
+    return (table.schema.metadata or {}).get(b"history_truncated") == b"true"
+
+
 def simple_forecast(df: pd.DataFrame, periods: int = 7) -> pd.DataFrame:
+    """Holt linear-trend forecast of a single ``date, value`` series; the input frame is left untouched."""
+    from app.forecast import forecast_table
+
     if df.empty:
         return df
-    
-    df = df.sort_values('date')
-    
-    df['ma_7'] = df['value'].rolling(window=7).mean()
-    
-    last_value = df['value'].iloc[-1]
-    trend = (df['value'].iloc[-1] - df['value'].iloc[0]) / len(df)
-    
-    future_dates = pd.date_range(start=df['date'].max() + pd.Timedelta(days=1), periods=periods)
-    future_values = [max(0, last_value + trend * (i + 1)) for i in range(periods)]
-    
-    return pd.DataFrame({
-        'date': future_dates,
-        'value': future_values,
-        'type': 'forecast'
-    })
-
-
-def basic_patterns(df: pd.DataFrame) -> Dict[str, any]:
+    out = forecast_table(df[['date', 'value']], periods).to_pandas()
+    out['date'] = pd.to_datetime(out['date'])
+    return out
+
+
+def forecast_cache_key(value_col: str, geo_col: str | None, periods: int, method: str, seasonal: bool, date_col: str = 'DATE') -> str:
+    return f"forecast:{date_col}:{value_col}:{geo_col}:{periods}:{method}:{int(seasonal)}"
+
+
+def peek_forecast(value_col: str = 'CASES', geo_col: str | None = None, periods: int = 7, method: str = 'holt', seasonal: bool = False) -> pa.Table | None:
+    from app.cache import get_if_fresh
+    return get_if_fresh(forecast_cache_key(value_col, geo_col, periods, method, seasonal))
+
+
+def get_forecast(
+    value_col: str = 'CASES',
+    geo_col: str | None = None,
+    periods: int = 7,
+    method: str = 'holt',
+    seasonal: bool = False,
+    date_col: str = 'DATE',
+) -> Tuple[pa.Table, bool]:
+    """Forecast every geo of ``value_col`` in one vectorized fit. Returns ``(table, cached)``."""
+    from app.cache import get_or_compute
+    from app.forecast import METHODS, forecast_table
+
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}")
+
+    def compute():
+        history, truncated = load_history(date_col, value_col, geo_col)
+        return mark_truncated(forecast_table(history, periods=periods, method=method, seasonal=seasonal), truncated)
+
+    key = forecast_cache_key(value_col, geo_col, periods, method, seasonal, date_col)
+    return get_or_compute(key, compute, ttl_seconds=300)
+
+
+def _windows(days_before_end: pd.Series, value: pd.Series) -> Dict[str, pd.Series]:
+    """Values masked to the trailing (and preceding) 7- and 14-day windows of each series."""
+    out = {}
+    for n in (7, 14):
+        out[f'cur_{n}'] = value.where(days_before_end < n, 0.0)
+        out[f'prev_{n}'] = value.where((days_before_end >= n) & (days_before_end < 2 * n), 0.0)
+    return out
+
+
+def geo_patterns(data: pa.Table | pd.DataFrame) -> pd.DataFrame:
+    """Per-geo totals, mean, max, date range, trend, 7/14-day averages and growth in one groupby pass.
+
+    Accepts a ``date[, geo], value`` Arrow table or DataFrame; without a geo
+    column the whole input is summarized as one series. Rolling averages are
+    calendar averages over each geo's own last 7/14 days, with missing days
+    counted as 0.
+    """
+    df = data.to_pandas() if isinstance(data, pa.Table) else data
+    df = pd.DataFrame({
+        'geo': df['geo'].fillna('Unknown') if 'geo' in df.columns else 'ALL',
+        'date': pd.to_datetime(df['date']),
+        'value': pd.to_numeric(df['value'], errors='coerce').astype(float),
+    }).sort_values(['geo', 'date'], kind='stable')
     if df.empty:
-        return {}
-    
-    df = df.sort_values('date')
-    
-    patterns = {
-        'total_records': len(df),
-        'date_range': {
-            'start': df['date'].min().strftime('%Y-%m-%d'),
-            'end': df['date'].max().strftime('%Y-%m-%d')
-        },
-        'total_cases': int(df['value'].sum()),
-        'avg_cases_per_day': float(df['value'].mean()),
-        'max_cases_in_day': int(df['value'].max()),
-        'trend': 'increasing' if df['value'].iloc[-1] > df['value'].iloc[0] else 'decreasing'
+        return pd.DataFrame()
+    end = df.groupby('geo', sort=False)['date'].transform('max')
+    df = df.assign(**_windows((end - df['date']).dt.days, df['value'].fillna(0.0)))
+    g = df.groupby('geo', sort=False).agg(
+        total_records=('value', 'size'),
+        start=('date', 'min'),
+        end=('date', 'max'),
+        total=('value', 'sum'),
+        mean=('value', 'mean'),
+        max=('value', 'max'),
+        first=('value', 'first'),
+        last=('value', 'last'),
+        cur_7=('cur_7', 'sum'),
+        prev_7=('prev_7', 'sum'),
+        cur_14=('cur_14', 'sum'),
+        prev_14=('prev_14', 'sum'),
+    )
+    g['trend'] = np.where(g['last'] > g['first'], 'increasing', 'decreasing')
+    for n in (7, 14):
+        g[f'avg_{n}d'] = g[f'cur_{n}'] / n
+        g[f'growth_{n}d'] = (g[f'cur_{n}'] - g[f'prev_{n}']) / g[f'prev_{n}'].where(g[f'prev_{n}'] != 0)
+    return g.drop(columns=['first', 'last', 'cur_7', 'prev_7', 'cur_14', 'prev_14']).reset_index()
+
+
+def _num(v):
+    return None if pd.isna(v) else float(v)
+
+
+def _int(v):
+    return None if pd.isna(v) else int(v)
+
+
+def _pattern_dict(row) -> Dict[str, any]:
+    return {
+        'total_records': int(row.total_records),
+        'date_range': {'start': row.start.strftime('%Y-%m-%d'), 'end': row.end.strftime('%Y-%m-%d')},
+        'total_cases': _int(row.total),
+        'avg_cases_per_day': _num(row.mean),
+        'max_cases_in_day': _int(row.max),
+        'trend': row.trend,
+        'avg_7d': _num(row.avg_7d),
+        'avg_14d': _num(row.avg_14d),
+        'growth_7d': _num(row.growth_7d),
+        'growth_14d': _num(row.growth_14d),
     }
-    
-    return patterns
 
 
-def get_analytics_summary() -> Dict[str, any]:
-    df = get_covid_data_for_analysis()
-    
+def basic_patterns(df: pd.DataFrame | pa.Table) -> Dict[str, any]:
+    """Patterns of a single ``date, value`` series (any geo column is ignored)."""
+    if len(df) == 0:
+        return {}
+    series = df.select(['date', 'value']) if isinstance(df, pa.Table) else df[['date', 'value']]
+    return _pattern_dict(next(geo_patterns(series).itertuples()))
+
+
+SUMMARY_SORTS = ('total', 'avg_7d', 'avg_14d', 'growth_7d', 'growth_14d', 'max')
+
+
+def rank_geos(patterns: pd.DataFrame, sort: str = 'total', top: int | None = None) -> List[Dict[str, any]]:
+    """geo_patterns() rows as dicts, worst-affected first by ``sort``."""
+    if sort not in SUMMARY_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(SUMMARY_SORTS)}")
+    if patterns.empty:
+        return []
+    patterns = patterns.sort_values(sort, ascending=False, na_position='last', kind='stable')
+    if top is not None:
+        patterns = patterns.head(top)
+    return [{'geo': row.geo, **_pattern_dict(row)} for row in patterns.itertuples()]
+
+
+def _series_summary(df: pd.DataFrame) -> Dict[str, any]:
     if df.empty:
         return {"error": "No data available"}
-    
-    return basic_patterns(df)
+    return {**basic_patterns(df), "truncated": len(df) >= SERIES_HISTORY_ROWS}
+
+
+def _geo_summary(summary: Tuple[pd.DataFrame, bool], cached: bool, value_col: str, geo_col: str, sort: str, top: int | None) -> Dict[str, any]:
+    patterns, truncated = summary
+    return {
+        "cached": cached,
+        "geo_col": geo_col,
+        "value_col": value_col,
+        "truncated": truncated,
+        "geos": rank_geos(patterns, sort, top),
+    }
+
+
+def summary_cache_key(value_col: str, geo_col: str, date_col: str = 'DATE') -> str:
+    return f"summary:{date_col}:{value_col}:{geo_col}"
+
+
+def peek_analytics_summary(
+    value_col: str = 'CASES',
+    geo_col: str | None = None,
+    sort: str = 'total',
+    top: int | None = None,
+) -> Dict[str, any] | None:
+    """get_analytics_summary() from the cache only, or None; cheap enough for the event loop."""
+    if not geo_col:
+        table = peek_aggregate_table('DATE', value_col, limit=SERIES_HISTORY_ROWS, newest=True)
+        return None if table is None else _series_summary(rows_to_frame(table))
+    from app.cache import get_if_fresh
+    summary = get_if_fresh(summary_cache_key(value_col, geo_col))
+    return None if summary is None else _geo_summary(summary, True, value_col, geo_col, sort, top)
+
+
+def get_analytics_summary(
+    value_col: str = 'CASES',
+    geo_col: str | None = None,
+    sort: str = 'total',
+    top: int | None = None,
+    date_col: str = 'DATE',
+) -> Dict[str, any]:
+    """Patterns of the latest history; ``truncated`` says whether older rows were left out."""
+    if not geo_col:
+        return _series_summary(get_covid_data_for_analysis(value_col=value_col))
+
+    from app.cache import get_or_compute
+
+    def compute():
+        history, truncated = load_history(date_col, value_col, geo_col)
+        return geo_patterns(history), truncated
+
+    summary, cached = get_or_compute(summary_cache_key(value_col, geo_col, date_col), compute, ttl_seconds=300)
+    return _geo_summary(summary, cached, value_col, geo_col, sort, top)
+
+
+def anomaly_cache_key(value_col: str, geo_col: str | None, window: int, min_scale: float, date_col: str = 'DATE') -> str:
+    return f"anomalies:{date_col}:{value_col}:{geo_col}:{window}:{min_scale:g}"
+
+
+def peek_anomaly_scores(value_col: str = 'CASES', geo_col: str | None = None, window: int = 28, min_scale: float = 1.0) -> pa.Table | None:
+    from app.cache import get_if_fresh
+    return get_if_fresh(anomaly_cache_key(value_col, geo_col, window, min_scale))
+
+
+def get_anomaly_scores(
+    value_col: str = 'CASES',
+    geo_col: str | None = None,
+    window: int = 28,
+    min_scale: float = 1.0,
+    date_col: str = 'DATE',
+) -> Tuple[pa.Table, bool]:
+    """Rolling median/MAD z-scores of every day of every geo. Returns ``(table, cached)``.
+
+    Rolling state outlives the cache entry, so a refresh only scores the days
+    that arrived (or were revised) since the previous run.
+    """
+    from app.anomalies import score_history
+    from app.cache import get_or_compute
+
+    if window < 3:
+        raise ValueError("window must be at least 3 days")
+    key = anomaly_cache_key(value_col, geo_col, window, min_scale, date_col)
+
+    def compute():
+        history, truncated = load_history(date_col, value_col, geo_col)
+        return mark_truncated(score_history(history, key, window=window, min_scale=min_scale), truncated)
+
+    return get_or_compute(key, compute, ttl_seconds=300)
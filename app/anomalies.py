@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import threading
+import warnings
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app.forecast import to_matrix
+
+
+# 1.4826 * MAD estimates the standard deviation of normally distributed data.
+MAD_SCALE = 1.4826
+MAX_STATES = 32
+
+_states: "OrderedDict[Tuple, RollingState]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"full_runs": 0, "incremental_runs": 0, "days_scored": 0, "days_reused": 0}
+
+
+def rolling_scores(Y: np.ndarray, window: int, min_scale: float = 1.0, start: int | None = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Robust z-scores of ``Y[:, start:]`` against each day's trailing ``window`` days.
+
+    Every row is a series. The baseline of day ``t`` is the median of days
+    ``t - window .. t - 1`` (the day itself is excluded, so a spike cannot
+    mask itself), and its spread is ``MAD_SCALE * MAD``, floored at
+    ``min_scale`` so flat stretches do not divide by zero. Missing days are
+    NaN: they are left out of the baselines and get no score themselves. All
+    windows of all rows are strided views of ``Y``; the medians are two NumPy
+    reductions. Returns ``(median, scale, z)``, each of shape ``(rows, T - start)``.
+    """
+    start = window if start is None else max(start, window)
+    rows, T = Y.shape
+    if T <= start:
+        empty = np.zeros((rows, 0))
+        return empty, empty, empty
+    windows = sliding_window_view(Y[:, start - window:T - 1], window, axis=1)
+    with warnings.catch_warnings():
+        # A window with no reported day has no baseline; NaN is the answer, not a problem.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median = np.nanmedian(windows, axis=2)
+        mad = np.nanmedian(np.abs(windows - median[:, :, None]), axis=2)
+    scale = np.maximum(MAD_SCALE * mad, min_scale)
+    return median, scale, (Y[:, start:] - median) / scale
+
+
+@dataclass
+class RollingState:
+    """Scores of every day of every series, kept so the next run only scores what changed."""
+
+    window: int
+    min_scale: float
+    dates: np.ndarray
+    geos: List[Any] | None
+    values: np.ndarray
+    median: np.ndarray
+    scale: np.ndarray
+    z: np.ndarray
+
+
+def _align(state: RollingState, dates: np.ndarray) -> RollingState:
+    """``state`` without the days before ``dates[0]``; a history window that moved forward keeps its scores."""
+    if not len(dates) or not len(state.dates) or dates[0] <= state.dates[0]:
+        return state
+    drop = int(np.searchsorted(state.dates, dates[0]))
+    if drop >= len(state.dates) or state.dates[drop] != dates[0]:
+        return state
+    values, median, scale, z = (a[:, drop:] for a in (state.values, state.median, state.scale, state.z))
+    return RollingState(state.window, state.min_scale, state.dates[drop:], state.geos, values, median, scale, z)
+
+
+def _first_changed(state: RollingState, dates: np.ndarray, geos, Y: np.ndarray) -> int:
+    """First day whose score may differ from ``state``; 0 when nothing can be reused."""
+    T_old = len(state.dates)
+    if (
+        state.geos != geos
+        or len(dates) < T_old
+        or T_old == 0
+        or dates[0] != state.dates[0]
+    ):
+        return 0
+    old, new = state.values, Y[:, :T_old]
+    same = (old == new) | (np.isnan(old) & np.isnan(new))
+    changed = np.flatnonzero(~same.all(axis=0))
+    return int(changed[0]) if changed.size else T_old
+
+
+def update_state(
+    state: RollingState | None,
+    dates: np.ndarray,
+    geos: List[Any] | None,
+    Y: np.ndarray,
+    window: int,
+    min_scale: float = 1.0,
+) -> RollingState:
+    """Score ``Y``, reusing ``state`` for every day before the first new or revised one.
+
+    A revised day changes its own score and the baselines after it, so
+    scoring restarts there; appended days cost ``O(new_days * window)`` per
+    series instead of a pass over the whole history. When the oldest days
+    have dropped out of a truncated history, the overlap is still reused.
+    """
+    rows, T = Y.shape
+    reuse = 0
+    if state is not None and state.window == window and state.min_scale == min_scale:
+        state = _align(state, dates)
+        reuse = _first_changed(state, dates, geos, Y)
+    start = max(reuse, window)
+    median, scale, z = (np.full((rows, T), np.nan) for _ in range(3))
+    if reuse:
+        keep = min(start, len(state.dates))
+        median[:, :keep], scale[:, :keep], z[:, :keep] = state.median[:, :keep], state.scale[:, :keep], state.z[:, :keep]
+    m, s, zz = rolling_scores(Y, window, min_scale, start)
+    median[:, start:], scale[:, start:], z[:, start:] = m, s, zz
+    with _lock:
+        _stats["incremental_runs" if reuse else "full_runs"] += 1
+        _stats["days_scored"] += max(T - start, 0)
+        _stats["days_reused"] += max(start - window, 0) if reuse else 0
+    return RollingState(window, min_scale, dates, geos, Y, median, scale, z)
+
+
+def score_history(data: pa.Table | pd.DataFrame, key: Tuple, window: int = 28, min_scale: float = 1.0) -> pa.Table:
+    """Score a ``date[, geo], value`` history, continuing from the state kept under ``key``.
+
+    Returns every reported day as ``date[, geo], value, median, z``; ``z`` is
+    null for the first ``window`` days of the axis. Days a series did not
+    report, including those after its last report, are neither scored nor
+    counted as zeros in later baselines.
+    """
+    dates, geos, Y = to_matrix(data, fill=np.nan)
+    with _lock:
+        previous = _states.get(key)
+    state = update_state(previous, dates, geos, Y, window, min_scale)
+    with _lock:
+        _states[key] = state
+        _states.move_to_end(key)
+        while len(_states) > MAX_STATES:
+            _states.popitem(last=False)
+    return scores_table(state)
+
+
+def scores_table(state: RollingState) -> pa.Table:
+    rows, T = state.values.shape
+    columns = {"date": pa.array(np.tile(state.dates, rows))}
+    if state.geos is not None:
+        columns["geo"] = pa.array(np.repeat(np.array(state.geos, dtype=object), T))
+    for name in ("values", "median", "z"):
+        flat = getattr(state, name).ravel()
+        columns["value" if name == "values" else name] = pa.array(flat, mask=np.isnan(flat))
+    return pa.table(columns).filter(pa.array(~np.isnan(state.values.ravel())))
+
+
+def anomalies(scores: pa.Table, threshold: float = 3.5, since: Any = None) -> pa.Table:
+    """Days with ``|z| >= threshold`` as ``date[, geo], value, median, z, kind`` (``spike`` or ``drop``)."""
+    mask = pc.greater_equal(pc.abs(scores["z"]), threshold)
+    if since is not None:
+        mask = pc.and_kleene(mask, pc.greater_equal(scores["date"], pa.scalar(since, scores["date"].type)))
+    out = scores.filter(mask)
+    kind = pc.if_else(pc.greater(out["z"], 0), "spike", "drop")
+    return out.append_column("kind", kind)
+
+
+def suggest_annotations(found: pa.Table, value_col: str, existing: List[Dict[str, Any]] = ()) -> List[Dict[str, Any]]:
+    """One annotation per anomaly, in the hand-written ``geo: Spike`` style, minus those already stored."""
+    seen = {(a.get("geo"), a.get("text")) for a in existing}
+    out = []
+    for row in found.to_pylist():
+        geo = row.get("geo") or "ALL"
+        text = (
+            f"{row['kind'].capitalize()}: {value_col} {row['value']:g} on {row['date']:%Y-%m-%d} "
+            f"vs median {row['median']:g} (z={row['z']:.1f})"
+        )
+        if (geo, text) not in seen:
+            seen.add((geo, text))
+            out.append({"geo": geo, "text": text, "author": "anomaly-detector"})
+    return out
+
+
+def anomaly_stats() -> Dict[str, Any]:
+    with _lock:
+        return dict(_stats, states=len(_states))
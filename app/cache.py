@@ -1,25 +1,516 @@
 from __future__ import annotations
 
+import heapq
+import os
+import sys
+import threading
 import time
-from typing import Any, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
 
+from app.metrics import cache_result, observe_stage, refresh_result, timed
 
-_store: Dict[str, Tuple[float, Any]] = {}
 
+_SAMPLE = 32
 
-def set_with_ttl(key: str, value: Any, ttl_seconds: int = 300) -> None:
-    expires_at = time.time() + ttl_seconds
-    _store[key] = (expires_at, value)
+
+def _approx_size(value: Any, _depth: int = 0) -> int:
+    """Cheap byte estimate; large containers are sampled rather than walked in full."""
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):
+        try:
+            return int(value.memory_usage(deep=True).sum())
+        except Exception:
+            pass
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    size = sys.getsizeof(value)
+    if _depth > 3:
+        return size
+    if isinstance(value, dict):
+        items = list(value.items())[:_SAMPLE]
+        if items:
+            part = sum(_approx_size(k, _depth + 1) + _approx_size(v, _depth + 1) for k, v in items)
+            size += part * len(value) // len(items)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = list(islice(value, _SAMPLE))
+        if items:
+            part = sum(_approx_size(v, _depth + 1) for v in items)
+            size += part * len(value) // len(items)
+    return size
+
+
+class _Entry:
+    __slots__ = ("stale_at", "expires_at", "value", "size", "refresh", "ttl", "grace", "uses", "retry_at")
+
+    def __init__(self, stale_at: float, expires_at: float, value: Any, size: int,
+                 refresh: Callable[[], Any] | None = None, ttl: float = 0.0, grace: float = 0.0):
+        self.stale_at = stale_at
+        self.expires_at = expires_at
+        self.value = value
+        self.size = size
+        self.refresh = refresh
+        self.ttl = ttl
+        self.grace = grace
+        self.uses = 0
+        self.retry_at = 0.0
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+
+class TTLCache:
+    """Thread-safe LRU cache bounded by entry count and an approximate byte budget.
+
+    Expired entries are dropped lazily on read and by a background sweeper.
+    ``get_or_compute`` coalesces concurrent misses so only one caller runs the
+    computation for a given key while the others wait for its result.
+
+    Entries that know how to recompute themselves (``refresh``) get a soft and
+    a hard TTL: after ``ttl_seconds`` they are stale, but are still served for
+    another ``stale_seconds`` while a background worker refreshes them. A failed
+    refresh keeps the stale value and is retried after ``refresh_backoff``. A
+    scheduler also refreshes the ``refresh_top_n`` most-used keys that would go
+    stale before its next tick. Refreshes go to ``refresh_submit`` (the app
+    passes the bounded warehouse executor) or else a small private pool.
+
+    Callers waiting on another caller's computation give up after
+    ``wait_timeout`` seconds with :class:`TimeoutError`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 256 * 1024 * 1024,
+        sweep_interval: float = 60.0,
+        stale_seconds: float = 0.0,
+        refresh_interval: float = 0.0,
+        refresh_top_n: int = 20,
+        refresh_workers: int = 2,
+        refresh_backoff: float = 30.0,
+        refresh_submit: Callable[[Callable[[], Any]], Any] | None = None,
+        wait_timeout: float | None = None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.stale_seconds = stale_seconds
+        self.refresh_interval = refresh_interval
+        self.refresh_top_n = refresh_top_n
+        self.refresh_workers = refresh_workers
+        self.refresh_backoff = refresh_backoff
+        self.refresh_submit = refresh_submit
+        self.wait_timeout = wait_timeout
+
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, _Flight] = {}
+        self._sweeper: threading.Thread | None = None
+        self._scheduler: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._refresh_pool: ThreadPoolExecutor | None = None
+        self._refreshing: set = set()
+        self._refresh_log: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._coalesced = 0
+        self._stale_served = 0
+        self._refreshes = 0
+        self._refresh_failures = 0
+        self._wait_timeouts = 0
+
+    def _drop(self, key: str) -> None:
+        entry = self._data.pop(key)
+        self._bytes -= entry.size
+
+    def _lookup(self, key: str, touch: bool = True) -> Tuple[Any | None, bool]:
+        """``(value, needs_refresh)``; the value is None when missing or past its hard TTL.
+
+        Without ``touch`` the entry's recency, use count and stale counter are left alone.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return None, False
+        now = time.time()
+        if now > entry.expires_at:
+            self._drop(key)
+            self._expirations += 1
+            return None, False
+        if not touch:
+            return entry.value, False
+        self._data.move_to_end(key)
+        entry.uses += 1
+        if now <= entry.stale_at:
+            return entry.value, False
+        self._stale_served += 1
+        return entry.value, now >= entry.retry_at
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            value, stale = self._lookup(key)
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        if stale:
+            self.refresh_async(key)
+        return value
+
+    def peek(self, key: str) -> Any | None:
+        """Like :meth:`get`, but a miss is not counted.
+
+        For callers that follow a miss with :meth:`get_or_compute` (or compute
+        the value and count the miss themselves), so one request is one miss.
+        """
+        with self._lock:
+            value, stale = self._lookup(key)
+            if value is not None:
+                self._hits += 1
+        if stale:
+            self.refresh_async(key)
+        return value
+
+    def peek_all(self, keys: List[str]) -> List[Any] | None:
+        """Values of every key in ``keys``, or None, counting nothing, when any of them is missing."""
+        with self._lock:
+            if any(self._lookup(k, touch=False)[0] is None for k in keys):
+                return None
+        values = [self.peek(k) for k in keys]
+        return None if any(v is None for v in values) else values
+
+    def record_misses(self, count: int = 1) -> None:
+        """Count misses for values the caller computed and stored with :meth:`set` itself."""
+        with self._lock:
+            self._misses += count
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl_seconds: float = 300,
+        refresh: Callable[[], Any] | None = None,
+        stale_seconds: float | None = None,
+    ) -> None:
+        """Store ``value``; with ``refresh`` it may be served stale for ``stale_seconds`` past its TTL."""
+        size = _approx_size(value)
+        grace = (self.stale_seconds if stale_seconds is None else stale_seconds) if refresh is not None else 0.0
+        now = time.time()
+        with self._lock:
+            uses = 0
+            if key in self._data:
+                uses = self._data[key].uses
+                self._drop(key)
+            if size > self.max_bytes:
+                return
+            entry = _Entry(now + ttl_seconds, now + ttl_seconds + grace, value, size, refresh, ttl_seconds, grace)
+            entry.uses = uses
+            self._data[key] = entry
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self._evictions += 1
+        self._ensure_sweeper()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+
+    def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        ttl_seconds: float = 300,
+        stale_seconds: float | None = None,
+    ) -> Tuple[Any, bool]:
+        """Return ``(value, cached)``; ``cached`` is False only for the caller that computed it.
+
+        ``compute`` is kept with the entry and reused for background refreshes.
+        """
+        with self._lock:
+            value, stale = self._lookup(key)
+            if value is not None:
+                self._hits += 1
+        if value is not None:
+            if stale:
+                self.refresh_async(key)
+            return value, True
+        with self._lock:
+            self._misses += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            if not flight.done.wait(self.wait_timeout):
+                with self._lock:
+                    self._wait_timeouts += 1
+                raise TimeoutError(f"Timed out waiting for {key!r} to be computed")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, True
+
+        try:
+            value = compute()
+            if value is not None:
+                self.set(key, value, ttl_seconds, refresh=compute, stale_seconds=stale_seconds)
+            flight.value = value
+            return value, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def refresh_async(self, key: str) -> bool:
+        """Recompute ``key`` in the background unless it is already being computed."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry.refresh is None or key in self._refreshing or key in self._inflight:
+                return False
+            self._refreshing.add(key)
+            submit = self.refresh_submit
+            if submit is None:
+                if self._refresh_pool is None:
+                    self._refresh_pool = ThreadPoolExecutor(max_workers=self.refresh_workers, thread_name_prefix="cache-refresh")
+                submit = self._refresh_pool.submit
+        try:
+            submit(self._refresh, key, entry.refresh, entry.ttl, entry.grace)
+        except Exception as e:
+            # Pool shut down (application stopping) or the warehouse queue is full: keep serving stale.
+            with self._lock:
+                self._refreshing.discard(key)
+                entry.retry_at = time.time() + getattr(e, "retry_after", self.refresh_backoff)
+            return False
+        return True
+
+    def _refresh(self, key: str, compute: Callable[[], Any], ttl: float, grace: float) -> None:
+        started = time.perf_counter()
+        error = None
+        try:
+            value = compute()
+            if value is not None:
+                self.set(key, value, ttl, refresh=compute, stale_seconds=grace)
+        except Exception as e:
+            error = e
+        finally:
+            elapsed = time.perf_counter() - started
+            self._record_refresh(key, elapsed, error)
+
+    def _record_refresh(self, key: str, seconds: float, error: BaseException | None) -> None:
+        now = time.time()
+        with self._lock:
+            self._refreshing.discard(key)
+            log = self._refresh_log.pop(key, None) or {
+                "refreshes": 0, "failures": 0, "total_seconds": 0.0, "last_seconds": None,
+                "last_refreshed_at": None, "last_failed_at": None, "last_error": None,
+            }
+            self._refresh_log[key] = log
+            while len(self._refresh_log) > self.max_entries:
+                self._refresh_log.popitem(last=False)
+            log["last_seconds"] = round(seconds, 4)
+            if error is None:
+                self._refreshes += 1
+                log["refreshes"] += 1
+                log["total_seconds"] += seconds
+                log["last_refreshed_at"] = now
+            else:
+                # Keep serving the stale value; try again after the backoff.
+                self._refresh_failures += 1
+                log["failures"] += 1
+                log["last_failed_at"] = now
+                log["last_error"] = str(error)
+                entry = self._data.get(key)
+                if entry is not None:
+                    entry.retry_at = now + self.refresh_backoff
+        observe_stage("cache_refresh", seconds)
+        refresh_result(key, error is None)
+
+    def refresh_hot(self) -> List[str]:
+        """Refresh the most-used refreshable keys that go stale before the next scheduler tick.
+
+        Use counts are halved on every call so "most used" follows recent traffic.
+        """
+        now = time.time()
+        horizon = now + max(self.refresh_interval, 0.0)
+        with self._lock:
+            used = [(e.uses, k) for k, e in self._data.items() if e.refresh is not None and e.uses > 0]
+            hot = heapq.nlargest(self.refresh_top_n, used)
+            due = [k for _, k in hot if self._data[k].stale_at <= horizon and now >= self._data[k].retry_at]
+            for e in self._data.values():
+                e.uses //= 2
+        return [k for k in due if self.refresh_async(k)]
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh_hot()
+            except Exception:
+                pass
+
+    def sweep(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [k for k, e in self._data.items() if now > e.expires_at]
+            for k in expired:
+                self._drop(k)
+            self._expirations += len(expired)
+        return len(expired)
+
+    def _sweep_loop(self) -> None:
+        while not self._stop.wait(self.sweep_interval):
+            self.sweep()
+
+    def _ensure_sweeper(self) -> None:
+        want_sweeper = self._sweeper is None and self.sweep_interval > 0
+        want_scheduler = self._scheduler is None and self.refresh_interval > 0
+        if not (want_sweeper or want_scheduler):
+            return
+        with self._lock:
+            self._stop.clear()
+            if self._sweeper is None and self.sweep_interval > 0:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="cache-sweeper", daemon=True)
+                self._sweeper.start()
+            if self._scheduler is None and self.refresh_interval > 0:
+                self._scheduler = threading.Thread(target=self._refresh_loop, name="cache-refresh-scheduler", daemon=True)
+                self._scheduler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for attr in ("_sweeper", "_scheduler"):
+            thread = getattr(self, attr)
+            setattr(self, attr, None)
+            if thread is not None:
+                thread.join(timeout=1)
+        pool, self._refresh_pool = self._refresh_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "coalesced_waits": self._coalesced,
+                "inflight": len(self._inflight),
+                "stale_served": self._stale_served,
+                "refreshes": self._refreshes,
+                "refresh_failures": self._refresh_failures,
+                "refreshing": len(self._refreshing),
+                "wait_timeouts": self._wait_timeouts,
+            }
+
+    def refresh_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-key refresh counts, durations and last failure, most recently refreshed last."""
+        with self._lock:
+            out = {}
+            for key, log in self._refresh_log.items():
+                row = dict(log)
+                total = row.pop("total_seconds")
+                row["avg_seconds"] = round(total / row["refreshes"], 4) if row["refreshes"] else None
+                entry = self._data.get(key)
+                row["stale"] = entry is not None and time.time() > entry.stale_at
+                out[key] = row
+            return out
+
+
+def _submit_to_warehouse(fn: Callable[..., Any], *args: Any) -> Any:
+    # Background refreshes query Snowflake, so they share the request path's concurrency limit.
+    from app.executor import get_executor
+    return get_executor().submit(fn, *args)[0]
+
+
+_cache = TTLCache(
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+    sweep_interval=float(os.getenv("CACHE_SWEEP_SECONDS", "60")),
+    stale_seconds=float(os.getenv("CACHE_STALE_SECONDS", "3600")),
+    refresh_interval=float(os.getenv("CACHE_REFRESH_SECONDS", "30")),
+    refresh_top_n=int(os.getenv("CACHE_REFRESH_TOP_N", "20")),
+    refresh_backoff=float(os.getenv("CACHE_REFRESH_BACKOFF_SECONDS", "30")),
+    refresh_submit=_submit_to_warehouse,
+    wait_timeout=float(os.getenv("CACHE_WAIT_SECONDS", "120")),
+)
+
+
+def set_with_ttl(key: str, value: Any, ttl_seconds: int = 300, refresh: Callable[[], Any] | None = None) -> None:
+    _cache.set(key, value, ttl_seconds, refresh=refresh)
 
 
 def get_if_fresh(key: str) -> Any | None:
-    entry = _store.get(key)
-    if not entry:
-        return None
-    expires_at, value = entry
-    if time.time() > expires_at:
-        _store.pop(key, None)
-        return None
+    """Cached value if fresh or still within its stale window; a stale read starts a background refresh.
+
+    Only hits are counted: a miss here is always followed by get_or_compute()
+    (or record_misses()), which records it.
+    """
+    with timed("cache_lookup"):
+        value = _cache.peek(key)
+    if value is not None:
+        cache_result(key, True)
     return value
 
 
+def get_all_if_fresh(keys: List[str]) -> List[Any] | None:
+    """get_if_fresh() for every key, or None without counting anything when one of them is missing."""
+    with timed("cache_lookup"):
+        values = _cache.peek_all(keys)
+    if values is not None:
+        for key in keys:
+            cache_result(key, True)
+    return values
+
+
+def record_misses(keys: List[str]) -> None:
+    """Count misses for keys the caller computes and stores with set_with_ttl() itself."""
+    _cache.record_misses(len(keys))
+    for key in keys:
+        cache_result(key, False)
+
+
+def get_or_compute(key: str, compute: Callable[[], Any], ttl_seconds: int = 300) -> Tuple[Any, bool]:
+    value, cached = _cache.get_or_compute(key, compute, ttl_seconds)
+    cache_result(key, cached)
+    return value, cached
+
+
+def cache_stats() -> Dict[str, Any]:
+    return _cache.stats()
+
+
+def refresh_stats() -> Dict[str, Dict[str, Any]]:
+    return _cache.refresh_stats()
+
+
+def stop_sweeper() -> None:
+    _cache.stop()
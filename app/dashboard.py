@@ -2,12 +2,101 @@ import dash
 from dash import dcc, html, Input, Output
 import plotly.graph_objs as go
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
+import pyarrow as pa
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 
 app = dash.Dash(__name__, title="COVID-19 Dashboard")
 API_BASE = os.getenv("API_BASE", "http://127.0.0.1:8000")
+MEMO_TTL = float(os.getenv("DASH_MEMO_SECONDS", "300"))
+MAX_POINTS = int(os.getenv("DASH_MAX_POINTS", "1500"))
+
+# One keep-alive connection pool shared by every callback thread.
+_http = requests.Session()
+_http.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+_http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+_fetch_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="dash-fetch")
+
+_memo: dict = {}
+_memo_lock = threading.Lock()
+# Last ETag and frame per request, so an expired memo entry is revalidated with a 304 instead of re-downloaded.
+_validated: dict = {}
+
+
+def _get_frame(path: str, params: dict | None = None) -> pd.DataFrame:
+    params = {**(params or {}), 'format': 'arrow'}
+    key = (path, tuple(sorted(params.items())))
+    with _memo_lock:
+        hit = _validated.get(key)
+    headers = {'If-None-Match': hit[0]} if hit else {}
+    resp = _http.get(f"{API_BASE}{path}", params=params, headers=headers, timeout=8)
+    if resp.status_code == 304 and hit:
+        return hit[1].copy()
+    resp.raise_for_status()
+    frame = pa.ipc.open_stream(resp.content).read_all().to_pandas()
+    if resp.headers.get('ETag'):
+        with _memo_lock:
+            _validated[key] = (resp.headers['ETag'], frame.copy())
+    return frame
+
+
+def _memoized(key, loader):
+    """Return a fresh memoized value, or load it; a metric viewed before never hits the API again within MEMO_TTL."""
+    now = time.time()
+    with _memo_lock:
+        hit = _memo.get(key)
+    if hit and now - hit[0] < MEMO_TTL:
+        return hit[1]
+    value = loader()
+    with _memo_lock:
+        _memo[key] = (now, value)
+    return value
+
+
+def _load_daily(value_col: str) -> pd.DataFrame:
+    ts_df = _get_frame('/covid/aggregate', {'date_col': 'DATE', 'value_col': value_col, 'limit': 20000, 'max_points': MAX_POINTS})
+    if not ts_df.empty:
+        ts_df['date'] = pd.to_datetime(ts_df['date'])
+        ts_df = ts_df.sort_values('date')
+    return ts_df
+
+
+def _load_monthly(value_col: str) -> pd.DataFrame:
+    ts_m = _get_frame('/covid/aggregate', {'date_col': 'DATE', 'value_col': value_col, 'grain': 'month', 'limit': 20000})
+    if not ts_m.empty:
+        ts_m = ts_m.rename(columns={'date': 'MONTH', 'value': 'MONTHLY_VALUE'})
+        ts_m['MONTH'] = pd.to_datetime(ts_m['MONTH'])
+    return ts_m
+
+
+def _load_mobility() -> pd.DataFrame:
+    mob_df = _get_frame('/eda/mobility')
+    if not mob_df.empty and 'MONTH' in mob_df.columns:
+        mob_df['MONTH'] = pd.to_datetime(mob_df['MONTH'])
+    return mob_df
+
+
+def load_frames(value_col: str):
+    """Daily series, monthly series and mobility, fetched concurrently on a memo miss."""
+    daily = _fetch_pool.submit(_memoized, ('daily', value_col), lambda: _load_daily(value_col))
+    monthly = _fetch_pool.submit(_memoized, ('monthly', value_col), lambda: _load_monthly(value_col))
+    mobility = _fetch_pool.submit(_memoized, 'mobility', _load_mobility)
+    return daily.result(), monthly.result(), mobility.result()
+
+
+def _error_figure(text: str) -> go.Figure:
+    fig = go.Figure()
+    fig.add_annotation(text=text, showarrow=False)
+    return fig
+
+
+def _pct(values: pd.Series) -> list:
+    return ['N/A' if pd.isna(v) else f"{v:.1f}%" for v in values]
 
 
 app.layout = html.Div([
@@ -23,6 +112,9 @@ app.layout = html.Div([
         )
     ], style={'display': 'flex', 'gap': '12px', 'justifyContent': 'center', 'marginBottom': '16px'}),
 
+    # Fires once on page load so the mobility chart, which does not depend on the dropdown, renders only once.
+    dcc.Store(id='page-load', data=0),
+
     dcc.Graph(id='cases-chart'),
     dcc.Graph(id='mobility-chart'),
 
@@ -34,10 +126,32 @@ app.layout = html.Div([
 ])
 
 
+@app.callback(Output('mobility-chart', 'figure'), [Input('page-load', 'data')])
+def render_mobility(_):
+    try:
+        mob_df = _memoized('mobility', _load_mobility)
+        mobility_fig = go.Figure()
+        if not mob_df.empty and 'MONTH' in mob_df.columns:
+            for col, name, color in [
+                ('RETAIL', 'Retail & Recreation', '#3498db'),
+                ('WORKPLACES', 'Workplaces', '#2ecc71'),
+                ('RESIDENTIAL', 'Residential', '#f39c12'),
+            ]:
+                if col in mob_df.columns:
+                    mobility_fig.add_trace(go.Scatter(
+                        x=mob_df['MONTH'], y=mob_df[col], mode='lines', name=name, line=dict(dash='dot', color=color)
+                    ))
+        mobility_fig.update_layout(title="Mobility Trends (%)", xaxis_title='Month', yaxis_title='Change (%)', hovermode='x unified')
+        return mobility_fig
+    except requests.exceptions.RequestException:
+        return _error_figure(f"API not reachable at {API_BASE}. Start API or set API_BASE.")
+    except Exception as e:
+        return _error_figure(f"Error: {e}")
+
+
 @app.callback(
     [
         Output('cases-chart', 'figure'),
-        Output('mobility-chart', 'figure'),
         Output('mobility-summary', 'children'),
         Output('mobility-table', 'children'),
     ],
@@ -45,22 +159,7 @@ app.layout = html.Div([
 )
 def render_chart(value_col: str):
     try:
-        ts_resp = requests.get(
-            f"{API_BASE}/covid/aggregate",
-            params={'date_col': 'DATE', 'value_col': value_col, 'limit': 20000},
-            timeout=8,
-        )
-        ts_resp.raise_for_status()
-        ts = ts_resp.json()
-        ts_df = pd.DataFrame(ts.get('rows', []))
-        if not ts_df.empty:
-            ts_df['date'] = pd.to_datetime(ts_df['date'])
-            ts_df = ts_df.sort_values('date')
-
-        mob_resp = requests.get(f"{API_BASE}/eda/mobility", timeout=8)
-        mob_resp.raise_for_status()
-        mob = mob_resp.json()
-        mob_df = pd.DataFrame(mob.get('rows', []))
+        ts_df, ts_m, mob_df = load_frames(value_col)
 
         cases_fig = go.Figure()
         if not ts_df.empty:
@@ -69,28 +168,11 @@ def render_chart(value_col: str):
             ))
         cases_fig.update_layout(title=f"{value_col} Over Time", xaxis_title='Date', yaxis_title=value_col, hovermode='x unified')
 
-        mobility_fig = go.Figure()
-        if not mob_df.empty and 'MONTH' in mob_df.columns:
-            mob_df['MONTH'] = pd.to_datetime(mob_df['MONTH'])
-            for col, name, color in [
-                ('RETAIL', 'Retail & Recreation', '#3498db'),
-                ('WORKPLACES', 'Workplaces', '#2ecc71'),
-                ('RESIDENTIAL', 'Residential', '#f39c12'),
-            ]:
-                if col in mob_df.columns:
-                    mobility_fig.add_trace(go.Scatter(
-                        x=mob_df['MONTH'], y=mob_df[col], mode='lines', name=name, line=dict(dash='dot', color=color)
-                    ))
-        mobility_fig.update_layout(title="Mobility Trends (%)", xaxis_title='Month', yaxis_title='Change (%)', hovermode='x unified')
-
         summary = html.Span("")
         table_comp = html.Span("")
 
         try:
-            if not ts_df.empty and not mob_df.empty:
-                ts_m = ts_df.set_index('date').resample('MS').sum(numeric_only=True).reset_index()
-                ts_m = ts_m.rename(columns={'date': 'MONTH', 'value': 'MONTHLY_VALUE'})
-                ts_m['MONTH'] = pd.to_datetime(ts_m['MONTH'])
+            if not ts_m.empty and not mob_df.empty:
                 merged = pd.merge(ts_m, mob_df, on='MONTH', how='left')
 
                 mobility_cols = [c for c in ['RETAIL','WORKPLACES','RESIDENTIAL'] if c in merged.columns]
@@ -107,21 +189,16 @@ def render_chart(value_col: str):
                 summary_text = " | ".join(corr_parts) or "No correlation available"
                 summary = html.Div([html.Strong("Correlation (monthly value vs mobility): "), summary_text])
 
-                keep_cols = ['MONTH','MONTHLY_VALUE'] + mobility_cols
-                view = merged[keep_cols].copy()
-                for col in ['RETAIL','WORKPLACES','RESIDENTIAL']:
-                    if col in view.columns:
-                        view[col] = view[col].map(lambda v: None if pd.isna(v) else round(float(v),1))
-                view = view.tail(12)
-                rows = []
-                for _, r in view.iterrows():
-                    rows.append(html.Tr([
-                        html.Td(r['MONTH'].strftime('%Y-%m')),
-                        html.Td(f"{int(r['MONTHLY_VALUE']):,}" if pd.notna(r['MONTHLY_VALUE']) else 'N/A'),
-                        html.Td('N/A' if 'RETAIL' not in r or pd.isna(r.get('RETAIL')) else f"{r['RETAIL']:.1f}%"),
-                        html.Td('N/A' if 'WORKPLACES' not in r or pd.isna(r.get('WORKPLACES')) else f"{r['WORKPLACES']:.1f}%"),
-                        html.Td('N/A' if 'RESIDENTIAL' not in r or pd.isna(r.get('RESIDENTIAL')) else f"{r['RESIDENTIAL']:.1f}%"),
-                    ]))
+                view = merged.tail(12)
+                missing = pd.Series([float('nan')] * len(view), index=view.index)
+                columns = [
+                    view['MONTH'].dt.strftime('%Y-%m').tolist(),
+                    ['N/A' if pd.isna(v) else f"{int(v):,}" for v in view['MONTHLY_VALUE']],
+                    _pct(view.get('RETAIL', missing)),
+                    _pct(view.get('WORKPLACES', missing)),
+                    _pct(view.get('RESIDENTIAL', missing)),
+                ]
+                rows = [html.Tr([html.Td(v) for v in cells]) for cells in zip(*columns)]
                 table_comp = html.Table([
                     html.Thead(html.Tr([
                         html.Th('Month', style={'padding':'6px','borderBottom':'1px solid #ddd'}),
@@ -135,18 +212,12 @@ def render_chart(value_col: str):
         except Exception:
             pass
 
-        return cases_fig, mobility_fig, summary, table_comp
+        return cases_fig, summary, table_comp
     except requests.exceptions.RequestException as e:
-        f1, f2 = go.Figure(), go.Figure()
-        f1.add_annotation(text=f"API not reachable at {API_BASE}. Start API or set API_BASE.", showarrow=False)
-        f2.add_annotation(text=f"API not reachable at {API_BASE}. Start API or set API_BASE.", showarrow=False)
-        return f1, f2, "", ""
+        return _error_figure(f"API not reachable at {API_BASE}. Start API or set API_BASE."), "", ""
     except Exception as e:
-        f1, f2 = go.Figure(), go.Figure()
-        f1.add_annotation(text=f"Error: {e}", showarrow=False)
-        f2.add_annotation(text=f"Error: {e}", showarrow=False)
-        return f1, f2, "", ""
+        return _error_figure(f"Error: {e}"), "", ""
 
 
 if __name__ == '__main__':
-    app.run_server(debug=True, port=8051)
\ No newline at end of file
+    app.run_server(debug=True, port=8051)
@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Protocol, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+from app.paging import RowFilter
+
+
+def aggregate_cache_key(
+    date_col: str,
+    value_col: str,
+    geo_col: str | None,
+    agg: str,
+    limit: int,
+    row_filter: RowFilter | None = None,
+    newest: bool = False,
+) -> str:
+    key = f"agg:{date_col}:{value_col}:{geo_col}:{agg}:{limit}" + (":newest" if newest else "")
+    return key + row_filter.cache_suffix() if row_filter is not None else key
+
+
+def peek_aggregate_table(date_col, value_col, geo_col=None, agg="sum", limit=1000, row_filter=None, newest=False) -> pa.Table | None:
+    """Cache-only lookup, cheap enough to run on the event loop."""
+    from app.cache import get_if_fresh
+    return get_if_fresh(aggregate_cache_key(date_col, value_col, geo_col, agg, limit, row_filter, newest))
+
+
+def fetch_aggregate_table(
+    date_col: str,
+    value_col: str,
+    geo_col: str | None = None,
+    agg: str = "sum",
+    limit: int = 1000,
+    row_filter: RowFilter | None = None,
+    newest: bool = False,
+) -> Tuple[pa.Table, bool]:
+    """Cached aggregate as Arrow: local snapshot first, then Snowflake. Returns ``(table, cached)``.
+
+    ``row_filter`` (date range, geos, keyset cursor) is pushed into the query;
+    each filtered page is cached under its own key. ``newest`` returns the
+    last ``limit`` rows instead of the first, still oldest first.
+    """
+    from app.cache import get_or_compute
+
+    cache_key = aggregate_cache_key(date_col, value_col, geo_col, agg, limit, row_filter, newest)
+    compute = _aggregate_compute(date_col, value_col, geo_col, agg, limit, row_filter, newest)
+    return get_or_compute(cache_key, compute, ttl_seconds=300)
+
+
+def _aggregate_compute(
+    date_col: str,
+    value_col: str,
+    geo_col: str | None,
+    agg: str,
+    limit: int,
+    row_filter: RowFilter | None = None,
+    newest: bool = False,
+):
+    """The computation behind one /covid/aggregate cache key, also used to refresh it in the background."""
+    from app import snapshot
+
+    def compute():
+        if snapshot.snapshot_enabled():
+            table = snapshot.aggregate(
+                date_col, value_col, geo_col=geo_col, agg=agg, limit=limit, row_filter=row_filter, newest=newest
+            )
+            if table is not None:
+                return table
+        from app import result_store
+        from app.deps import sf_session
+        from app.eda import _covid_table_name, aggregate_timeseries_table
+
+        def query():
+            with sf_session() as s:
+                return aggregate_timeseries_table(
+                    s,
+                    date_col=date_col,
+                    value_col=value_col,
+                    geo_col=geo_col,
+                    agg=agg,
+                    limit=limit,
+                    row_filter=row_filter,
+                    newest=newest,
+                )
+
+        params = {
+            "date": date_col.upper(),
+            "value": value_col.upper(),
+            "geo": geo_col.upper() if geo_col else None,
+            "agg": agg.lower(),
+            "limit": int(limit),
+            "filter": row_filter.cache_suffix() if row_filter is not None else None,
+        }
+        if newest:
+            params["newest"] = True
+        return result_store.fetch("aggregate", params, [_covid_table_name()], query)
+
+    return compute
+
+
+def _combine_slices(slices: List[Tuple[str, pa.Table]]) -> pa.Table:
+    """Zip per-metric ``(name, table)`` slices into one columnar table keyed by date[/geo]."""
+    first = slices[0][1]
+    keys = [c for c in ("date", "geo") if c in first.column_names]
+    combined = first.select(keys)
+    for name, table in slices:
+        if table.select(keys).equals(combined.select(keys)):
+            combined = combined.append_column(name, table["value"])
+        else:
+            combined = combined.join(table.rename_columns([c if c in keys else name for c in table.column_names]), keys)
+    return combined.sort_by([("date", "ascending")])
+
+
+def peek_metrics_table(
+    date_col: str,
+    value_cols: List[str],
+    geo_col: str | None = None,
+    aggs: List[str] | None = None,
+    limit: int = 1000,
+) -> pa.Table | None:
+    """Combined table when every requested metric slice is cached, else None.
+
+    A partial hit counts nothing; fetch_metrics_table() then counts each slice once.
+    """
+    from app.cache import get_all_if_fresh
+    from app.eda import metric_name
+
+    wanted = [(v, a) for v in dict.fromkeys(value_cols) for a in dict.fromkeys(aggs or ["sum"])]
+    tables = get_all_if_fresh([aggregate_cache_key(date_col, v, geo_col, a, limit) for v, a in wanted])
+    if tables is None:
+        return None
+    return _combine_slices([(metric_name(v, a), t) for (v, a), t in zip(wanted, tables)])
+
+
+def fetch_metrics_table(
+    date_col: str,
+    value_cols: List[str],
+    geo_col: str | None = None,
+    aggs: List[str] | None = None,
+    limit: int = 1000,
+) -> Tuple[pa.Table, bool]:
+    """Several value columns/aggs at once; returns ``(table, cached)`` with one column per metric.
+
+    Each metric is cached as its own slice under the /covid/aggregate key, and
+    only the slices that are missing are computed, in one grouped query.
+    """
+    from app.cache import record_misses, set_with_ttl
+    from app import snapshot
+    from app.eda import metric_name
+
+    aggs = aggs or ["sum"]
+    wanted = [(v, a) for v in dict.fromkeys(value_cols) for a in dict.fromkeys(aggs)]
+    found = {pair: peek_aggregate_table(date_col, pair[0], geo_col=geo_col, agg=pair[1], limit=limit) for pair in wanted}
+    missing = [pair for pair, table in found.items() if table is None]
+
+    if missing:
+        record_misses([aggregate_cache_key(date_col, v, geo_col, a, limit) for v, a in missing])
+        miss_cols = list(dict.fromkeys(v for v, _ in missing))
+        miss_aggs = list(dict.fromkeys(a for _, a in missing))
+        table = None
+        if snapshot.snapshot_enabled():
+            table = snapshot.aggregate_metrics(date_col, miss_cols, geo_col=geo_col, aggs=miss_aggs, limit=limit)
+        if table is None:
+            from app import result_store
+            from app.deps import sf_session
+            from app.eda import _covid_table_name, aggregate_metrics_table
+
+            def query():
+                with sf_session() as s:
+                    return aggregate_metrics_table(s, date_col, miss_cols, geo_col=geo_col, aggs=miss_aggs, limit=limit)
+
+            params = {
+                "date": date_col.upper(),
+                "values": [v.upper() for v in miss_cols],
+                "geo": geo_col.upper() if geo_col else None,
+                "aggs": [a.lower() for a in miss_aggs],
+                "limit": int(limit),
+            }
+            table = result_store.fetch("metrics", params, [_covid_table_name()], query)
+        keys = [c for c in ("date", "geo") if c in table.column_names]
+        for v in miss_cols:
+            for a in miss_aggs:
+                piece = table.select(keys + [metric_name(v, a)])
+                piece = piece.rename_columns(keys + ["value"])
+                set_with_ttl(
+                    aggregate_cache_key(date_col, v, geo_col, a, limit),
+                    piece,
+                    ttl_seconds=300,
+                    refresh=_aggregate_compute(date_col, v, geo_col, a, limit),
+                )
+                found[(v, a)] = piece
+
+    slices = [(metric_name(v, a), found[(v, a)]) for v, a in wanted]
+    return _combine_slices(slices), not missing
+
+
+def rows_to_frame(rows: List[Dict[str, Any]] | pa.Table) -> pd.DataFrame:
+    df = rows.to_pandas() if isinstance(rows, pa.Table) else pd.DataFrame(rows)
+    if not df.empty and "date" in df.columns:
+        df["date"] = pd.to_datetime(df["date"])
+    return df
+
+
+class DataProvider(Protocol):
+    def aggregate_frame(
+        self,
+        date_col: str,
+        value_col: str,
+        geo_col: str | None = None,
+        agg: str = "sum",
+        limit: int = 1000,
+        max_points: int | None = None,
+        newest: bool = False,
+    ) -> pd.DataFrame: ...
+
+
+class LocalProvider:
+    """Calls the aggregation layer in-process and shares its cache with /covid/aggregate."""
+
+    def aggregate_frame(self, date_col, value_col, geo_col=None, agg="sum", limit=1000, max_points=None, newest=False) -> pd.DataFrame:
+        table, _ = fetch_aggregate_table(date_col, value_col, geo_col=geo_col, agg=agg, limit=limit, newest=newest)
+        if max_points is not None:
+            from app.downsample import downsample_table
+            table = downsample_table(table, max_points)
+        return rows_to_frame(table)
+
+
+class HttpProvider:
+    """Reads from a remote API over a pooled keep-alive connection.
+
+    Arrow results are kept with their ETag and revalidated with
+    ``If-None-Match``, so an unchanged result costs a 304 instead of a download.
+    Compressed bodies (gzip, and zstd where urllib3 supports it) are decoded by requests.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 8.0, pool_size: int = 8, max_validated: int = 64):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+        self.max_validated = max_validated
+        self._validated: "OrderedDict[Tuple, Tuple[str, pa.Table]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, headers: Dict[str, str] | None = None, **params) -> Any:
+        resp = self.http.get(f"{self.base_url}{path}", params=params, headers=headers, timeout=self.timeout)
+        if resp.status_code != 304:
+            resp.raise_for_status()
+        return resp
+
+    def get_table(self, path: str, **params) -> pa.Table:
+        from app.formats import read_arrow
+
+        key = (path, tuple(sorted(params.items())))
+        with self._lock:
+            hit = self._validated.get(key)
+        resp = self.get(path, headers={"If-None-Match": hit[0]} if hit else None, **params)
+        if resp.status_code == 304 and hit:
+            return hit[1]
+        table = read_arrow(resp.content)
+        etag = resp.headers.get("ETag")
+        if etag:
+            with self._lock:
+                self._validated[key] = (etag, table)
+                self._validated.move_to_end(key)
+                while len(self._validated) > self.max_validated:
+                    self._validated.popitem(last=False)
+        return table
+
+    def aggregate_frame(self, date_col, value_col, geo_col=None, agg="sum", limit=1000, max_points=None, newest=False) -> pd.DataFrame:
+        params = {"date_col": date_col, "value_col": value_col, "agg": agg, "limit": limit, "format": "arrow"}
+        if geo_col:
+            params["geo_col"] = geo_col
+        if newest:
+            params["newest"] = "true"
+        if max_points is not None:
+            params["max_points"] = max_points
+        return rows_to_frame(self.get_table("/covid/aggregate", **params))
+
+
+_provider: DataProvider | None = None
+_provider_lock = threading.Lock()
+
+
+def get_data_provider() -> DataProvider:
+    """HttpProvider when ANALYTICS_API_BASE points at a remote API, otherwise in-process."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                base = os.getenv("ANALYTICS_API_BASE")
+                _provider = HttpProvider(base) if base else LocalProvider()
+    return _provider
+
+
+def set_data_provider(provider: DataProvider | None) -> DataProvider | None:
+    global _provider
+    with _provider_lock:
+        previous, _provider = _provider, provider
+    return previous
@@ -1,7 +1,15 @@
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
 from dotenv import load_dotenv
 from snowflake.snowpark import Session
 
+from app.metrics import observe_stage, timed
+
 load_dotenv()
 
 def _normalize_account(account: str | None) -> str | None:
@@ -13,7 +21,7 @@ def _normalize_account(account: str | None) -> str | None:
     return account
 
 
-def get_sf_session() -> Session:
+def _sf_config() -> dict:
     host = os.getenv("SNOWFLAKE_HOST")
     account = _normalize_account(os.getenv("SNOWFLAKE_ACCOUNT"))
     authenticator = (os.getenv("SNOWFLAKE_AUTHENTICATOR") or "").lower().strip()
@@ -63,7 +71,274 @@ def get_sf_session() -> Session:
             if not cfg.get(key):
                 raise ValueError(f"Missing env var for Snowflake: {key.upper()}")
 
-    return Session.builder.configs(cfg).create()
+    return cfg
+
+
+def get_sf_session() -> Session:
+    """Open a brand-new Snowpark session. Request handlers should use sf_session() instead."""
+    return Session.builder.configs(_sf_config()).create()
+
+
+class _PooledSession:
+    __slots__ = ("session", "created_at", "last_used", "last_checked")
+
+    def __init__(self, session: Session):
+        now = time.monotonic()
+        self.session = session
+        self.created_at = now
+        self.last_used = now
+        self.last_checked = now
+
+
+class SessionPool:
+    """Bounded pool of long-lived Snowpark sessions.
+
+    Sessions are created lazily up to ``max_size`` and handed out LIFO so the
+    warmest connection is reused first. Idle sessions older than
+    ``idle_timeout`` or ``max_lifetime`` are recycled, and sessions that have
+    not been used for ``health_check_interval`` seconds are pinged before
+    being handed out again.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Session],
+        max_size: int = 4,
+        idle_timeout: float = 600.0,
+        max_lifetime: float = 3600.0,
+        health_check_interval: float = 60.0,
+        acquire_timeout: float = 30.0,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be >= 1")
+        self._factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._cond = threading.Condition()
+        self._idle: deque[_PooledSession] = deque()
+        self._leased: dict[int, _PooledSession] = {}
+        self._pending = 0
+        self._closed = False
+
+        self._created = 0
+        self._recycled = 0
+        self._failed_health_checks = 0
+        self._acquired = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+
+    def _expired(self, entry: _PooledSession, now: float) -> bool:
+        return (
+            now - entry.last_used > self.idle_timeout
+            or now - entry.created_at > self.max_lifetime
+        )
+
+    def _healthy(self, entry: _PooledSession) -> bool:
+        try:
+            entry.session.sql("select 1").collect()
+        except Exception:
+            self._failed_health_checks += 1
+            return False
+        entry.last_checked = time.monotonic()
+        return True
+
+    @staticmethod
+    def _close_quietly(entry: _PooledSession) -> None:
+        try:
+            entry.session.close()
+        except Exception:
+            pass
+
+    def acquire(self, timeout: float | None = None) -> Session:
+        timeout = self.acquire_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        while True:
+            discard: list[_PooledSession] = []
+            entry: _PooledSession | None = None
+            create = False
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Snowflake session pool is closed")
+                    now = time.monotonic()
+                    while self._idle:
+                        candidate = self._idle.pop()
+                        if self._expired(candidate, now):
+                            discard.append(candidate)
+                            self._recycled += 1
+                            continue
+                        entry = candidate
+                        break
+                    if entry is not None:
+                        # Counted against max_size while it is health-checked outside the lock.
+                        self._pending += 1
+                        break
+                    if len(self._leased) + self._pending < self.max_size:
+                        self._pending += 1
+                        create = True
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._record_wait(started, waited)
+                        raise TimeoutError(
+                            f"Timed out after {timeout:.1f}s waiting for a Snowflake session"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+            for stale in discard:
+                self._close_quietly(stale)
+
+            if create:
+                try:
+                    with timed("session_create"):
+                        entry = _PooledSession(self._factory())
+                except BaseException:
+                    with self._cond:
+                        self._pending -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._pending -= 1
+                    self._created += 1
+                    self._lease(entry, started, waited)
+                return entry.session
+
+            if time.monotonic() - entry.last_checked > self.health_check_interval and not self._healthy(entry):
+                self._close_quietly(entry)
+                with self._cond:
+                    self._pending -= 1
+                    self._recycled += 1
+                    self._cond.notify()
+                continue
+
+            with self._cond:
+                self._pending -= 1
+                self._lease(entry, started, waited)
+            return entry.session
+
+    def _lease(self, entry: _PooledSession, started: float, waited: bool) -> None:
+        self._leased[id(entry.session)] = entry
+        self._acquired += 1
+        self._record_wait(started, waited)
+
+    def _record_wait(self, started: float, waited: bool) -> None:
+        if waited:
+            self._waits += 1
+            self._wait_seconds += time.monotonic() - started
+
+    def release(self, session: Session, broken: bool = False) -> None:
+        with self._cond:
+            entry = self._leased.pop(id(session), None)
+            if entry is None:
+                return
+            if self._closed or broken:
+                if broken:
+                    self._recycled += 1
+                close = True
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+                close = False
+            self._cond.notify()
+        if close:
+            self._close_quietly(entry)
+
+    @contextmanager
+    def session(self) -> Iterator[Session]:
+        s = self.acquire()
+        try:
+            yield s
+        except BaseException:
+            # The query may have failed for reasons unrelated to the connection;
+            # force a health check before the next lease instead of dropping it.
+            entry = self._leased.get(id(s))
+            if entry is not None:
+                entry.last_checked = float("-inf")
+            self.release(s)
+            raise
+        self.release(s)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for entry in idle:
+            self._close_quietly(entry)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "in_use": len(self._leased),
+                "idle": len(self._idle),
+                "created": self._created,
+                "recycled": self._recycled,
+                "failed_health_checks": self._failed_health_checks,
+                "acquired": self._acquired,
+                "waits": self._waits,
+                "wait_seconds_total": round(self._wait_seconds, 6),
+                "closed": self._closed,
+            }
+
+
+_pool: SessionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    return float(raw) if raw else default
+
+
+def get_session_pool() -> SessionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SessionPool(
+                    get_sf_session,
+                    max_size=int(os.getenv("SNOWFLAKE_POOL_SIZE", "4")),
+                    idle_timeout=_env_float("SNOWFLAKE_POOL_IDLE_SECONDS", 600.0),
+                    max_lifetime=_env_float("SNOWFLAKE_POOL_MAX_LIFETIME_SECONDS", 3600.0),
+                    health_check_interval=_env_float("SNOWFLAKE_POOL_HEALTHCHECK_SECONDS", 60.0),
+                    acquire_timeout=_env_float("SNOWFLAKE_POOL_TIMEOUT_SECONDS", 30.0),
+                )
+    return _pool
+
+
+def set_session_pool(pool: SessionPool | None) -> SessionPool | None:
+    """Swap the process-wide pool (e.g. for a fake factory in tests). Returns the previous one."""
+    global _pool
+    with _pool_lock:
+        previous, _pool = _pool, pool
+    return previous
+
+
+@contextmanager
+def sf_session() -> Iterator[Session]:
+    from app.executor import track_session
+
+    pool = get_session_pool()
+    started = time.perf_counter()
+    with pool.session() as s, track_session(s):
+        observe_stage("session_acquire", time.perf_counter() - started)
+        yield s
+
+
+def close_session_pool() -> None:
+    previous = set_session_pool(None)
+    if previous is not None:
+        previous.close()
 
 
 def get_sf_config_summary() -> dict:
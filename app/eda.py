@@ -1,7 +1,9 @@
 import os
-from snowflake.snowpark import Session
-from snowflake.snowpark.functions import col, date_trunc, sum as ssum, avg as aavg
-from .deps import get_sf_session
+import pyarrow as pa
+from snowflake.snowpark import DataFrame, Session
+from snowflake.snowpark.functions import col, sum as ssum
+from app.metrics import add_rows, timed
+from app.paging import RowFilter, snowpark_where, sort_keys
 
 def _covid_table_name() -> str:
     return os.getenv(
@@ -10,103 +12,162 @@ def _covid_table_name() -> str:
     )
 
 
+def fetch_arrow(df: DataFrame) -> pa.Table:
+    """Execute ``df`` and fetch it as Arrow, recording warehouse time and rows."""
+    with timed("warehouse_query"):
+        table = df.to_arrow()
+    add_rows("warehouse", table.num_rows)
+    return table
+
+
 def list_columns(s: Session) -> list[str]:
     df = s.table(_covid_table_name())
     return list(df.columns)
 
 
-def sample(s: Session, limit: int = 5) -> list[dict]:
-    df = s.table(_covid_table_name()).limit(int(limit))
-    return [dict(r.asDict()) for r in df.collect()]
+def table_schema(s: Session, name: str) -> list[tuple[str, object]]:
+    """``(column, snowpark DataType)`` pairs for ``name``; a metadata lookup, no rows are scanned."""
+    with timed("schema_query"):
+        return [(f.name, f.datatype) for f in s.table(name).schema.fields]
 
 
-def aggregate_timeseries(
-    s: Session,
-    date_col: str,
-    value_col: str,
-    geo_col: str | None = None,
-    agg: str = "sum",
-    limit: int = 1000,
-) -> list[dict]:
-    df = s.table(_covid_table_name())
-    df = df.with_column("__date__", col(date_col))
+def sample(s: Session, limit: int = 5) -> pa.Table:
+    return fetch_arrow(s.table(_covid_table_name()).limit(int(limit)))
 
+
+def _agg_expr(value_col: str, agg: str, alias: str):
     if agg.lower() == "avg":
         from snowflake.snowpark.functions import avg as a_avg
-        agg_expr = a_avg(col(value_col)).alias("value")
+        return a_avg(col(value_col)).alias(alias)
     elif agg.lower() == "max":
         from snowflake.snowpark.functions import max as smax
-        agg_expr = smax(col(value_col)).alias("value")
+        return smax(col(value_col)).alias(alias)
     elif agg.lower() == "min":
         from snowflake.snowpark.functions import min as smin
-        agg_expr = smin(col(value_col)).alias("value")
-    else:
-        agg_expr = ssum(col(value_col)).alias("value")
+        return smin(col(value_col)).alias(alias)
+    elif agg.lower() == "count":
+        from snowflake.snowpark.functions import count as scount
+        return scount(col(value_col)).alias(alias)
+    return ssum(col(value_col)).alias(alias)
+
+
+def metric_name(value_col: str, agg: str) -> str:
+    return f"{value_col}_{agg}".lower()
+
+
+def _grouped_query(
+    s: Session,
+    date_col: str,
+    metrics: list[tuple[str, str, str]],
+    geo_col: str | None = None,
+    limit: int | None = 1000,
+    row_filter: RowFilter | None = None,
+    newest: bool = False,
+) -> DataFrame:
+    """One GROUP BY over COVID_TABLE computing every ``(value_col, agg, alias)`` in ``metrics``.
+
+    ``row_filter`` is applied to the raw rows before grouping; results are
+    ordered by ``(date, geo)`` so keyset pages are stable. With ``newest`` the
+    order is reversed, so ``limit`` keeps the latest rows instead of the
+    earliest; callers put them back in ``(date, geo)`` order.
+    """
+    df = snowpark_where(s.table(_covid_table_name()), row_filter, date_col, geo_col)
+    df = df.with_column("__date__", col(date_col))
+    agg_exprs = [_agg_expr(value_col, agg, alias) for value_col, agg, alias in metrics]
+    outputs = [col(alias) for _, _, alias in metrics]
 
     if geo_col:
         grouped = (
             df.group_by(col("__date__"), col(geo_col))
-            .agg(agg_expr)
-            .select(col("__date__").alias("date"), col(geo_col).alias("geo"), col("value"))
-            .order_by(col("date"))
-            .limit(int(limit))
+            .agg(*agg_exprs)
+            .select(col("__date__").alias("date"), col(geo_col).alias("geo"), *outputs)
+            .order_by(*((col("date").desc(), col("geo").desc_nulls_first()) if newest else (col("date"), col("geo"))))
         )
     else:
         grouped = (
             df.group_by(col("__date__"))
-            .agg(agg_expr)
-            .select(col("__date__").alias("date"), col("value"))
-            .order_by(col("date"))
-            .limit(int(limit))
+            .agg(*agg_exprs)
+            .select(col("__date__").alias("date"), *outputs)
+            .order_by(col("date").desc() if newest else col("date"))
         )
+    if limit is not None:
+        grouped = grouped.limit(int(limit))
+    return grouped
 
-    rows = []
-    for r in grouped.collect():
-        d = dict(r.asDict())
-        d = {str(k).lower(): v for k, v in d.items()}
-        rows.append(d)
-    return rows
 
-
-def run_eda():
-    s = get_sf_session()
-    cases = (
-        s.table("CALIFORNIA_COVID19_DATASETS.COVID.CASES")
-        .where((col("AREA_TYPE") == "County") & (col("AREA") != "Unknown"))
-        .with_column("MONTH", date_trunc("month", col("DATE")))
-        .group_by(col("MONTH"))
-        .agg(ssum(col("CASES")).alias("MONTHLY_CASES"))
+def _aggregate_query(
+    s: Session,
+    date_col: str,
+    value_col: str,
+    geo_col: str | None = None,
+    agg: str = "sum",
+    limit: int = 1000,
+    row_filter: RowFilter | None = None,
+    newest: bool = False,
+) -> DataFrame:
+    return _grouped_query(
+        s, date_col, [(value_col, agg, "value")], geo_col=geo_col, limit=limit, row_filter=row_filter, newest=newest
     )
 
-    mobility = (
-        s.table("COVID19_EPIDEMIOLOGICAL_DATA.PUBLIC.GOOG_GLOBAL_MOBILITY_REPORT")
-        .where(
-            (col("COUNTRY_REGION") == "United States")
-            & (col("PROVINCE_STATE") == "California")
-            & col("SUB_REGION_2").is_null()
-        )
-        .with_column("MONTH", date_trunc("month", col("DATE")))
-        .group_by(col("MONTH"))
-        .agg(
-            aavg(col("RETAIL_AND_RECREATION_CHANGE_PERC")).alias("RETAIL"),
-            aavg(col("WORKPLACES_CHANGE_PERC")).alias("WORKPLACES"),
-            aavg(col("RESIDENTIAL_CHANGE_PERC")).alias("RESIDENTIAL"),
-        )
-    )
 
-    joined = (
-        cases.join(mobility, cases["MONTH"] == mobility["MONTH"], how="left")
-        .select(
-            cases["MONTH"],
-            cases["MONTHLY_CASES"],
-            mobility["RETAIL"],
-            mobility["WORKPLACES"],
-            mobility["RESIDENTIAL"],
-        )
-        .order_by(cases["MONTH"])
-    )
+def aggregate_timeseries(
+    s: Session,
+    date_col: str,
+    value_col: str,
+    geo_col: str | None = None,
+    agg: str = "sum",
+    limit: int = 1000,
+) -> list[dict]:
+    return aggregate_timeseries_table(s, date_col, value_col, geo_col=geo_col, agg=agg, limit=limit).to_pylist()
+
+
+def aggregate_timeseries_table(
+    s: Session,
+    date_col: str,
+    value_col: str,
+    geo_col: str | None = None,
+    agg: str = "sum",
+    limit: int = 1000,
+    row_filter: RowFilter | None = None,
+    newest: bool = False,
+) -> pa.Table:
+    """Same query as aggregate_timeseries, fetched as Arrow batches with lower-case column names.
+
+    ``newest`` returns the last ``limit`` rows rather than the first, still in ``(date, geo)`` order.
+    """
+    grouped = _aggregate_query(s, date_col, value_col, geo_col=geo_col, agg=agg, limit=limit, row_filter=row_filter, newest=newest)
+    table = fetch_arrow(grouped)
+    table = table.rename_columns([str(c).lower() for c in table.column_names])
+    return sort_keys(table) if newest else table
+
+
+def aggregate_metrics_table(
+    s: Session,
+    date_col: str,
+    value_cols: list[str],
+    geo_col: str | None = None,
+    aggs: list[str] | None = None,
+    limit: int = 1000,
+) -> pa.Table:
+    """Every value_col x agg combination in a single scan; metric columns are named by metric_name()."""
+    aggs = aggs or ["sum"]
+    metrics = [(v, a, metric_name(v, a)) for v in value_cols for a in aggs]
+    table = fetch_arrow(_grouped_query(s, date_col, metrics, geo_col=geo_col, limit=limit))
+    return table.rename_columns([str(c).lower() for c in table.column_names])
+
+
+def daily_rollup_table(s: Session, date_col: str, value_col: str, geo_col: str | None = None) -> pa.Table:
+    """Day-level sum/count/min/max of ``value_col``, the base layer of the rollup cube."""
+    metrics = [(value_col, fn, fn) for fn in ("sum", "count", "min", "max")]
+    table = fetch_arrow(_grouped_query(s, date_col, metrics, geo_col=geo_col, limit=None))
+    return table.rename_columns([str(c).lower() for c in table.column_names])
+
+
+def run_eda():
+    from app.mobility import MobilityQuery, get_mobility_table
 
-    df = joined.to_pandas()
+    table, _ = get_mobility_table(MobilityQuery())
+    df = table.to_pandas()
     print(df.head())
     if not df.empty:
         print(df.describe(include="all"))
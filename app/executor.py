@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Warehouse query queue is full")
+        self.retry_after = retry_after
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class _Job:
+    """Per-request handle so a timed-out or abandoned request can cancel its warehouse queries."""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self._sessions: list = []
+        self._lock = threading.Lock()
+
+    def attach(self, session) -> None:
+        with self._lock:
+            self._sessions.append(session)
+        if self.cancelled.is_set():
+            self._cancel_session(session)
+
+    def detach(self, session) -> None:
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+
+    @staticmethod
+    def _cancel_session(session) -> None:
+        try:
+            session.cancel_all()
+        except Exception:
+            pass
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        with self._lock:
+            sessions = list(self._sessions)
+        for s in sessions:
+            self._cancel_session(s)
+
+
+_current_job: contextvars.ContextVar[_Job | None] = contextvars.ContextVar("warehouse_job", default=None)
+
+
+@contextmanager
+def track_session(session) -> Iterator[None]:
+    """Register ``session`` with the running warehouse job so cancellation can reach it."""
+    job = _current_job.get()
+    if job is None:
+        yield
+        return
+    job.attach(session)
+    try:
+        yield
+    finally:
+        job.detach(session)
+
+
+async def _wait_disconnect(request, poll_seconds: float = 0.25) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(poll_seconds)
+
+
+class WarehouseExecutor:
+    """Dedicated, bounded thread pool for blocking Snowflake work.
+
+    At most ``max_workers`` jobs run at once and at most ``max_queue`` wait
+    behind them; anything beyond that is rejected immediately with
+    :class:`Overloaded` so callers can shed load instead of piling up.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 32, timeout: float = 60.0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="warehouse")
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._running = 0
+        self._avg_seconds = 1.0
+
+        self._submitted = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._disconnects = 0
+        self._queue_seconds = 0.0
+
+    def _retry_after(self) -> int:
+        queued = max(self._inflight - self.max_workers, 1)
+        return max(1, math.ceil(self._avg_seconds * queued / self.max_workers))
+
+    def _call(self, job: _Job, queued_at: float, fn: Callable, args, kwargs) -> Any:
+        if job.cancelled.is_set():
+            raise ClientDisconnected()
+        started = time.monotonic()
+        with self._lock:
+            self._running += 1
+            self._queue_seconds += started - queued_at
+        _current_job.set(job)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._running -= 1
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+
+    def _release(self, _fut: Future) -> None:
+        with self._lock:
+            self._inflight -= 1
+
+    def submit(self, fn: Callable, *args, **kwargs) -> tuple[Future, _Job]:
+        with self._lock:
+            if self._inflight >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise Overloaded(self._retry_after())
+            self._inflight += 1
+            self._submitted += 1
+        job = _Job()
+        ctx = contextvars.copy_context()
+        try:
+            fut = self._pool.submit(ctx.run, self._call, job, time.monotonic(), fn, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self._inflight -= 1
+            raise
+        fut.add_done_callback(self._release)
+        return fut, job
+
+    async def run(self, fn: Callable, *args, request=None, timeout: float | None = None, **kwargs) -> Any:
+        """Run ``fn`` on the pool; cancel it on timeout or when ``request``'s client goes away."""
+        fut, job = self.submit(fn, *args, **kwargs)
+        afut = asyncio.wrap_future(fut)
+        afut.add_done_callback(lambda f: f.cancelled() or f.exception())
+        waiters = {afut}
+        watcher = None
+        if request is not None:
+            watcher = asyncio.ensure_future(_wait_disconnect(request))
+            waiters.add(watcher)
+        try:
+            done, _ = await asyncio.wait(
+                waiters,
+                timeout=self.timeout if timeout is None else timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if afut in done:
+                return afut.result()
+            job.cancel()
+            fut.cancel()
+            if watcher is not None and watcher in done:
+                with self._lock:
+                    self._disconnects += 1
+                raise ClientDisconnected()
+            with self._lock:
+                self._timeouts += 1
+            raise TimeoutError("Warehouse query timed out")
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "timeout_seconds": self.timeout,
+                "running": self._running,
+                "queued": max(self._inflight - self._running, 0),
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+                "disconnects": self._disconnects,
+                "queue_seconds_total": round(self._queue_seconds, 6),
+                "avg_run_seconds": round(self._avg_seconds, 6),
+            }
+
+
+_executor: WarehouseExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> WarehouseExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = WarehouseExecutor(
+                    max_workers=int(os.getenv("WAREHOUSE_MAX_CONCURRENCY", os.getenv("SNOWFLAKE_POOL_SIZE", "4"))),
+                    max_queue=int(os.getenv("WAREHOUSE_QUEUE_DEPTH", "32")),
+                    timeout=float(os.getenv("WAREHOUSE_TIMEOUT_SECONDS", "60")),
+                )
+    return _executor
+
+
+def set_executor(executor: WarehouseExecutor | None) -> WarehouseExecutor | None:
+    global _executor
+    with _executor_lock:
+        previous, _executor = _executor, executor
+    return previous
+
+
+def shutdown_executor() -> None:
+    previous = set_executor(None)
+    if previous is not None:
+        previous.shutdown()
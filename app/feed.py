@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Dict
+
+from app import nosql
+
+
+POLL_SECONDS = float(os.getenv("ANNOTATION_STREAM_POLL_SECONDS", "2"))
+HEARTBEAT_SECONDS = float(os.getenv("ANNOTATION_STREAM_HEARTBEAT_SECONDS", "15"))
+BATCH = 500
+
+
+def sse_event(item: Dict) -> str:
+    return f"id: {item['id']}\nevent: annotation\ndata: {json.dumps(item, separators=(',', ':'))}\n\n"
+
+
+async def annotation_events(
+    request,
+    geo: str | None = None,
+    last_id: int | None = None,
+    poll_seconds: float | None = None,
+    heartbeat_seconds: float | None = None,
+) -> AsyncIterator[str]:
+    """Server-sent events for annotations with ``id > last_id`` (only new ones when ``last_id`` is None).
+
+    Writes in this process wake the stream immediately through a nosql
+    listener; writes from other workers are picked up by a cheap ``id >``
+    poll of the store every ``poll_seconds``.
+    """
+    poll = POLL_SECONDS if poll_seconds is None else poll_seconds
+    heartbeat = HEARTBEAT_SECONDS if heartbeat_seconds is None else heartbeat_seconds
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    def on_write() -> None:
+        loop.call_soon_threadsafe(wake.set)
+
+    nosql.add_listener(on_write)
+    try:
+        if last_id is None:
+            last_id = await asyncio.to_thread(nosql.latest_annotation_id)
+        yield f"retry: {int(poll * 1000)}\n\n"
+        idle = 0.0
+        while not await request.is_disconnected():
+            wake.clear()
+            items = await asyncio.to_thread(nosql.annotations_after, last_id, geo, BATCH)
+            for item in items:
+                last_id = item["id"]
+                yield sse_event(item)
+            if len(items) == BATCH:
+                continue
+            if items:
+                idle = 0.0
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=poll)
+                idle = 0.0
+            except asyncio.TimeoutError:
+                idle += poll
+                if idle >= heartbeat:
+                    idle = 0.0
+                    yield ": keep-alive\n\n"
+    finally:
+        nosql.remove_listener(on_write)
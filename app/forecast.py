@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+from itertools import product
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+METHODS = ("holt", "ses")
+SEASON = 7
+
+ALPHAS = (0.1, 0.3, 0.5, 0.8)
+BETAS = (0.01, 0.1, 0.3)
+GAMMAS = (0.05, 0.2)
+
+
+def to_matrix(data: pa.Table | pd.DataFrame, fill: float = 0.0) -> Tuple[np.ndarray, list | None, np.ndarray]:
+    """Pivot a ``date[, geo], value`` frame to one row per geo on a gap-free daily axis.
+
+    Returns ``(dates, geos, values)``; ``geos`` is None for a single series and
+    missing days (including those after a series' last report) are ``fill``.
+    """
+    df = data.to_pandas() if isinstance(data, pa.Table) else data
+    df = df.assign(date=pd.to_datetime(df["date"]))
+    if df.empty:
+        return np.array([], dtype="datetime64[D]"), None, np.zeros((0, 0))
+    has_geo = "geo" in df.columns
+    keys = df["geo"].fillna("Unknown") if has_geo else pd.Series(0, index=df.index)
+    wide = df.pivot_table(index=keys, columns="date", values="value", aggfunc="sum")
+    days = pd.date_range(wide.columns.min(), wide.columns.max(), freq="D")
+    wide = wide.reindex(columns=days).fillna(fill)
+    return days.values.astype("datetime64[D]"), (list(wide.index) if has_geo else None), wide.to_numpy(dtype=float)
+
+
+def _smooth(
+    Y: np.ndarray,
+    alpha,
+    beta,
+    gamma,
+    seasonal: bool,
+    periods: int,
+    first: np.ndarray | None = None,
+    last: np.ndarray | None = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Run Holt (optionally additive Holt-Winters) for every row of ``Y`` at once.
+
+    The recursion is sequential in time but every step is one vector operation
+    over all rows, so fitting many series costs about as much as fitting one.
+    Row ``i`` is only fitted on days ``first[i] .. last[i]`` (all of ``Y`` by
+    default): outside that span its state is left as it is, so series that
+    start or stop reporting on different days still share the pass. Seasonal
+    indexes follow the common axis, so every row has the same weekday phase.
+    Returns ``(sse, forecasts)`` with forecasts following each row's ``last`` day.
+    """
+    rows, T = Y.shape
+    r = np.arange(rows)
+    first = np.zeros(rows, dtype=int) if first is None else first
+    last = np.full(rows, T - 1) if last is None else last
+    span = last - first + 1
+    m = SEASON if seasonal else 1
+    level = Y[r, first]
+    trend = np.where(span > 1, Y[r, np.minimum(first + 1, T - 1)] - level, 0.0)
+    season = np.zeros((rows, m))
+    skip = np.ones(rows, dtype=int)
+    if seasonal:
+        # Rows too short for a season to be estimated are fitted without one.
+        fits = span >= 2 * m
+        days = np.minimum(first[:, None] + np.arange(2 * m)[None, :], T - 1)
+        window = Y[r[:, None], days]
+        start = window[:, :m].mean(axis=1)
+        season[r[:, None], days[:, :m] % m] = np.where(fits[:, None], window[:, :m] - start[:, None], 0.0)
+        level = np.where(fits, start, level)
+        trend = np.where(fits, (window[:, m:].mean(axis=1) - start) / m, trend)
+        gamma = gamma * fits
+        skip = np.where(fits, m, 1)
+    trend = trend * (beta > 0)
+    sse = np.zeros(rows)
+    for t in range(T):
+        active = (first <= t) & (t <= last)
+        y = np.where(active, Y[:, t], 0.0)
+        s = season[:, t % m]
+        err = y - (level + trend + s)
+        sse += np.where(active & (t >= first + skip), err * err, 0.0)
+        new_level = alpha * (y - s) + (1 - alpha) * (level + trend)
+        trend = np.where(active, beta * (new_level - level) + (1 - beta) * trend, trend)
+        if seasonal:
+            season[:, t % m] = np.where(active, gamma * (y - new_level) + (1 - gamma) * s, s)
+        level = np.where(active, new_level, level)
+    h = np.arange(1, periods + 1)
+    forecasts = level[:, None] + h[None, :] * trend[:, None] + season[r[:, None], (last[:, None] + h[None, :]) % m]
+    return sse, forecasts
+
+
+def fit_forecast(
+    Y: np.ndarray,
+    periods: int = 7,
+    method: str = "holt",
+    seasonal: bool = False,
+    first: np.ndarray | None = None,
+    last: np.ndarray | None = None,
+) -> np.ndarray:
+    """Forecast ``periods`` steps for every row of ``Y``, picking smoothing parameters per row.
+
+    Every ``(alpha, beta[, gamma])`` combination of a small grid is evaluated
+    in the same vectorized pass and each series keeps its lowest in-sample SSE.
+    ``first``/``last`` bound each row's span as in :func:`_smooth`.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}")
+    rows, T = Y.shape
+    if rows == 0 or T == 0:
+        return np.zeros((rows, periods))
+    first = np.zeros(rows, dtype=int) if first is None else np.asarray(first)
+    last = np.full(rows, T - 1) if last is None else np.asarray(last)
+    seasonal = seasonal and bool((last - first + 1 >= 2 * SEASON).any())
+    grid = np.array(list(product(ALPHAS, BETAS if method == "holt" else (0.0,), GAMMAS if seasonal else (0.0,))))
+    combos = len(grid)
+    alpha, beta, gamma = (np.tile(grid[:, i], rows) for i in range(3))
+    sse, forecasts = _smooth(
+        np.repeat(Y, combos, axis=0), alpha, beta, gamma, seasonal, periods,
+        np.repeat(first, combos), np.repeat(last, combos),
+    )
+    best = sse.reshape(rows, combos).argmin(axis=1)
+    return forecasts.reshape(rows, combos, periods)[np.arange(rows), best]
+
+
+def forecast_table(
+    data: pa.Table | pd.DataFrame,
+    periods: int = 7,
+    method: str = "holt",
+    seasonal: bool = False,
+) -> pa.Table:
+    """``date[, geo], value, type`` forecasts following each series' last observed day (clipped at 0).
+
+    Every series is fitted on its own span, from its first to its last
+    reported day; only gaps inside that span count as 0. All series share one
+    vectorized pass over the common date axis.
+    """
+    dates, geos, Y = to_matrix(data, fill=np.nan)
+    observed = ~np.isnan(Y)
+    keep = observed.any(axis=1) if Y.size else np.zeros(len(Y), dtype=bool)
+    if not keep.any():
+        return pa.table({"date": pa.array([], pa.date32()), "value": pa.array([], pa.float64()), "type": pa.array([], pa.string())})
+    Y, observed = Y[keep], observed[keep]
+    geos = [g for g, k in zip(geos, keep) if k] if geos is not None else None
+    T = Y.shape[1]
+    first = observed.argmax(axis=1)
+    last = T - 1 - observed[:, ::-1].argmax(axis=1)
+    days = np.arange(T)[None, :]
+    inside = (first[:, None] <= days) & (days <= last[:, None])
+    Y = np.where(inside & ~observed, 0.0, Y)
+    values = fit_forecast(Y, periods=periods, method=method, seasonal=seasonal, first=first, last=last)
+    values = np.maximum(values, 0.0)
+    future = dates[last][:, None] + np.arange(1, periods + 1).astype("timedelta64[D]")[None, :]
+    rows = len(Y)
+    columns = {"date": pa.array(future.ravel())}
+    if geos is not None:
+        columns["geo"] = pa.array(np.repeat(np.array(geos, dtype=object), periods))
+    columns["value"] = pa.array(values.ravel())
+    columns["type"] = pa.array(["forecast"] * (rows * periods))
+    return pa.table(columns)
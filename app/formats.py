@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import os
+from typing import Any, Dict, Iterator, Tuple
+
+import pyarrow as pa
+from fastapi import HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from app.cache import TTLCache
+from app.metrics import add_rows, timed
+from app.serialize import ORIENTS, encode_ndjson, json_envelope
+
+try:
+    from compression import zstd as _zstd  # Python 3.14+
+except ImportError:
+    try:
+        from backports import zstd as _zstd
+    except ImportError:
+        _zstd = None
+if _zstd is None:
+    try:
+        import zstandard as _zstandard
+    except ImportError:
+        _zstandard = None
+
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+FORMATS = ("json", "arrow", "ndjson")
+
+CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "8192"))
+
+# Tables above this are streamed uncompressed instead of being rendered, compressed and cached whole.
+BODY_CACHE_MAX_TABLE_BYTES = int(os.getenv("HTTP_BODY_CACHE_MAX_TABLE_BYTES", str(64 * 1024 * 1024)))
+COMPRESS_MIN_BYTES = int(os.getenv("HTTP_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("HTTP_GZIP_LEVEL", "6"))
+# Smaller tables are hashed on the event loop; a threadpool hop would cost more than the hash.
+ETAG_INLINE_BYTES = int(os.getenv("HTTP_ETAG_INLINE_BYTES", str(256 * 1024)))
+ZSTD_LEVEL = int(os.getenv("HTTP_ZSTD_LEVEL", "3"))
+
+_bodies = TTLCache(
+    max_entries=int(os.getenv("HTTP_BODY_CACHE_ENTRIES", "512")),
+    max_bytes=int(os.getenv("HTTP_BODY_CACHE_BYTES", str(128 * 1024 * 1024))),
+    sweep_interval=0,
+)
+
+
+def negotiate(fmt: str | None, accept: str | None = None) -> str:
+    """Pick a response format from ``?format=`` or, failing that, the Accept header."""
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+        return fmt
+    accept = (accept or "").lower()
+    if ARROW_MEDIA_TYPE in accept:
+        return "arrow"
+    if NDJSON_MEDIA_TYPE in accept:
+        return "ndjson"
+    return "json"
+
+
+def _drain(buf: io.BytesIO) -> bytes:
+    data = buf.getvalue()
+    buf.seek(0)
+    buf.truncate()
+    return data
+
+
+def iter_arrow_stream(table: pa.Table, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    buf = io.BytesIO()
+    with pa.ipc.new_stream(buf, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            writer.write_batch(batch)
+            yield _drain(buf)
+    yield _drain(buf)
+
+
+def iter_ndjson(table: pa.Table, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    for batch in table.to_batches(max_chunksize=chunk_rows):
+        if batch.num_rows:
+            yield encode_ndjson(batch)
+
+
+def table_response(table: pa.Table, fmt: str, cached: bool) -> StreamingResponse:
+    add_rows("response", table.num_rows)
+    headers = {"X-Cache": "hit" if cached else "miss"}
+    if fmt == "arrow":
+        return StreamingResponse(iter_arrow_stream(table), media_type=ARROW_MEDIA_TYPE, headers=headers)
+    return StreamingResponse(iter_ndjson(table), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+
+def read_arrow(payload: bytes) -> pa.Table:
+    return pa.ipc.open_stream(payload).read_all()
+
+
+def table_etag(table: pa.Table, fmt: str) -> str:
+    """Weak ETag from the table's schema and Arrow buffers, so no body has to be rendered to compare it.
+
+    A sliced column (a page of a rollup cube or snapshot) still points at its
+    parent's buffers; only the slice is hashed, via its compact IPC form.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{fmt}:{table.num_rows}:".encode())
+    h.update(table.schema.serialize())
+    for column in table.columns:
+        for chunk in column.chunks:
+            if chunk.get_total_buffer_size() > chunk.nbytes:
+                h.update(pa.RecordBatch.from_arrays([chunk], ["c"]).serialize())
+                continue
+            h.update(f"{chunk.offset}:{len(chunk)};".encode())
+            for buf in chunk.buffers():
+                if buf is not None:
+                    h.update(buf)
+    return f'W/"{h.hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    bare = etag.removeprefix("W/")
+    return "*" in tags or any(t.removeprefix("W/") == bare for t in tags)
+
+
+def zstd_available() -> bool:
+    return _zstd is not None or _zstandard is not None
+
+
+def negotiate_encoding(accept_encoding: str | None) -> str:
+    """zstd (when a zstd module is installed), then gzip, then identity, honouring ``q=0``."""
+    offered = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    for encoding in ("zstd", "gzip"):
+        if encoding == "zstd" and not zstd_available():
+            continue
+        if offered.get(encoding, offered.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if _zstd is not None:
+        return _zstd.compress(body, level=ZSTD_LEVEL)
+    return _zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+
+
+def _render(table: pa.Table, fmt: str, cached: bool, orient: str, key: str) -> bytes:
+    with timed("serialize"):
+        if fmt == "arrow":
+            return b"".join(iter_arrow_stream(table))
+        if fmt == "ndjson":
+            return b"".join(iter_ndjson(table))
+        return json_envelope({"cached": cached}, key, table, orient)
+
+
+def _body(
+    base: str, identity: bytes | None, table: pa.Table, fmt: str, cached: bool, encoding: str, orient: str, key: str,
+) -> Tuple[bytes, str]:
+    """Render (unless ``identity`` is already cached) and compress; both are cached under ``base``."""
+    if identity is None:
+        identity = _render(table, fmt, cached, orient, key)
+        _bodies.set(f"{base}|identity", identity, ttl_seconds=300)
+    if encoding == "identity" or len(identity) < COMPRESS_MIN_BYTES:
+        return identity, "identity"
+    with timed("compress"):
+        body = _compress(identity, encoding)
+    _bodies.set(f"{base}|{encoding}", body, ttl_seconds=300)
+    return body, encoding
+
+
+async def _cached_body(
+    path: str, etag: str, table: pa.Table, fmt: str, cached: bool, encoding: str, orient: str, key: str,
+) -> Tuple[bytes, str]:
+    """Rendered (and compressed) body, reused across requests for the same path and content.
+
+    Cache hits are answered on the event loop; rendering and compression run in the threadpool.
+    """
+    base = f"{path}|{etag}|{int(cached)}"
+    body = _bodies.get(f"{base}|{encoding}")
+    if body is not None:
+        return body, encoding
+    identity = _bodies.peek(f"{base}|identity") if encoding != "identity" else None
+    if identity is not None and len(identity) < COMPRESS_MIN_BYTES:
+        return identity, "identity"
+    return await run_in_threadpool(_body, base, identity, table, fmt, cached, encoding, orient, key)
+
+
+def negotiate_orient(orient: str | None, default: str = "records") -> str:
+    orient = (orient or default).lower()
+    if orient not in ORIENTS:
+        raise HTTPException(status_code=400, detail=f"orient must be one of {', '.join(ORIENTS)}")
+    return orient
+
+
+async def conditional_table_response(
+    request: Request,
+    table: pa.Table,
+    fmt: str,
+    cached: bool,
+    orient: str = "records",
+    key: str | None = None,
+    extra_headers: Dict[str, str] | None = None,
+) -> Response:
+    """Serve ``table`` as ``fmt`` with an ETag, 304 on ``If-None-Match`` and gzip/zstd bodies.
+
+    JSON bodies are ``{"cached": ..., key: rows}`` with rows in ``orient``
+    shape; ``key`` defaults to ``rows`` or ``columns``. Rendered and compressed
+    bodies are cached by path and ETag, so repeated requests for the same
+    result skip both serialization and compression. ``extra_headers`` (e.g. a
+    paging cursor) are sent on both full and 304 responses.
+    """
+    key = key or ("rows" if orient == "records" else "columns")
+    etag_fmt = fmt if fmt != "json" else f"json:{orient}:{key}"
+    if table.nbytes > ETAG_INLINE_BYTES:
+        etag = await run_in_threadpool(table_etag, table, etag_fmt)
+    else:
+        etag = table_etag(table, etag_fmt)
+    headers = {"ETag": etag, "Vary": "Accept, Accept-Encoding", "X-Cache": "hit" if cached else "miss"}
+    headers.update(extra_headers or {})
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if fmt != "json" and table.nbytes > BODY_CACHE_MAX_TABLE_BYTES:
+        response = table_response(table, fmt, cached)
+        response.headers.update(headers)
+        return response
+    add_rows("response", table.num_rows)
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    body, encoding = await _cached_body(request.url.path, etag, table, fmt, cached, encoding, orient, key)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    media_type = {"arrow": ARROW_MEDIA_TYPE, "ndjson": NDJSON_MEDIA_TYPE}.get(fmt, "application/json")
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def body_cache_stats() -> Dict[str, Any]:
+    return _bodies.stats()
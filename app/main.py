@@ -1,42 +1,164 @@
-from fastapi import FastAPI, HTTPException
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from fastapi import Body, FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import os
-import pandas as pd
-import numpy as np
+
+from app import metrics
 
 load_dotenv()
-app = FastAPI(title="covid_de_platform")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from app.snapshot import start_refresher, stop_refresher
+    from app import rollup, schema, warmup
+    warmup.record_import("app.main", _IMPORT_SECONDS)
+    warmup.start()
+    start_refresher()
+    rollup.start_refresher()
+    schema.start_refresher()
+    yield
+    from app.deps import close_session_pool
+    from app.cache import stop_sweeper
+    from app.executor import shutdown_executor
+    stop_refresher()
+    rollup.stop_refresher()
+    schema.stop_refresher()
+    shutdown_executor()
+    close_session_pool()
+    stop_sweeper()
+
+
+app = FastAPI(title="covid_de_platform", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Browsers hide response headers from scripts unless they are listed here.
+    expose_headers=["X-Next-Cursor", "ETag", "X-History-Truncated"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+def _pool_gauges():
+    from app.deps import get_session_pool
+    return get_session_pool().stats()
+
+
+def _executor_gauges():
+    from app.executor import get_executor
+    return get_executor().stats()
+
+
+def _cache_gauges():
+    from app.cache import cache_stats
+    return cache_stats()
+
+
+def _body_cache_gauges():
+    from app.formats import body_cache_stats
+    return body_cache_stats()
+
+
+def _schema_gauges():
+    from app.schema import schema_stats
+    stats = schema_stats()
+    return {k: v for k, v in stats.items() if k in ("fetches", "failures", "rejected")}
+
+
+def _result_store_gauges():
+    from app.result_store import store_stats
+    return {k: v for k, v in store_stats().items() if k != "last_error"}
+
+
+metrics.register_gauges("app_session_pool", "Snowflake session pool state.", _pool_gauges)
+metrics.register_gauges("app_warehouse_executor", "Warehouse executor queue state.", _executor_gauges)
+metrics.register_gauges("app_result_cache", "Result cache size and counters.", _cache_gauges)
+metrics.register_gauges("app_response_body_cache", "Rendered and compressed response bodies.", _body_cache_gauges)
+metrics.register_gauges("app_schema_cache", "Table schema cache fetches and rejected requests.", _schema_gauges)
+metrics.register_gauges("app_result_store", "Disk result store shared across workers.", _result_store_gauges)
 
 COVID_TABLE = os.getenv("COVID_TABLE", "CALIFORNIA_COVID19_DATASETS.PUBLIC.CASE_RATES_BY_ZIP")
 DATE_COL_DEFAULT = "DATE"
 
-def json_safe_records(df: pd.DataFrame) -> list[dict]:
-    if df is None or df.empty:
-        return []
-    if "MONTH" in df.columns:
-        df["MONTH"] = pd.to_datetime(df["MONTH"], errors="coerce").dt.strftime("%Y-%m-%d")
-    df = df.replace({np.nan: None, np.inf: None, -np.inf: None})
-    return df.to_dict("records")
+async def run_in_warehouse(request: Request, fn, *args, **kwargs):
+    """Run blocking Snowflake work on the bounded warehouse executor, shedding load when it is full."""
+    from app.executor import ClientDisconnected, Overloaded, get_executor
+    try:
+        return await get_executor().run(fn, *args, request=request, **kwargs)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many warehouse queries in flight, retry later",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    except TimeoutError:
+        raise HTTPException(status_code=504, detail="Warehouse query timed out")
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client closed request")
+
+
+def check_columns(date_col: str, value_cols: list[str], geo_col: str | None, aggs: list[str]) -> None:
+    """422 when the cached COVID_TABLE schema rules the columns out; free when it is not cached yet."""
+    from app.schema import ColumnError, validate_aggregate
+    try:
+        validate_aggregate(date_col, value_cols, geo_col=geo_col, aggs=aggs)
+    except ColumnError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+
+
+async def require_columns(request: Request, date_col: str, value_cols: list[str], geo_col: str | None, aggs: list[str]) -> None:
+    """check_columns() before a warehouse query, loading the schema first if this is its first use."""
+    from app import schema
+    if schema.peek_schema(schema.covid_table()) is None:
+        try:
+            await run_in_warehouse(request, schema.get_schema, schema.covid_table())
+        except HTTPException:
+            raise
+        except Exception:
+            # Schema unavailable; let the query itself report any problem.
+            return
+    check_columns(date_col, value_cols, geo_col, aggs)
+
 
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+
+@app.get("/ready")
+def ready():
+    """200 once the startup warm-up has finished, 503 while it runs or when the session pool could not be opened.
+
+    The body lists every step's error; ``state`` is ``degraded`` when only hot-query priming failed.
+    """
+    from fastapi.responses import JSONResponse
+    from app.warmup import status
+    body = status()
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
 @app.get("/sf/ping")
-def sf_ping():
+async def sf_ping(request: Request):
     try:
-        from app.deps import get_sf_session
-        s = get_sf_session()
-        ver = s.sql("select current_version()").collect()[0][0]
+        from app.deps import sf_session
+
+        def ping():
+            with sf_session() as s:
+                return s.sql("select current_version()").collect()[0][0]
+
+        ver = await run_in_warehouse(request, ping)
         return {"snowflake_version": ver}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -50,78 +172,357 @@ def sf_config():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/sf/pool")
+def sf_pool():
+    from app.deps import get_session_pool
+    return get_session_pool().stats()
+
+
+@app.get("/sf/executor")
+def sf_executor():
+    from app.executor import get_executor
+    return get_executor().stats()
+
+
 @app.get("/covid/summary")
-def covid_summary(limit: int = 5):
+async def covid_summary(request: Request, limit: int = 5):
     try:
-        from app.deps import get_sf_session
+        from app.deps import sf_session
         from app.eda import sample
-        s = get_sf_session()
-        return sample(s, limit=limit)
+        from app.serialize import encode_json
+
+        def work():
+            with sf_session() as s:
+                return sample(s, limit=limit)
+
+        table = await run_in_warehouse(request, work)
+        return Response(content=encode_json(table), media_type="application/json")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/covid/columns")
-def covid_columns():
+async def covid_columns(request: Request):
     try:
-        from app.deps import get_sf_session
-        from app.eda import list_columns
-        s = get_sf_session()
-        return list_columns(s)
+        from app import schema
+        table = schema.covid_table()
+        cached = schema.peek_schema(table) or await run_in_warehouse(request, schema.get_schema, table)
+        return cached.columns
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/covid/schema")
+async def covid_schema(request: Request, table: str = "covid"):
+    """Column types plus the numeric and date columns valid for /covid/aggregate, from the schema cache."""
+    try:
+        from app import schema
+        names = schema.tables()
+        if table not in names:
+            raise HTTPException(status_code=400, detail=f"table must be one of {', '.join(names)}")
+        cached = schema.peek_schema(names[table]) or await run_in_warehouse(request, schema.get_schema, names[table])
+        return cached.to_dict()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/covid/aggregate")
-def covid_aggregate(
+async def covid_aggregate(
+    request: Request,
     date_col: str,
     value_col: str,
     geo_col: str | None = None,
     agg: str = "sum",
     limit: int = 1000,
+    grain: str | None = None,
+    max_points: int | None = Query(None, ge=3),
+    downsample: str = "lttb",
+    fmt: str | None = Query(None, alias="format"),
+    orient: str = "records",
+    start: date | None = None,
+    end: date | None = None,
+    geo_in: list[str] | None = Query(None),
+    cursor: str | None = None,
+    newest: bool = False,
 ):
     try:
-        from app.deps import get_sf_session
-        from app.eda import aggregate_timeseries
-        from app.cache import get_if_fresh, set_with_ttl
-        s = get_sf_session()
-        cache_key = f"agg:{date_col}:{value_col}:{geo_col}:{agg}:{limit}"
-        cached = get_if_fresh(cache_key)
-        if cached is not None:
-            return {"cached": True, "rows": cached}
-        rows = aggregate_timeseries(
-            s,
-            date_col=date_col,
-            value_col=value_col,
-            geo_col=geo_col,
-            agg=agg,
-            limit=limit,
-        )
-        set_with_ttl(cache_key, rows, ttl_seconds=300)
-        return {"cached": False, "rows": rows}
+        from app.data import fetch_aggregate_table, peek_aggregate_table
+        from app.downsample import METHODS, downsample_table
+        from app.formats import conditional_table_response, negotiate, negotiate_orient
+        from app.paging import RowFilter, next_cursor
+        from app import rollup
+        out = negotiate(fmt, request.headers.get("accept"))
+        orient = negotiate_orient(orient)
+        if downsample not in METHODS:
+            raise HTTPException(status_code=400, detail=f"downsample must be one of {', '.join(METHODS)}")
+        check_columns(date_col, [value_col], geo_col, [agg])
+        if newest and cursor:
+            raise HTTPException(status_code=400, detail="cursor cannot be combined with newest")
+        try:
+            row_filter = RowFilter.from_params(start, end, geo_in, cursor, geo_col)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if grain is not None:
+            if grain not in rollup.GRAINS:
+                raise HTTPException(status_code=400, detail=f"grain must be one of {', '.join(rollup.GRAINS)}")
+            cube = rollup.peek_cube(date_col, value_col, geo_col)
+            if cube is not None:
+                table = rollup.lookup(cube, grain=grain, agg=agg, limit=limit, row_filter=row_filter, newest=newest)
+                cached = True
+            else:
+                await require_columns(request, date_col, [value_col], geo_col, [agg])
+                table, cached = await run_in_warehouse(
+                    request, rollup.aggregate, date_col, value_col,
+                    geo_col=geo_col, agg=agg, grain=grain, limit=limit, row_filter=row_filter, newest=newest,
+                )
+        else:
+            table = peek_aggregate_table(
+                date_col, value_col, geo_col=geo_col, agg=agg, limit=limit, row_filter=row_filter, newest=newest
+            )
+            cached = True
+        if table is None:
+            await require_columns(request, date_col, [value_col], geo_col, [agg])
+            table, cached = await run_in_warehouse(
+                request, fetch_aggregate_table, date_col, value_col,
+                geo_col=geo_col, agg=agg, limit=limit, row_filter=row_filter, newest=newest,
+            )
+        # A newest-first window is already the last page; there is nothing after it.
+        page = None if newest else next_cursor(table, limit)
+        if max_points is not None:
+            table = downsample_table(table, max_points, method=downsample)
+        headers = {"X-Next-Cursor": page} if page else None
+        return await conditional_table_response(request, table, out, cached, orient, extra_headers=headers)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/covid/aggregate/batch")
+async def covid_aggregate_batch(
+    request: Request,
+    date_col: str,
+    value_col: list[str] = Query(...),
+    geo_col: str | None = None,
+    agg: list[str] = Query(["sum"]),
+    limit: int = 1000,
+    fmt: str | None = Query(None, alias="format"),
+    orient: str = "columns",
+):
+    try:
+        from app.data import fetch_metrics_table, peek_metrics_table
+        from app.formats import conditional_table_response, negotiate, negotiate_orient
+        out = negotiate(fmt, request.headers.get("accept"))
+        orient = negotiate_orient(orient)
+        check_columns(date_col, value_col, geo_col, agg)
+        table, cached = peek_metrics_table(date_col, value_col, geo_col=geo_col, aggs=agg, limit=limit), True
+        if table is None:
+            await require_columns(request, date_col, value_col, geo_col, agg)
+            table, cached = await run_in_warehouse(
+                request, fetch_metrics_table, date_col, value_col, geo_col=geo_col, aggs=agg, limit=limit
+            )
+        return await conditional_table_response(request, table, out, cached, orient)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/covid/rollup")
+def covid_rollup():
+    from app.rollup import rollup_stats
+    return rollup_stats()
+
+
+@app.get("/covid/snapshot")
+def covid_snapshot():
+    try:
+        from app.snapshot import snapshot_stats
+        return snapshot_stats()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/covid/snapshot/refresh")
+async def covid_snapshot_refresh(request: Request):
+    try:
+        from app.deps import sf_session
+        from app.snapshot import refresh_snapshot, snapshot_enabled
+        if not snapshot_enabled():
+            raise HTTPException(status_code=400, detail="Set COVID_SNAPSHOT_DIR to enable the local snapshot")
+
+        def work():
+            with sf_session() as s:
+                return refresh_snapshot(s)
+
+        return await run_in_warehouse(request, work)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def history_headers(table):
+    """``X-History-Truncated`` when the analytics result was computed from the latest rows only."""
+    from app.analytics import history_truncated
+    return {"X-History-Truncated": "true"} if history_truncated(table) else None
+
+
 @app.get("/analytics/summary")
-def analytics_summary():
+async def analytics_summary(
+    request: Request,
+    value_col: str = "CASES",
+    geo_col: str | None = None,
+    sort: str = "total",
+    top: int | None = Query(None, ge=1),
+):
     try:
-        from app.analytics import get_analytics_summary
-        return get_analytics_summary()
+        from app.analytics import SUMMARY_SORTS, get_analytics_summary, peek_analytics_summary
+        if sort not in SUMMARY_SORTS:
+            raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(SUMMARY_SORTS)}")
+        summary = peek_analytics_summary(value_col, geo_col=geo_col, sort=sort, top=top)
+        if summary is not None:
+            return summary
+        return await run_in_warehouse(request, get_analytics_summary, value_col, geo_col=geo_col, sort=sort, top=top)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/analytics/forecast")
-def analytics_forecast(periods: int = 7):
+async def analytics_forecast(
+    request: Request,
+    periods: int = Query(7, ge=1, le=365),
+    value_col: str = "CASES",
+    geo_col: str | None = None,
+    method: str = "holt",
+    seasonal: bool = False,
+    orient: str = "records",
+):
+    try:
+        from app.analytics import get_forecast, peek_forecast
+        from app.formats import conditional_table_response, negotiate_orient
+        orient = negotiate_orient(orient)
+        table, cached = peek_forecast(value_col, geo_col, periods, method, seasonal), True
+        if table is None:
+            table, cached = await run_in_warehouse(
+                request, get_forecast, value_col, geo_col=geo_col, periods=periods, method=method, seasonal=seasonal
+            )
+        return await conditional_table_response(request, table, "json", cached, orient, key="forecast", extra_headers=history_headers(table))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def anomaly_table(request: Request, value_col, geo_col, window, threshold, min_scale, since):
+    """``(anomalies, cached)`` for the /analytics/anomalies endpoints."""
+    from app.analytics import get_anomaly_scores, peek_anomaly_scores
+    from app.anomalies import anomalies
+    scores, cached = peek_anomaly_scores(value_col, geo_col, window, min_scale), True
+    if scores is None:
+        scores, cached = await run_in_warehouse(
+            request, get_anomaly_scores, value_col, geo_col=geo_col, window=window, min_scale=min_scale
+        )
+    return anomalies(scores, threshold=threshold, since=since), cached
+
+
+@app.get("/analytics/anomalies")
+async def analytics_anomalies(
+    request: Request,
+    value_col: str = "CASES",
+    geo_col: str | None = None,
+    window: int = Query(28, ge=3, le=365),
+    threshold: float = Query(3.5, gt=0),
+    min_scale: float = Query(1.0, gt=0),
+    since: date | None = None,
+    fmt: str | None = Query(None, alias="format"),
+    orient: str = "records",
+):
+    """Days whose value is ``threshold`` robust z-scores away from the trailing ``window``-day median."""
+    try:
+        from app.formats import conditional_table_response, negotiate, negotiate_orient
+        out = negotiate(fmt, request.headers.get("accept"))
+        orient = negotiate_orient(orient)
+        table, cached = await anomaly_table(request, value_col, geo_col, window, threshold, min_scale, since)
+        return await conditional_table_response(request, table, out, cached, orient, key="anomalies", extra_headers=history_headers(table))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/analytics/anomalies/stats")
+def analytics_anomaly_stats():
+    from app.anomalies import anomaly_stats
+    return anomaly_stats()
+
+
+async def anomaly_suggestions(request: Request, value_col, geo_col, window, threshold, min_scale, since):
+    from app.anomalies import suggest_annotations
+    table, _ = await anomaly_table(request, value_col, geo_col, window, threshold, min_scale, since)
+    return suggest_annotations(table, value_col)
+
+
+@app.get("/analytics/anomalies/annotations")
+async def analytics_anomaly_annotations(
+    request: Request,
+    value_col: str = "CASES",
+    geo_col: str | None = None,
+    window: int = Query(28, ge=3, le=365),
+    threshold: float = Query(3.5, gt=0),
+    min_scale: float = Query(1.0, gt=0),
+    since: date | None = None,
+):
+    """Suggested annotations for detected anomalies that are not annotated yet."""
+    try:
+        from app.nosql import existing_annotations
+        suggestions = await anomaly_suggestions(request, value_col, geo_col, window, threshold, min_scale, since)
+        stored = await run_in_threadpool(existing_annotations, suggestions)
+        return {"annotations": [a for a in suggestions if (a["geo"], a["text"]) not in stored]}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/analytics/anomalies/annotations")
+async def store_anomaly_annotations(
+    request: Request,
+    value_col: str = "CASES",
+    geo_col: str | None = None,
+    window: int = Query(28, ge=3, le=365),
+    threshold: float = Query(3.5, gt=0),
+    min_scale: float = Query(1.0, gt=0),
+    since: date | None = None,
+):
+    """Store the suggested annotations; anomalies annotated before are skipped."""
     try:
-        from app.analytics import get_covid_data_for_analysis, simple_forecast
-        df = get_covid_data_for_analysis()
-        if df.empty:
-            raise HTTPException(status_code=400, detail="No data available")
-        
-        forecast_df = simple_forecast(df, periods)
-        return {"forecast": forecast_df.to_dict('records')}
+        from app.nosql import add_new_annotations
+        suggestions = await anomaly_suggestions(request, value_col, geo_col, window, threshold, min_scale, since)
+        inserted = await run_in_threadpool(add_new_annotations, suggestions)
+        return {"inserted": len(inserted), "annotations": inserted}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -135,78 +536,121 @@ def add_annotation(geo: str, text: str, author: str | None = None):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/annotations")
-def list_annotation(geo: str | None = None):
+@app.post("/annotations/bulk")
+def add_annotations_bulk(items: list[dict] = Body(...)):
     try:
-        from app.nosql import list_annotations
-        return list_annotations(geo=geo)
+        from app.nosql import add_annotations
+        return {"inserted": add_annotations(items)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/eda/mobility")
-def get_mobility_data():
-    try:
-        from app.deps import get_sf_session
-        from app.cache import get_if_fresh, set_with_ttl
-        from snowflake.snowpark.functions import col, date_trunc, sum as ssum, avg as aavg
-        
-        # Check cache first
-        cache_key = "mobility:joined_data"
-        cached = get_if_fresh(cache_key)
-        if cached is not None:
-            return {"cached": True, "rows": cached}
-        
-        s = get_sf_session()
-
-        cases = (
-            s.table("CALIFORNIA_COVID19_DATASETS.COVID.CASES")
-            .where((col("AREA_TYPE") == "County") & (col("AREA") != "Unknown"))
-            .with_column("MONTH", date_trunc("month", col("DATE")))
-            .group_by(col("MONTH"))
-            .agg(ssum(col("CASES")).alias("MONTHLY_CASES"))
-        )
+@app.get("/annotations")
+def list_annotation(
+    response: Response,
+    geo: str | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1, le=10000),
+):
+    """Every matching annotation, as before paging existed, unless ``limit`` or ``cursor`` asks for pages.
 
-        mobility = (
-            s.table("COVID19_EPIDEMIOLOGICAL_DATA.PUBLIC.GOOG_GLOBAL_MOBILITY_REPORT")
-            .where(
-                (col("COUNTRY_REGION") == "United States")
-                & (col("PROVINCE_STATE") == "California")
-                & col("SUB_REGION_2").is_null()
-            )
-            .with_column("MONTH", date_trunc("month", col("DATE")))
-            .group_by(col("MONTH"))
-            .agg(
-                aavg(col("RETAIL_AND_RECREATION_CHANGE_PERC")).alias("RETAIL"),
-                aavg(col("WORKPLACES_CHANGE_PERC")).alias("WORKPLACES"),
-                aavg(col("RESIDENTIAL_CHANGE_PERC")).alias("RESIDENTIAL"),
-            )
-        )
+    Pages hold ``limit`` items (1000 when only a cursor is given); the next
+    page's cursor comes back in ``X-Next-Cursor``.
+    """
+    try:
+        from app.nosql import ANNOTATION_PAGE_SIZE, list_annotations_page
+        if limit is None and cursor:
+            limit = ANNOTATION_PAGE_SIZE
+        items, next_cursor = list_annotations_page(geo=geo, start=start, end=end, cursor=cursor, limit=limit)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return items
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # LEFT JOIN and order
-        joined = (
-            cases.join(mobility, cases["MONTH"] == mobility["MONTH"], how="left")
-            .select(
-                cases["MONTH"],
-                cases["MONTHLY_CASES"],
-                mobility["RETAIL"],
-                mobility["WORKPLACES"],
-                mobility["RESIDENTIAL"],
-            )
-            .order_by(cases["MONTH"])
-        )
 
-        df = joined.to_pandas()
-        month_like = [c for c in df.columns if str(c).upper().endswith("MONTH")] if not df.empty else []
-        if month_like and "MONTH" not in df.columns:
-            df = df.rename(columns={month_like[0]: "MONTH"})
+@app.get("/annotations/stream")
+async def stream_annotations(request: Request, geo: str | None = None, last_id: int | None = Query(None, ge=0)):
+    from fastapi.responses import StreamingResponse
+    from app.feed import annotation_events
+    resume = request.headers.get("last-event-id")
+    if last_id is None and resume:
+        try:
+            last_id = int(resume)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be an annotation id")
+    return StreamingResponse(
+        annotation_events(request, geo=geo, last_id=last_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        records = json_safe_records(df)
-        
-        # Cache the result for 10 minutes
-        set_with_ttl(cache_key, records, ttl_seconds=600)
-        
-        return {"cached": False, "rows": records}
-        
+
+@app.get("/eda/mobility")
+async def get_mobility_data(
+    request: Request,
+    county: str | None = None,
+    grain: str = "month",
+    start: date | None = None,
+    end: date | None = None,
+    columns: list[str] | None = Query(None),
+    fmt: str | None = Query(None, alias="format"),
+    orient: str = "records",
+):
+    try:
+        from app.mobility import MobilityQuery, get_mobility_table, peek_mobility_table
+        from app.formats import conditional_table_response, negotiate, negotiate_orient
+        out = negotiate(fmt, request.headers.get("accept"))
+        orient = negotiate_orient(orient)
+        try:
+            q = MobilityQuery(county=county, grain=grain, columns=tuple(columns or ()))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        table, cached = peek_mobility_table(q, start, end), True
+        if table is None:
+            table, cached = await run_in_warehouse(request, get_mobility_table, q, start, end)
+        return await conditional_table_response(request, table, out, cached, orient)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/mobility/stats")
+def mobility_stats():
+    from app.mobility import mobility_stats as stats
+    return stats()
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    from fastapi.responses import PlainTextResponse
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    from app.cache import cache_stats as stats
+    return stats()
+
+
+@app.get("/cache/refresh/stats")
+def cache_refresh_stats():
+    from app.cache import refresh_stats
+    return refresh_stats()
+
+
+@app.get("/cache/store/stats")
+def cache_store_stats():
+    from app.result_store import store_stats
+    return store_stats()
+
+
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
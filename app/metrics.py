@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+
+ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Labels, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.label_names = name, help, labels
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.label_names, k)} {v:g}" for k, v in items]
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; an observation is one bisect and one locked increment."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, labels
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # per-bucket counts (+Inf last), sum, count
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, n) in items:
+            running = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                running += c
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le_label)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {n}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by route, including streamed bodies.", ("route", "method", "status"))
+RESPONSE_BYTES = Histogram("http_response_size_bytes", "Response body size by route.", ("route",), buckets=SIZE_BUCKETS)
+STAGE_SECONDS = Histogram("app_stage_duration_seconds", "Time spent per request stage.", ("stage",))
+CACHE_REQUESTS = Counter("app_cache_requests_total", "Result-cache lookups by key namespace and outcome.", ("cache", "result"))
+CACHE_REFRESHES = Counter("app_cache_refreshes_total", "Background cache refreshes by key namespace and outcome.", ("cache", "result"))
+ROWS = Counter("app_rows_total", "Rows returned by the warehouse or served to clients.", ("source",))
+
+_METRICS = [REQUEST_SECONDS, RESPONSE_BYTES, STAGE_SECONDS, CACHE_REQUESTS, CACHE_REFRESHES, ROWS]
+_gauges: Dict[str, Tuple[str, Callable[[], Dict[str, float]]]] = {}
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    if ENABLED:
+        STAGE_SECONDS.observe(seconds, stage)
+
+
+def cache_result(key: str, hit: bool) -> None:
+    if ENABLED:
+        CACHE_REQUESTS.inc(key.split(":", 1)[0], "hit" if hit else "miss")
+
+
+def refresh_result(key: str, ok: bool) -> None:
+    if ENABLED:
+        CACHE_REFRESHES.inc(key.split(":", 1)[0], "ok" if ok else "error")
+
+
+def add_rows(source: str, rows: int) -> None:
+    if ENABLED:
+        ROWS.inc(source, amount=rows)
+
+
+def register_gauges(name: str, help: str, read: Callable[[], Dict[str, float]]) -> None:
+    """Expose ``read()``'s numeric values as ``name{field=...}`` gauges, read at scrape time."""
+    _gauges[name] = (help, read)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines += metric.render()
+    for name, (help, read) in sorted(_gauges.items()):
+        try:
+            values = read()
+        except Exception:
+            continue
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+        lines += [
+            f'{name}{{field="{_escape(k)}"}} {float(v):g}'
+            for k, v in sorted(values.items())
+            if isinstance(v, (int, float)) and not isinstance(v, bool)
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def _route(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path or "unmatched"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: times each request to its last body chunk and counts response bytes."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        state = {"status": "500", "bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = str(message["status"])
+            elif message["type"] == "http.response.body":
+                state["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = _route(scope)
+            REQUEST_SECONDS.observe(time.perf_counter() - started, route, scope["method"], state["status"])
+            RESPONSE_BYTES.observe(state["bytes"], route)
@@ -0,0 +1,369 @@
+from __future__ import annotations
+
+import datetime as dt
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+CASES_TABLE = "CALIFORNIA_COVID19_DATASETS.COVID.CASES"
+MOBILITY_TABLE = "COVID19_EPIDEMIOLOGICAL_DATA.PUBLIC.GOOG_GLOBAL_MOBILITY_REPORT"
+
+MOBILITY_COLUMNS = {
+    "RETAIL": "RETAIL_AND_RECREATION_CHANGE_PERC",
+    "GROCERY": "GROCERY_AND_PHARMACY_CHANGE_PERC",
+    "PARKS": "PARKS_CHANGE_PERC",
+    "TRANSIT": "TRANSIT_STATIONS_CHANGE_PERC",
+    "WORKPLACES": "WORKPLACES_CHANGE_PERC",
+    "RESIDENTIAL": "RESIDENTIAL_CHANGE_PERC",
+}
+DEFAULT_COLUMNS = ("RETAIL", "WORKPLACES", "RESIDENTIAL")
+
+GRAINS = {"day": ("DAY", "DAILY_CASES"), "week": ("WEEK", "WEEKLY_CASES"), "month": ("MONTH", "MONTHLY_CASES")}
+
+OPEN_TTL = float(os.getenv("MOBILITY_OPEN_TTL_SECONDS", "600"))
+# Past OPEN_TTL the open months are served as-is for this long while they refresh in the background.
+OPEN_STALE = float(os.getenv("MOBILITY_OPEN_STALE_SECONDS", "3600"))
+REFRESH_BACKOFF = float(os.getenv("MOBILITY_REFRESH_BACKOFF_SECONDS", "30"))
+CLOSED_LAG_DAYS = int(os.getenv("MOBILITY_CLOSED_LAG_DAYS", "7"))
+# Every county is its own parameter set; past this many the least recently used is dropped.
+MAX_PARAMETER_SETS = int(os.getenv("MOBILITY_MAX_PARAMETER_SETS", "64"))
+# Callers waiting on another request's fetch of the same parameter set give up after this long.
+FETCH_WAIT = float(os.getenv("MOBILITY_FETCH_WAIT_SECONDS", "120"))
+
+_COUNTY_NAME = re.compile(r"^[A-Za-z][A-Za-z .'-]{0,63}$")
+
+
+@dataclass(frozen=True)
+class MobilityQuery:
+    """Everything that changes the shape of the cases/mobility join; the date range does not."""
+
+    county: str | None = None
+    grain: str = "month"
+    columns: Tuple[str, ...] = DEFAULT_COLUMNS
+
+    def __post_init__(self):
+        if self.grain not in GRAINS:
+            raise ValueError(f"grain must be one of {', '.join(GRAINS)}")
+        county = (self.county or "").strip() or None
+        if county is not None and not _COUNTY_NAME.match(county):
+            raise ValueError(f"Invalid county name {self.county!r}")
+        object.__setattr__(self, "county", county)
+        cols = tuple(c.upper() for c in self.columns) or DEFAULT_COLUMNS
+        unknown = [c for c in cols if c not in MOBILITY_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown mobility column(s): {', '.join(unknown)}; use {', '.join(MOBILITY_COLUMNS)}")
+        object.__setattr__(self, "columns", cols)
+
+    @property
+    def period_col(self) -> str:
+        return GRAINS[self.grain][0]
+
+    @property
+    def cases_col(self) -> str:
+        return GRAINS[self.grain][1]
+
+
+def _month_start(d: dt.date) -> dt.date:
+    return d.replace(day=1)
+
+
+def closed_before(today: dt.date | None = None) -> dt.date:
+    """First month that may still change; partitions for earlier months are final.
+
+    A month is closed once its last bucket (a week can spill 6 days past month
+    end) plus MOBILITY_CLOSED_LAG_DAYS of late-arriving rows lies in the past.
+    """
+    today = today or dt.date.today()
+    horizon = today - dt.timedelta(days=CLOSED_LAG_DAYS + 7)
+    return _month_start(horizon)
+
+
+def build_query(s, q: MobilityQuery, lo: dt.date | None = None, hi: dt.date | None = None):
+    """Cases LEFT JOIN mobility at ``q.grain``, restricted to buckets in ``[lo, hi)``."""
+    from snowflake.snowpark.functions import col, date_trunc, lit, sum as ssum, avg as aavg
+
+    def bucketed(df):
+        df = df.with_column("PERIOD", date_trunc(q.grain, col("DATE")))
+        if lo is not None:
+            df = df.where(col("PERIOD") >= lit(lo))
+        if hi is not None:
+            df = df.where(col("PERIOD") < lit(hi))
+        return df
+
+    cases_filter = (col("AREA_TYPE") == "County") & (col("AREA") != "Unknown")
+    if q.county:
+        cases_filter = cases_filter & (col("AREA") == q.county)
+    cases = (
+        bucketed(s.table(CASES_TABLE).where(cases_filter))
+        .group_by(col("PERIOD"))
+        .agg(ssum(col("CASES")).alias("CASES_TOTAL"))
+    )
+
+    mobility_filter = (col("COUNTRY_REGION") == "United States") & (col("PROVINCE_STATE") == "California")
+    if q.county:
+        mobility_filter = mobility_filter & (col("SUB_REGION_2") == f"{q.county} County")
+    else:
+        mobility_filter = mobility_filter & col("SUB_REGION_2").is_null()
+    mobility = (
+        bucketed(s.table(MOBILITY_TABLE).where(mobility_filter))
+        .group_by(col("PERIOD"))
+        .agg(*[aavg(col(MOBILITY_COLUMNS[c])).alias(c) for c in q.columns])
+    )
+
+    return (
+        cases.join(mobility, cases["PERIOD"] == mobility["PERIOD"], how="left")
+        .select(
+            cases["PERIOD"].alias(q.period_col),
+            cases["CASES_TOTAL"].alias(q.cases_col),
+            *[mobility[c].alias(c) for c in q.columns],
+        )
+        .order_by(col(q.period_col))
+    )
+
+
+def _fetch(q: MobilityQuery, lo: dt.date | None, hi: dt.date | None) -> pa.Table:
+    from app import result_store
+    from app.deps import sf_session
+    from app.eda import fetch_arrow
+
+    def query():
+        with sf_session() as s:
+            table = fetch_arrow(build_query(s, q, lo, hi))
+        return table.rename_columns([str(c).upper() for c in table.column_names])
+
+    params = {"county": q.county, "grain": q.grain, "columns": list(q.columns), "lo": lo, "hi": hi}
+    return result_store.fetch("mobility", params, [CASES_TABLE, MOBILITY_TABLE], query)
+
+
+@dataclass
+class _Partitions:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    parts: Dict[dt.date, pa.Table] = field(default_factory=dict)
+    loaded: bool = False
+    coverage_start: dt.date | None = None
+    open_fetched_at: float = 0.0
+    schema: pa.Schema | None = None
+    refreshing: bool = False
+    retry_at: float = 0.0
+    # Set while one caller fetches for this parameter set; others wait on it instead of the lock.
+    fetching: threading.Event | None = None
+
+
+_store: "OrderedDict[MobilityQuery, _Partitions]" = OrderedDict()
+_store_lock = threading.Lock()
+_stats = {"queries": 0, "partitions_reused": 0, "stale_served": 0, "background_refreshes": 0, "refresh_failures": 0}
+
+
+def _partitions(q: MobilityQuery) -> _Partitions:
+    with _store_lock:
+        p = _store.get(q)
+        if p is None:
+            p = _store[q] = _Partitions()
+            while len(_store) > MAX_PARAMETER_SETS:
+                _store.popitem(last=False)
+        else:
+            _store.move_to_end(q)
+        return p
+
+
+def _plan(p: _Partitions, lo: dt.date | None, now: float, today: dt.date) -> List[Tuple[dt.date | None, dt.date | None]]:
+    if not p.loaded:
+        return [(lo, None)]
+    ranges = []
+    if p.coverage_start is not None and (lo is None or lo < p.coverage_start):
+        ranges.append((lo, p.coverage_start))
+    if now - p.open_fetched_at > OPEN_TTL:
+        ranges.append((_open_lo(p, today), None))
+    return ranges
+
+
+def _open_lo(p: _Partitions, today: dt.date) -> dt.date:
+    open_lo = closed_before(today)
+    if p.coverage_start is not None:
+        open_lo = max(open_lo, p.coverage_start)
+    return open_lo
+
+
+def _serve_stale(p: _Partitions, ranges, now: float) -> bool:
+    """True when only the open months are due and they are still inside the stale window."""
+    return (
+        p.loaded
+        and bool(ranges)
+        and all(hi is None for _, hi in ranges)
+        and now - p.open_fetched_at <= OPEN_TTL + OPEN_STALE
+    )
+
+
+def _refresh_open_async(q: MobilityQuery, p: _Partitions, now: float) -> None:
+    # Caller holds p.lock. The refresh queries Snowflake, so it queues on the warehouse executor.
+    from app.executor import get_executor
+
+    if p.refreshing or now < p.retry_at:
+        return
+    p.refreshing = True
+    try:
+        get_executor().submit(_refresh_open, q, p)
+    except Exception as e:
+        # Queue full (or shutting down): keep serving stale and try again later.
+        p.refreshing = False
+        p.retry_at = now + getattr(e, "retry_after", REFRESH_BACKOFF)
+
+
+def _refresh_open(q: MobilityQuery, p: _Partitions) -> None:
+    from app.metrics import observe_stage
+
+    started = time.perf_counter()
+    try:
+        with p.lock:
+            open_lo = _open_lo(p, dt.date.today())
+        table = _fetch(q, open_lo, None)
+        with p.lock:
+            _store_range(p, q, table, open_lo, None, time.time())
+        with _store_lock:
+            _stats["queries"] += 1
+            _stats["background_refreshes"] += 1
+    except Exception:
+        # Keep serving the stale months; retry after the backoff.
+        with p.lock:
+            p.retry_at = time.time() + REFRESH_BACKOFF
+        with _store_lock:
+            _stats["refresh_failures"] += 1
+    finally:
+        with p.lock:
+            p.refreshing = False
+        observe_stage("cache_refresh", time.perf_counter() - started)
+
+
+def _store_range(p: _Partitions, q: MobilityQuery, table: pa.Table, lo, hi, now: float) -> None:
+    for month in [m for m in p.parts if (lo is None or m >= lo) and (hi is None or m < hi)]:
+        del p.parts[month]
+    if p.schema is None or table.num_rows:
+        p.schema = table.schema
+    if table.num_rows:
+        months = pc.floor_temporal(table[q.period_col], unit="month")
+        for month in pc.unique(months).to_pylist():
+            if month is None:
+                continue
+            key = month.date() if isinstance(month, dt.datetime) else month
+            p.parts[key] = table.filter(pc.equal(months, pa.scalar(month, months.type)))
+    if not p.loaded:
+        p.coverage_start = lo
+    elif p.coverage_start is not None and (lo is None or lo < p.coverage_start):
+        p.coverage_start = lo
+    if hi is None:
+        p.open_fetched_at = now
+    p.loaded = True
+
+
+def _assemble(p: _Partitions, q: MobilityQuery, start: dt.date | None, end: dt.date | None) -> pa.Table:
+    lo = _month_start(start) if start else None
+    months = sorted(m for m in p.parts if (lo is None or m >= lo) and (end is None or m <= end))
+    if not months:
+        return p.schema.empty_table() if p.schema is not None else pa.table({})
+    table = pa.concat_tables([p.parts[m] for m in months])
+    period = table[q.period_col]
+    if start is not None:
+        table = table.filter(pc.greater_equal(period, pa.scalar(start, period.type)))
+        period = table[q.period_col]
+    if end is not None:
+        table = table.filter(pc.less_equal(period, pa.scalar(end, period.type)))
+    return table
+
+
+def peek_mobility_table(q: MobilityQuery, start: dt.date | None = None, end: dt.date | None = None) -> pa.Table | None:
+    """Assembled result when nothing must be fetched first, else None. Never touches Snowflake.
+
+    Stale open months are returned as well, with a background refresh started.
+    """
+    p = _partitions(q)
+    # Called on the event loop, which must never block on a thread lock: contention is a miss.
+    if not p.lock.acquire(blocking=False):
+        return None
+    try:
+        now = time.time()
+        lo = _month_start(start) if start else None
+        ranges = _plan(p, lo, now, dt.date.today())
+        if ranges:
+            if not _serve_stale(p, ranges, now):
+                return None
+            _refresh_open_async(q, p, now)
+            with _store_lock:
+                _stats["stale_served"] += 1
+        return _assemble(p, q, start, end)
+    finally:
+        p.lock.release()
+
+
+def get_mobility_table(
+    q: MobilityQuery | None = None,
+    start: dt.date | None = None,
+    end: dt.date | None = None,
+) -> Tuple[pa.Table, bool]:
+    """Cases/mobility join for ``q`` between ``start`` and ``end``; returns ``(table, cached)``.
+
+    Results are kept as per-month partitions per parameter set. Closed months
+    are fetched once; only open months and never-fetched history are queried.
+    Open months past their TTL are served stale while refreshed in the background.
+    """
+    q = q or MobilityQuery()
+    p = _partitions(q)
+    while True:
+        with p.lock:
+            now = time.time()
+            lo = _month_start(start) if start else None
+            ranges = _plan(p, lo, now, dt.date.today())
+            if _serve_stale(p, ranges, now):
+                _refresh_open_async(q, p, now)
+                with _store_lock:
+                    _stats["stale_served"] += 1
+                return _assemble(p, q, start, end), True
+            if not ranges:
+                with _store_lock:
+                    _stats["partitions_reused"] += len(p.parts)
+                return _assemble(p, q, start, end), True
+            flight = p.fetching
+            if flight is None:
+                flight = p.fetching = threading.Event()
+                break
+        # Another request is fetching this parameter set; re-plan once it has stored its months.
+        if not flight.wait(FETCH_WAIT):
+            raise TimeoutError(f"Timed out waiting for the mobility fetch of {q}")
+    try:
+        # The lock is not held during the warehouse queries, so peeks and other date ranges are not blocked.
+        fetched = [(r_lo, r_hi, _fetch(q, r_lo, r_hi)) for r_lo, r_hi in ranges]
+        with p.lock:
+            for r_lo, r_hi, table in fetched:
+                _store_range(p, q, table, r_lo, r_hi, now)
+            result = _assemble(p, q, start, end)
+        with _store_lock:
+            _stats["queries"] += len(ranges)
+        return result, False
+    finally:
+        with p.lock:
+            p.fetching = None
+        flight.set()
+
+
+def mobility_stats() -> Dict[str, object]:
+    with _store_lock:
+        entries = [
+            {
+                "county": q.county,
+                "grain": q.grain,
+                "columns": list(q.columns),
+                "partitions": len(p.parts),
+                "coverage_start": str(p.coverage_start) if p.coverage_start else None,
+                "open_age_seconds": round(time.time() - p.open_fetched_at, 1) if p.loaded else None,
+                "refreshing": p.refreshing,
+            }
+            for q, p in _store.items()
+        ]
+    return dict(_stats, parameter_sets=entries)
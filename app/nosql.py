@@ -1,39 +1,295 @@
 from __future__ import annotations
 
+import base64
+import json
 import os
-from datetime import datetime
-from typing import Dict, List
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Tuple
 
-from tinydb import TinyDB, Query
 
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS annotations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    geo TEXT NOT NULL,
+    text TEXT NOT NULL,
+    author TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_annotations_geo_created ON annotations (geo, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_annotations_created ON annotations (created_at, id);
+CREATE INDEX IF NOT EXISTS ix_annotations_geo_text ON annotations (geo, text);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
 
-def _db_path() -> str:
+# Pairs per lookup; two bound parameters each stays under SQLite's default variable limit.
+_PAIRS_PER_QUERY = 400
+# Page size when a client pages with a cursor but no limit.
+ANNOTATION_PAGE_SIZE = 1000
+
+_local = threading.local()
+_ready: set = set()
+_ready_lock = threading.Lock()
+_listeners: List[Callable[[], None]] = []
+_listeners_lock = threading.Lock()
+
+
+def _base_dir() -> str:
     base_dir = os.getenv("NOSQL_DIR", os.path.join(os.getcwd(), "data"))
     os.makedirs(base_dir, exist_ok=True)
-    return os.path.join(base_dir, "annotations.json")
+    return base_dir
+
+
+def _db_path() -> str:
+    return os.path.join(_base_dir(), "annotations.db")
+
+
+def _legacy_path() -> str:
+    return os.path.join(_base_dir(), "annotations.json")
+
+
+def _iso(value: datetime | str | None = None) -> str:
+    """UTC timestamp with fixed microsecond precision, so string order is time order."""
+    if value is None:
+        value = datetime.now(timezone.utc)
+    elif isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec="microseconds") + "Z"
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # Autocommit; writers take BEGIN IMMEDIATE so concurrent uvicorn workers queue on busy_timeout.
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+def get_db() -> sqlite3.Connection:
+    """Per-thread connection to the annotation store, created (and migrated) on first use."""
+    path = _db_path()
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = _connect(path)
+    if path not in _ready:
+        with _ready_lock:
+            if path not in _ready:
+                conn.executescript(_SCHEMA)
+                migrate_tinydb(conn)
+                _ready.add(path)
+    return conn
+
+
+def add_listener(fn: Callable[[], None]) -> None:
+    """Call ``fn`` (from the writing thread) after every committed insert in this process."""
+    with _listeners_lock:
+        _listeners.append(fn)
+
+
+def remove_listener(fn: Callable[[], None]) -> None:
+    with _listeners_lock:
+        if fn in _listeners:
+            _listeners.remove(fn)
+
+
+def _notify() -> None:
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for fn in listeners:
+        try:
+            fn()
+        except Exception:
+            pass
+
+
+def _rows(items: Iterable[Dict[str, Any]]) -> List[Tuple[str, str, str, str]]:
+    rows = []
+    for item in items:
+        if not item.get("geo") or not item.get("text"):
+            raise ValueError("Every annotation needs a geo and a text")
+        rows.append((item["geo"], item["text"], item.get("author") or "anonymous", _iso(item.get("created_at"))))
+    return rows
+
+
+def _insert(conn: sqlite3.Connection, rows: List[Tuple[str, str, str, str]]) -> None:
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany("INSERT INTO annotations (geo, text, author, created_at) VALUES (?, ?, ?, ?)", rows)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def migrate_tinydb(conn: sqlite3.Connection | None = None) -> int:
+    """Import the legacy TinyDB ``annotations.json`` once; returns how many annotations were copied."""
+    conn = conn or get_db()
+    legacy = _legacy_path()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'tinydb_migrated'").fetchone():
+            conn.execute("COMMIT")
+            return 0
+        docs = []
+        if os.path.exists(legacy) and os.path.getsize(legacy) > 0:
+            from tinydb import TinyDB
+
+            with TinyDB(legacy, access_mode="r") as tdb:
+                docs = sorted(tdb.all(), key=lambda d: d.doc_id)
+        rows = _rows(d for d in docs if d.get("geo") and d.get("text"))
+        conn.executemany("INSERT INTO annotations (geo, text, author, created_at) VALUES (?, ?, ?, ?)", rows)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('tinydb_migrated', ?)", (str(len(rows)),))
+        conn.execute("COMMIT")
+        return len(rows)
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def add_annotation(geo: str, text: str, author: str | None = None) -> Dict[str, Any]:
+    conn = get_db()
+    payload = {"geo": geo, "text": text, "author": author or "anonymous", "created_at": _iso()}
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cur = conn.execute(
+            "INSERT INTO annotations (geo, text, author, created_at) VALUES (?, ?, ?, ?)",
+            (payload["geo"], payload["text"], payload["author"], payload["created_at"]),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    _notify()
+    return {"id": cur.lastrowid, **payload}
+
+
+def add_annotations(items: Iterable[Dict[str, Any]]) -> int:
+    """Insert many annotations in one transaction; ``created_at`` may be supplied for backfills."""
+    rows = _rows(items)
+    if rows:
+        _insert(get_db(), rows)
+        _notify()
+    return len(rows)
+
+
+def _stored_pairs(conn: sqlite3.Connection, pairs: List[Tuple[str, str]]) -> set:
+    found = set()
+    for i in range(0, len(pairs), _PAIRS_PER_QUERY):
+        chunk = pairs[i:i + _PAIRS_PER_QUERY]
+        sql = (
+            "WITH wanted (geo, text) AS (VALUES " + ", ".join("(?, ?)" for _ in chunk) + ")"
+            " SELECT DISTINCT a.geo, a.text FROM wanted w JOIN annotations a ON a.geo = w.geo AND a.text = w.text"
+        )
+        found.update((r["geo"], r["text"]) for r in conn.execute(sql, [v for pair in chunk for v in pair]))
+    return found
+
+
+def existing_annotations(items: Iterable[Dict[str, Any]]) -> set:
+    """``(geo, text)`` pairs of ``items`` that are already stored, looked up on the ``(geo, text)`` index."""
+    pairs = list(dict.fromkeys((item["geo"], item["text"]) for item in items))
+    return _stored_pairs(get_db(), pairs) if pairs else set()
+
+
+def add_new_annotations(items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Insert the ``items`` whose ``(geo, text)`` is not stored yet, in one transaction; returns those inserted.
+
+    The check and the insert share the write lock, so concurrent callers never store the same pair twice.
+    """
+    items = list({(item["geo"], item["text"]): item for item in items}.values())
+    rows = _rows(items)
+    if not rows:
+        return []
+    conn = get_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        stored = _stored_pairs(conn, [(r[0], r[1]) for r in rows])
+        new = [(item, row) for item, row in zip(items, rows) if (row[0], row[1]) not in stored]
+        conn.executemany("INSERT INTO annotations (geo, text, author, created_at) VALUES (?, ?, ?, ?)", [r for _, r in new])
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    if new:
+        _notify()
+    return [item for item, _ in new]
+
+
+def encode_cursor(created_at: str, row_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at, row_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created_at), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def list_annotations_page(
+    geo: str | None = None,
+    start: datetime | str | None = None,
+    end: datetime | str | None = None,
+    cursor: str | None = None,
+    limit: int | None = ANNOTATION_PAGE_SIZE,
+) -> Tuple[List[Dict[str, Any]], str | None]:
+    """Annotations ordered by ``(created_at, id)``; returns ``(items, next_cursor)``.
 
+    Filters and the keyset cursor all map onto the ``(geo, created_at, id)``
+    or ``(created_at, id)`` index, so a page costs the same at any depth.
+    """
+    where, params = [], []
+    if geo:
+        where.append("geo = ?")
+        params.append(geo)
+    if start is not None:
+        where.append("created_at >= ?")
+        params.append(_iso(start))
+    if end is not None:
+        where.append("created_at <= ?")
+        params.append(_iso(end))
+    if cursor:
+        where.append("(created_at, id) > (?, ?)")
+        params.extend(decode_cursor(cursor))
+    sql = "SELECT id, geo, text, author, created_at FROM annotations"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at, id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit) + 1)
+    rows = [dict(r) for r in get_db().execute(sql, params).fetchall()]
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    return rows, next_cursor
 
-def get_db() -> TinyDB:
-    return TinyDB(_db_path())
 
+def list_annotations(geo: str | None = None) -> List[Dict[str, Any]]:
+    return list_annotations_page(geo=geo, limit=None)[0]
 
-def add_annotation(geo: str, text: str, author: str | None = None) -> Dict[str, str]:
-    db = get_db()
-    payload = {
-        "geo": geo,
-        "text": text,
-        "author": author or "anonymous",
-        "created_at": datetime.utcnow().isoformat() + "Z",
-    }
-    db.insert(payload)
-    return payload
 
 
-def list_annotations(geo: str | None = None) -> List[Dict[str, str]]:
-    db = get_db()
-    if not geo:
-        return list(db.all())
-    Q = Query()
-    return list(db.search(Q.geo == geo))
+def annotations_after(last_id: int = 0, geo: str | None = None, limit: int = 500) -> List[Dict[str, Any]]:
+    """Annotations with ``id > last_id`` in insertion order; the change feed's read path."""
+    sql = "SELECT id, geo, text, author, created_at FROM annotations WHERE id > ?"
+    params: List[Any] = [int(last_id)]
+    if geo:
+        sql += " AND geo = ?"
+        params.append(geo)
+    sql += " ORDER BY id LIMIT ?"
+    params.append(int(limit))
+    return [dict(r) for r in get_db().execute(sql, params).fetchall()]
 
 
+def latest_annotation_id() -> int:
+    return get_db().execute("SELECT COALESCE(MAX(id), 0) FROM annotations").fetchone()[0]
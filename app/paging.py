@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import base64
+import datetime as dt
+import json
+from dataclasses import dataclass
+from typing import Any, Iterable, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def _to_date(value: Any) -> dt.date | dt.datetime:
+    if isinstance(value, (dt.date, dt.datetime)):
+        return value
+    text = str(value)
+    return dt.datetime.fromisoformat(text) if len(text) > 10 else dt.date.fromisoformat(text)
+
+
+def encode_cursor(date_value: Any, geo: Any = None) -> str:
+    """Opaque position after the ``(date, geo)`` row a page ended on."""
+    return base64.urlsafe_b64encode(json.dumps([_to_date(date_value).isoformat(), geo]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[dt.date | dt.datetime, str | None]:
+    try:
+        date_value, geo = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return _to_date(date_value), (None if geo is None else str(geo))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+@dataclass(frozen=True)
+class RowFilter:
+    """Date range, geo list and keyset position for a ``date[, geo]`` aggregate.
+
+    Applied to the raw rows before grouping, so Snowflake (or the local
+    snapshot) only aggregates what the page needs. Pages are ordered by
+    ``(date, geo)``; ``after`` is the last key of the previous page.
+    """
+
+    start: dt.date | None = None
+    end: dt.date | None = None
+    geo_in: Tuple[str, ...] = ()
+    after: Tuple[dt.date | dt.datetime, str | None] | None = None
+
+    def __post_init__(self):
+        if self.start and self.end and self.start > self.end:
+            raise ValueError("start must be on or before end")
+        object.__setattr__(self, "geo_in", tuple(sorted(set(self.geo_in or ()))))
+
+    @classmethod
+    def from_params(
+        cls,
+        start: dt.date | None = None,
+        end: dt.date | None = None,
+        geo_in: Iterable[str] | None = None,
+        cursor: str | None = None,
+        geo_col: str | None = None,
+    ) -> "RowFilter | None":
+        """Build a filter from request parameters; None when nothing is filtered."""
+        geo_in = tuple(g for g in (geo_in or ()) if g)
+        if geo_in and not geo_col:
+            raise ValueError("geo_in requires geo_col")
+        after = decode_cursor(cursor) if cursor else None
+        f = cls(start=start, end=end, geo_in=geo_in, after=after)
+        return f if f.active else None
+
+    @property
+    def active(self) -> bool:
+        return bool(self.start or self.end or self.geo_in or self.after)
+
+    def cache_suffix(self) -> str:
+        after = f"{self.after[0].isoformat()}|{self.after[1]}" if self.after else ""
+        return f":{self.start or ''}:{self.end or ''}:{','.join(self.geo_in)}:{after}"
+
+
+def snowpark_where(df, f: RowFilter | None, date_col: str, geo_col: str | None):
+    """``df`` restricted to the rows ``f`` selects, as Snowpark predicates on the raw columns.
+
+    There is no upper date bound beyond ``f.end``: pages are cut by keyset
+    order plus LIMIT, so sparse or weekly data still fills every page.
+    """
+    if f is None:
+        return df
+    from snowflake.snowpark.functions import col, lit
+
+    d = col(date_col)
+    if f.start:
+        df = df.where(d >= lit(f.start))
+    if f.end:
+        df = df.where(d <= lit(f.end))
+    if f.geo_in:
+        df = df.where(col(geo_col).isin(list(f.geo_in)))
+    if f.after:
+        after_date, after_geo = f.after
+        if geo_col and after_geo is not None:
+            # NULL geos sort last within a date, so they are still ahead of any named geo.
+            g = col(geo_col)
+            df = df.where((d > lit(after_date)) | ((d == lit(after_date)) & ((g > lit(after_geo)) | g.is_null())))
+        else:
+            df = df.where(d > lit(after_date))
+    return df
+
+
+def _scalar(value: Any, type_: pa.DataType) -> pa.Scalar:
+    try:
+        return pa.scalar(value).cast(type_)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        raise ValueError(f"{value!r} is not a valid {type_} value")
+
+
+def _value_set(values: Iterable[Any], type_: pa.DataType) -> pa.Array:
+    """``values`` as an array of ``type_``; request strings are coerced the way Snowflake coerces them."""
+    try:
+        return pa.array(list(values)).cast(type_)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        raise ValueError(f"geo_in values must be valid {type_} values")
+
+
+def arrow_filter(table: pa.Table, f: RowFilter | None, date_name: str, geo_name: str | None) -> pa.Table:
+    """Same selection as :func:`snowpark_where` for an in-memory table."""
+    if f is None:
+        return table
+    d = table[date_name]
+    mask = None
+
+    def both(m):
+        return m if mask is None else pc.and_kleene(mask, m)
+
+    if f.start:
+        mask = both(pc.greater_equal(d, _scalar(f.start, d.type)))
+    if f.end:
+        mask = both(pc.less_equal(d, _scalar(f.end, d.type)))
+    if f.geo_in:
+        mask = both(pc.is_in(table[geo_name], value_set=_value_set(f.geo_in, table[geo_name].type)))
+    if f.after:
+        after_date, after_geo = f.after
+        later = pc.greater(d, _scalar(after_date, d.type))
+        if geo_name and after_geo is not None:
+            g = table[geo_name]
+            same_day = pc.and_kleene(
+                pc.equal(d, _scalar(after_date, d.type)),
+                pc.or_kleene(pc.greater(g, _scalar(after_geo, g.type)), pc.is_null(g)),
+            )
+            later = pc.or_kleene(later, same_day)
+        mask = both(later)
+    return table if mask is None else table.filter(mask)
+
+
+def sort_keys(table: pa.Table) -> pa.Table:
+    """Order a ``date[, geo]`` result the way pages are cut (nulls last)."""
+    keys = [(c, "ascending") for c in ("date", "geo") if c in table.column_names]
+    return table.sort_by(keys)
+
+
+def next_cursor(table: pa.Table, limit: int) -> str | None:
+    """Cursor for the page after ``table`` when it came back full, else None."""
+    if table.num_rows < int(limit) or table.num_rows == 0:
+        return None
+    last = table.slice(table.num_rows - 1)
+    geo = last["geo"][0].as_py() if "geo" in table.column_names else None
+    return encode_cursor(last["date"][0].as_py(), geo)
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Sequence
+
+import pyarrow as pa
+
+from app.metrics import cache_result, observe_stage
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    fingerprint TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    path TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_results_used ON results (used_at);
+CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version TEXT NOT NULL, checked_at REAL NOT NULL);
+"""
+
+# Fully qualified Snowflake identifiers only; the name is interpolated into SQL.
+_TABLE_NAME = re.compile(r"^[A-Za-z0-9_$]+(\.[A-Za-z0-9_$]+){0,2}$")
+# Bumping used_at on every read would make each hit a write; once a minute is enough for LRU.
+_TOUCH_SECONDS = 60.0
+
+_local = threading.local()
+_ready: set = set()
+_ready_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "invalidations": 0,
+          "version_checks": 0, "bypassed": 0, "errors": 0, "last_error": None}
+
+
+def store_dir() -> str | None:
+    return os.getenv("RESULT_STORE_DIR") or None
+
+
+def store_enabled() -> bool:
+    return store_dir() is not None
+
+
+def _max_bytes() -> int:
+    return int(os.getenv("RESULT_STORE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+
+def _version_seconds() -> float:
+    return float(os.getenv("RESULT_STORE_VERSION_SECONDS", "60"))
+
+
+def _count(field: str, amount: int = 1) -> None:
+    with _stats_lock:
+        _stats[field] += amount
+
+
+def _error(e: BaseException) -> None:
+    with _stats_lock:
+        _stats["errors"] += 1
+        _stats["last_error"] = str(e)
+
+
+def get_db() -> sqlite3.Connection:
+    """Per-thread connection to the index in RESULT_STORE_DIR, shared by every worker on the host."""
+    from app.nosql import _connect
+
+    base_dir = store_dir()
+    os.makedirs(base_dir, exist_ok=True)
+    path = os.path.join(base_dir, "results.db")
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = _connect(path)
+    if path not in _ready:
+        with _ready_lock:
+            if path not in _ready:
+                conn.executescript(_SCHEMA)
+                _ready.add(path)
+    return conn
+
+
+def fingerprint(kind: str, params: Dict[str, Any], tables: Sequence[str] = ()) -> str:
+    """Stable hash of a query: its kind, source tables and parameters, independent of argument order."""
+    canonical = json.dumps([kind, [t.upper() for t in tables], params], sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def _query_version(name: str) -> str:
+    """Snowflake's change token for ``name``; it moves on every DML/DDL commit to the table."""
+    if not _TABLE_NAME.match(name):
+        raise ValueError(f"Cannot version table {name!r}")
+    from app.deps import sf_session
+
+    with sf_session() as s:
+        return str(s.sql(f"select system$last_change_commit_time('{name}')").collect()[0][0])
+
+
+def table_versions(tables: Sequence[str]) -> str:
+    """Current version of every table in ``tables`` as one string.
+
+    A version read by any worker is reused by all of them for
+    RESULT_STORE_VERSION_SECONDS, so the warehouse sees one check per table
+    per interval rather than one per request or per worker.
+    """
+    conn = get_db()
+    now = time.time()
+    parts = []
+    for name in sorted(t.upper() for t in tables):
+        row = conn.execute("SELECT version, checked_at FROM versions WHERE name = ?", (name,)).fetchone()
+        if row is not None and now - row["checked_at"] < _version_seconds():
+            version = row["version"]
+        else:
+            version = _query_version(name)
+            _count("version_checks")
+            conn.execute(
+                "INSERT OR REPLACE INTO versions (name, version, checked_at) VALUES (?, ?, ?)", (name, version, now)
+            )
+        parts.append(f"{name}={version}")
+    return "|".join(parts)
+
+
+def get(key: str, version: str) -> pa.Table | None:
+    """Memory-mapped result for ``key`` if it was stored at ``version``, else None."""
+    conn = get_db()
+    row = conn.execute("SELECT version, path, used_at FROM results WHERE fingerprint = ?", (key,)).fetchone()
+    if row is None or row["version"] != version:
+        if row is not None:
+            _count("invalidations")
+        return None
+    try:
+        table = pa.ipc.open_file(pa.memory_map(row["path"], "r")).read_all()
+    except (FileNotFoundError, pa.ArrowInvalid):
+        # Evicted or replaced by another worker between the lookup and the open.
+        return None
+    now = time.time()
+    if now - row["used_at"] > _TOUCH_SECONDS:
+        conn.execute("UPDATE results SET used_at = ? WHERE fingerprint = ?", (now, key))
+    return table
+
+
+def put(key: str, version: str, table: pa.Table) -> None:
+    """Write ``table`` as an Arrow file and index it; least recently used files go past RESULT_STORE_MAX_BYTES."""
+    from app.snapshot import write_snapshot
+
+    conn = get_db()
+    tag = hashlib.blake2b(version.encode(), digest_size=8).hexdigest()
+    path = write_snapshot(table, os.path.join(store_dir(), f"{key}-{tag}.arrow"))
+    size = os.path.getsize(path)
+    now = time.time()
+    removed: List[str] = []
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        old = conn.execute("SELECT path FROM results WHERE fingerprint = ?", (key,)).fetchone()
+        if old is not None and old["path"] != path:
+            removed.append(old["path"])
+        conn.execute(
+            "INSERT OR REPLACE INTO results (fingerprint, version, path, rows, bytes, created_at, used_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, version, path, table.num_rows, size, now, now),
+        )
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM results").fetchone()[0]
+        evicted = 0
+        if total > _max_bytes():
+            for row in conn.execute(
+                "SELECT fingerprint, path, bytes FROM results WHERE fingerprint != ? ORDER BY used_at", (key,)
+            ).fetchall():
+                if total <= _max_bytes():
+                    break
+                conn.execute("DELETE FROM results WHERE fingerprint = ?", (row["fingerprint"],))
+                removed.append(row["path"])
+                total -= row["bytes"]
+                evicted += 1
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    # Readers that already mapped a removed file keep their mapping; new readers no longer find it.
+    for stale in removed:
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+    _count("writes")
+    _count("evictions", evicted)
+
+
+def fetch(kind: str, params: Dict[str, Any], tables: Sequence[str], compute: Callable[[], pa.Table]) -> pa.Table:
+    """``compute()``'s result, reused from disk for as long as none of ``tables`` has changed.
+
+    A no-op wrapper unless RESULT_STORE_DIR is set. Store failures (including a
+    failed version check) never fail the request; the result is computed and
+    returned without being stored.
+    """
+    if not store_enabled():
+        return compute()
+    started = time.perf_counter()
+    try:
+        key = fingerprint(kind, params, tables)
+        version = table_versions(tables)
+        table = get(key, version)
+    except Exception as e:
+        _error(e)
+        _count("bypassed")
+        return compute()
+    finally:
+        observe_stage("result_store", time.perf_counter() - started)
+    cache_result("store", table is not None)
+    if table is not None:
+        _count("hits")
+        return table
+    _count("misses")
+    table = compute()
+    try:
+        put(key, version, table)
+    except Exception as e:
+        _error(e)
+    return table
+
+
+def clear() -> int:
+    """Drop every stored result and cached version; returns the number of results removed."""
+    conn = get_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        paths = [row["path"] for row in conn.execute("SELECT path FROM results").fetchall()]
+        conn.execute("DELETE FROM results")
+        conn.execute("DELETE FROM versions")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return len(paths)
+
+
+def store_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        out = dict(_stats, enabled=store_enabled())
+    if store_enabled():
+        row = get_db().execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM results").fetchone()
+        out.update(entries=row[0], bytes=row[1], max_bytes=_max_bytes())
+    return out
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import datetime as dt
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Any, Dict, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from app.paging import RowFilter, arrow_filter, sort_keys
+
+
+GRAINS = ("day", "week", "month")
+AGGS = ("sum", "avg", "min", "max", "count")
+# Every (date, value, geo) combination is its own cube and is refreshed hourly; keep the most recently used.
+MAX_CUBES = int(os.getenv("ROLLUP_MAX_CUBES", "32"))
+
+CubeKey = Tuple[str, str, str | None]
+
+_cubes: "OrderedDict[CubeKey, Dict[str, pa.Table]]" = OrderedDict()
+_built_at: Dict[CubeKey, float] = {}
+_build_seconds: Dict[CubeKey, float] = {}
+_lock = threading.Lock()
+_key_locks: Dict[CubeKey, threading.Lock] = {}
+_refresher: threading.Thread | None = None
+_stop = threading.Event()
+
+
+def _key(date_col: str, value_col: str, geo_col: str | None) -> CubeKey:
+    return (date_col.upper(), value_col.upper(), geo_col.upper() if geo_col else None)
+
+
+def _truncate(dates: pa.ChunkedArray, grain: str) -> pa.ChunkedArray:
+    if grain == "week":
+        return pc.floor_temporal(dates, unit="week", week_starts_monday=True)
+    return pc.floor_temporal(dates, unit="month")
+
+
+def _roll_up(daily: pa.Table, grain: str) -> pa.Table:
+    keys = ["date", "geo"] if "geo" in daily.column_names else ["date"]
+    coarse = daily.set_column(0, "date", _truncate(daily["date"], grain))
+    rolled = coarse.group_by(keys).aggregate(
+        [("sum", "sum"), ("count", "sum"), ("min", "min"), ("max", "max")]
+    )
+    rolled = rolled.rename_columns(
+        [{"sum_sum": "sum", "count_sum": "count", "min_min": "min", "max_max": "max"}.get(c, c) for c in rolled.column_names]
+    )
+    return sort_keys(rolled.select(keys + ["sum", "count", "min", "max"]))
+
+
+def build_cube(daily: pa.Table) -> Dict[str, pa.Table]:
+    """Roll a day-level ``date[, geo], sum, count, min, max`` table up to every grain.
+
+    Keeping sum and count (rather than averages) lets every agg be rolled up exactly.
+    """
+    keys = ["date", "geo"] if "geo" in daily.column_names else ["date"]
+    daily = daily.select(keys + ["sum", "count", "min", "max"])
+    cube = {"day": sort_keys(daily)}
+    for grain in ("week", "month"):
+        cube[grain] = _roll_up(daily, grain)
+    return cube
+
+
+def _starts_bucket(day: dt.date, grain: str) -> bool:
+    return grain == "day" or (day.weekday() == 0 if grain == "week" else day.day == 1)
+
+
+def _aligned(row_filter: RowFilter, grain: str) -> bool:
+    """Whether ``start``/``end`` fall on bucket boundaries, so pre-rolled buckets can be filtered as they are."""
+    start, end = row_filter.start, row_filter.end
+    return (start is None or _starts_bucket(start, grain)) and (
+        end is None or _starts_bucket(end + dt.timedelta(days=1), grain)
+    )
+
+
+def _daily_from_snapshot(date_col: str, value_col: str, geo_col: str | None) -> pa.Table | None:
+    from app import snapshot
+
+    if not snapshot.snapshot_enabled():
+        return None
+    table = snapshot.load_snapshot()
+    if table is None:
+        return None
+    d, v, g = snapshot._resolve(table, date_col), snapshot._resolve(table, value_col), snapshot._resolve(table, geo_col)
+    if d is None or v is None or (geo_col and g is None):
+        return None
+    keys = [d, g] if g else [d]
+    daily = table.select(list(dict.fromkeys(keys + [v]))).group_by(keys).aggregate(
+        [(v, "sum"), (v, "count"), (v, "min"), (v, "max")]
+    )
+    names = {d: "date", f"{v}_sum": "sum", f"{v}_count": "count", f"{v}_min": "min", f"{v}_max": "max"}
+    if g:
+        names[g] = "geo"
+    return daily.rename_columns([names[c] for c in daily.column_names])
+
+
+def _load_daily(date_col: str, value_col: str, geo_col: str | None) -> pa.Table:
+    daily = _daily_from_snapshot(date_col, value_col, geo_col)
+    if daily is not None:
+        return daily
+    from app import result_store
+    from app.deps import sf_session
+    from app.eda import _covid_table_name, daily_rollup_table
+
+    def query():
+        with sf_session() as s:
+            return daily_rollup_table(s, date_col, value_col, geo_col=geo_col)
+
+    params = {"date": date_col.upper(), "value": value_col.upper(), "geo": geo_col.upper() if geo_col else None}
+    return result_store.fetch("daily", params, [_covid_table_name()], query)
+
+
+def refresh_cube(date_col: str, value_col: str, geo_col: str | None = None) -> Dict[str, pa.Table]:
+    key = _key(date_col, value_col, geo_col)
+    started = time.perf_counter()
+    cube = build_cube(_load_daily(date_col, value_col, geo_col))
+    with _lock:
+        _cubes[key] = cube
+        _cubes.move_to_end(key)
+        _built_at[key] = time.time()
+        _build_seconds[key] = time.perf_counter() - started
+        while len(_cubes) > MAX_CUBES:
+            old, _ = _cubes.popitem(last=False)
+            _built_at.pop(old, None)
+            _build_seconds.pop(old, None)
+            _key_locks.pop(old, None)
+    return cube
+
+
+def _cached(key: CubeKey) -> Dict[str, pa.Table] | None:
+    with _lock:
+        cube = _cubes.get(key)
+        if cube is not None:
+            _cubes.move_to_end(key)
+        return cube
+
+
+def peek_cube(date_col: str, value_col: str, geo_col: str | None = None) -> Dict[str, pa.Table] | None:
+    return _cached(_key(date_col, value_col, geo_col))
+
+
+def get_cube(date_col: str, value_col: str, geo_col: str | None = None) -> Tuple[Dict[str, pa.Table], bool]:
+    """Return ``(cube, cached)``, building it on first use; concurrent first requests share one build."""
+    key = _key(date_col, value_col, geo_col)
+    cube = _cached(key)
+    if cube is not None:
+        return cube, True
+    with _lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        cube = _cached(key)
+        if cube is not None:
+            return cube, True
+        return refresh_cube(date_col, value_col, geo_col), False
+
+
+def lookup(
+    cube: Dict[str, pa.Table],
+    grain: str = "day",
+    agg: str = "sum",
+    limit: int = 1000,
+    row_filter: RowFilter | None = None,
+    newest: bool = False,
+) -> pa.Table:
+    """Slice one grain of a cube into the ``date[, geo], value`` shape of /covid/aggregate.
+
+    ``start``/``end`` select raw days, as they do on the warehouse path: a
+    bucket cut by a bound is rolled up again from the days inside it. The
+    cursor pages by bucket. ``newest`` keeps the last ``limit`` rows instead
+    of the first.
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"grain must be one of {', '.join(GRAINS)}")
+    agg = agg.lower()
+    if agg not in AGGS:
+        raise ValueError(f"agg must be one of {', '.join(AGGS)}")
+    table = cube[grain]
+    if row_filter is not None:
+        geo = "geo" if "geo" in table.column_names else None
+        if row_filter.geo_in and geo is None:
+            raise ValueError("geo_in requires geo_col")
+        bounds = replace(row_filter, after=None)
+        if _aligned(bounds, grain):
+            table = arrow_filter(table, bounds, "date", geo)
+        else:
+            # A bound inside a bucket: roll up only the days it selects, as a raw-row query would.
+            table = _roll_up(arrow_filter(cube["day"], bounds, "date", geo), grain)
+        if row_filter.after:
+            table = arrow_filter(table, RowFilter(after=row_filter.after), "date", geo)
+    table = table.slice(max(table.num_rows - int(limit), 0)) if newest else table.slice(0, int(limit))
+    if agg == "avg":
+        count = table["count"]
+        denom = pc.if_else(pc.equal(count, 0), pa.scalar(None, pa.float64()), pc.cast(count, pa.float64()))
+        value = pc.divide(pc.cast(table["sum"], pa.float64()), denom)
+    else:
+        value = table[agg]
+    keys = [c for c in ("date", "geo") if c in table.column_names]
+    return table.select(keys).append_column("value", value)
+
+
+def aggregate(
+    date_col: str,
+    value_col: str,
+    geo_col: str | None = None,
+    agg: str = "sum",
+    grain: str = "day",
+    limit: int = 1000,
+    row_filter: RowFilter | None = None,
+    newest: bool = False,
+) -> Tuple[pa.Table, bool]:
+    cube, cached = get_cube(date_col, value_col, geo_col)
+    return lookup(cube, grain=grain, agg=agg, limit=limit, row_filter=row_filter, newest=newest), cached
+
+
+def rollup_stats() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "cubes": [
+                {
+                    "date_col": k[0],
+                    "value_col": k[1],
+                    "geo_col": k[2],
+                    "rows": {g: t.num_rows for g, t in cube.items()},
+                    "bytes": sum(t.nbytes for t in cube.values()),
+                    "built_at": _built_at.get(k),
+                    "build_seconds": round(_build_seconds.get(k, 0.0), 3),
+                }
+                for k, cube in _cubes.items()
+            ]
+        }
+
+
+def _refresh_loop(interval: float) -> None:
+    while not _stop.wait(interval):
+        with _lock:
+            keys = list(_cubes)
+        for key in keys:
+            try:
+                refresh_cube(*key)
+            except Exception:
+                pass
+
+
+def start_refresher() -> None:
+    global _refresher
+    if _refresher is not None:
+        return
+    interval = float(os.getenv("ROLLUP_REFRESH_SECONDS", "3600"))
+    _stop.clear()
+    _refresher = threading.Thread(target=_refresh_loop, args=(interval,), name="rollup-refresh", daemon=True)
+    _refresher.start()
+
+
+def stop_refresher() -> None:
+    global _refresher
+    _stop.set()
+    _refresher = None
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List
+
+
+_schemas: Dict[str, "TableSchema"] = {}
+_lock = threading.Lock()
+_key_locks: Dict[str, threading.Lock] = {}
+_stats: Dict[str, Any] = {"fetches": 0, "failures": 0, "rejected": 0, "last_error": None}
+_refresher: threading.Thread | None = None
+_stop = threading.Event()
+
+
+def _kind(datatype: Any) -> str:
+    from snowflake.snowpark.types import (
+        BooleanType, ByteType, DateType, DecimalType, DoubleType, FloatType,
+        IntegerType, LongType, ShortType, StringType, TimestampType,
+    )
+
+    if isinstance(datatype, (ByteType, ShortType, IntegerType, LongType, DecimalType, FloatType, DoubleType)):
+        return "numeric"
+    if isinstance(datatype, DateType):
+        return "date"
+    if isinstance(datatype, TimestampType):
+        return "timestamp"
+    if isinstance(datatype, StringType):
+        return "string"
+    if isinstance(datatype, BooleanType):
+        return "boolean"
+    return "other"
+
+
+@dataclass(frozen=True)
+class TableSchema:
+    """Column names, kinds and Snowpark type names of one table, as of ``fetched_at``."""
+
+    table: str
+    kinds: Dict[str, str]
+    types: Dict[str, str]
+    fetched_at: float
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.kinds)
+
+    def resolve(self, name: str) -> str | None:
+        """Column as stored, matched the way Snowflake matches unquoted identifiers."""
+        if name in self.kinds:
+            return name
+        upper = name.upper()
+        return next((c for c in self.kinds if c.upper() == upper), None)
+
+    def of_kind(self, *kinds: str) -> List[str]:
+        return [c for c, k in self.kinds.items() if k in kinds]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "table": self.table,
+            "columns": dict(self.types),
+            "numeric": self.of_kind("numeric"),
+            "date": self.of_kind("date", "timestamp"),
+            "fetched_at": self.fetched_at,
+            "age_seconds": round(time.time() - self.fetched_at, 1),
+        }
+
+
+class ColumnError(ValueError):
+    """Request names columns that do not exist or have the wrong type; ``errors`` is FastAPI's 422 shape."""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__("; ".join(e["msg"] for e in errors))
+        self.errors = errors
+
+
+def covid_table() -> str:
+    from app.eda import _covid_table_name
+    return _covid_table_name()
+
+
+def tables() -> Dict[str, str]:
+    """Tables the app queries, by the short name /covid/schema accepts."""
+    from app.mobility import CASES_TABLE, MOBILITY_TABLE
+    return {"covid": covid_table(), "cases": CASES_TABLE, "mobility": MOBILITY_TABLE}
+
+
+def fetch_schema(name: str) -> TableSchema:
+    from app.deps import sf_session
+    from app.eda import table_schema
+
+    try:
+        with sf_session() as s:
+            fields = table_schema(s, name)
+    except Exception as e:
+        with _lock:
+            _stats["failures"] += 1
+            _stats["last_error"] = str(e)
+        raise
+    schema = TableSchema(
+        table=name,
+        kinds={f.strip('"'): _kind(t) for f, t in fields},
+        types={f.strip('"'): type(t).__name__.replace("Type", "").lower() for f, t in fields},
+        fetched_at=time.time(),
+    )
+    with _lock:
+        _schemas[name.upper()] = schema
+        _stats["fetches"] += 1
+    return schema
+
+
+def peek_schema(name: str) -> TableSchema | None:
+    """Cached schema, or None; never touches Snowflake."""
+    return _schemas.get(name.upper())
+
+
+def get_schema(name: str) -> TableSchema:
+    """Cached schema, fetched on first use; concurrent first requests share one fetch."""
+    schema = peek_schema(name)
+    if schema is not None:
+        return schema
+    with _lock:
+        key_lock = _key_locks.setdefault(name.upper(), threading.Lock())
+    with key_lock:
+        return peek_schema(name) or fetch_schema(name)
+
+
+def _error(param: str, msg: str) -> Dict[str, Any]:
+    return {"loc": ["query", param], "msg": msg, "type": "value_error.column"}
+
+
+def validate_aggregate(
+    date_col: str,
+    value_cols: Iterable[str],
+    geo_col: str | None = None,
+    aggs: Iterable[str] = ("sum",),
+    table: str | None = None,
+) -> None:
+    """Raise :class:`ColumnError` when the cached schema rules the request out.
+
+    Every ``agg`` must be one of :data:`app.rollup.AGGS`. ``date_col`` must
+    be a date or timestamp, ``value_col`` numeric (any type for ``count``),
+    ``geo_col`` any existing column. The column checks are skipped while the
+    schema is not cached yet, so this is always cheap enough for the event loop.
+    """
+    from app.rollup import AGGS
+
+    errors = [
+        _error("agg", f"Unknown aggregation {a!r}; use one of {', '.join(AGGS)}")
+        for a in dict.fromkeys(aggs) if a.lower() not in AGGS
+    ]
+    schema = peek_schema(table or covid_table())
+    if schema is None:
+        _reject(errors)
+        return
+    dates = schema.of_kind("date", "timestamp")
+    d = schema.resolve(date_col)
+    if d is None or d not in dates:
+        errors.append(_error("date_col", f"{date_col!r} is not a date column of {schema.table}; use one of {', '.join(dates)}"))
+    need_numeric = any(a.lower() != "count" for a in aggs)
+    numeric = schema.of_kind("numeric")
+    for v in dict.fromkeys(value_cols):
+        resolved = schema.resolve(v)
+        if resolved is None:
+            errors.append(_error("value_col", f"Unknown column {v!r} in {schema.table}; numeric columns: {', '.join(numeric)}"))
+        elif need_numeric and resolved not in numeric:
+            errors.append(_error("value_col", f"{v!r} is {schema.types[resolved]}, not numeric; use one of {', '.join(numeric)}"))
+    if geo_col and schema.resolve(geo_col) is None:
+        errors.append(_error("geo_col", f"Unknown column {geo_col!r} in {schema.table}"))
+    _reject(errors)
+
+
+def _reject(errors: List[Dict[str, Any]]) -> None:
+    if errors:
+        with _lock:
+            _stats["rejected"] += 1
+        raise ColumnError(errors)
+
+
+def refresh_all() -> int:
+    """Re-read every tracked and previously requested table; returns how many succeeded."""
+    names = {n.upper(): n for n in tables().values()}
+    with _lock:
+        names.update({k: s.table for k, s in _schemas.items()})
+    done = 0
+    for name in names.values():
+        try:
+            fetch_schema(name)
+            done += 1
+        except Exception:
+            pass
+    return done
+
+
+def schema_stats() -> Dict[str, Any]:
+    with _lock:
+        return dict(_stats, tables={s.table: round(time.time() - s.fetched_at, 1) for s in _schemas.values()})
+
+
+def _refresh_loop(interval: float) -> None:
+    # The first load happens on demand or in the startup warm-up.
+    while not _stop.wait(interval):
+        refresh_all()
+
+
+def start_refresher() -> None:
+    global _refresher
+    interval = float(os.getenv("SCHEMA_REFRESH_SECONDS", "900"))
+    if _refresher is not None or interval <= 0:
+        return
+    _stop.clear()
+    _refresher = threading.Thread(target=_refresh_loop, args=(interval,), name="schema-refresh", daemon=True)
+    _refresher.start()
+
+
+def stop_refresher() -> None:
+    global _refresher
+    _stop.set()
+    _refresher = None
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import datetime as dt
+import json
+import math
+from typing import Any, Dict, List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+ORIENTS = ("records", "columns")
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (dt.date, dt.datetime, dt.time)):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps_json(payload: Any) -> bytes:
+    """Same bytes FastAPI's JSONResponse would produce, with dates as ISO strings."""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+def _dumps_value(value: Any) -> str:
+    if isinstance(value, float) and not math.isfinite(value):
+        return "null"
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+
+def _quote(strings: pa.Array) -> pa.Array:
+    return pc.binary_join_element_wise('"', strings, '"', "")
+
+
+def _per_value(arr: pa.Array) -> pa.Array:
+    return pa.array([_dumps_value(v) for v in arr.to_pylist()], pa.string())
+
+
+def _timestamp_text(arr: pa.Array) -> pa.Array:
+    """ISO-8601 strings; fractional seconds only when some value has them (like ``isoformat``)."""
+    fmt = "%Y-%m-%dT%H:%M:%S" + ("%z" if arr.type.tz else "")
+    if arr.type.unit != "s":
+        whole = pc.cast(arr, pa.timestamp("s", arr.type.tz), safe=False)
+        if not pc.any(pc.not_equal(pc.cast(whole, arr.type), arr)).as_py():
+            arr = whole
+    text = pc.strftime(arr, fmt)
+    if arr.type.tz:
+        # strftime's %z is "+0000"; isoformat writes "+00:00".
+        text = pc.replace_substring_regex(text, r"([+-]\d{2})(\d{2})$", r"\1:\2")
+    return text
+
+
+def _encode_column(arr: pa.Array) -> pa.Array:
+    """JSON text of every value in ``arr`` as a string array; nulls, NaN and inf become ``null``."""
+    t = arr.type
+    if pa.types.is_floating(t):
+        text = pc.if_else(pc.is_finite(arr), pc.cast(arr, pa.string()), None)
+    elif pa.types.is_integer(t) or pa.types.is_decimal(t) or pa.types.is_boolean(t):
+        text = pc.cast(arr, pa.string())
+    elif pa.types.is_date(t) or pa.types.is_time(t):
+        text = _quote(pc.cast(arr, pa.string()))
+    elif pa.types.is_timestamp(t):
+        text = _quote(_timestamp_text(arr))
+    elif pa.types.is_string(t) or pa.types.is_large_string(t) or pa.types.is_dictionary(t):
+        # Escape each distinct value once in Python, then gather by index in C++.
+        encoded = arr if pa.types.is_dictionary(t) else pc.dictionary_encode(arr)
+        if not pa.types.is_string(encoded.type.value_type) and not pa.types.is_large_string(encoded.type.value_type):
+            return _per_value(arr)
+        texts = pa.array([_dumps_value(v) for v in encoded.dictionary.to_pylist()], pa.string())
+        text = texts.take(encoded.indices)
+    elif pa.types.is_null(t):
+        return pa.array(["null"] * len(arr), pa.string())
+    else:
+        return _per_value(arr)
+    return pc.fill_null(text, "null")
+
+
+def _column(data: pa.ChunkedArray | pa.Array) -> pa.Array:
+    return _encode_column(data.combine_chunks() if isinstance(data, pa.ChunkedArray) else data)
+
+
+def _join(texts: pa.Array, sep: str) -> bytes:
+    """Concatenate a string array with ``sep`` in one C++ call and return the bytes."""
+    if len(texts) == 0:
+        return b""
+    lists = pa.ListArray.from_arrays(pa.array([0, len(texts)], pa.int32()), texts)
+    return pc.binary_join(lists, sep)[0].as_buffer().to_pybytes()
+
+
+def _arrow_columns(data: Any) -> Dict[str, pa.Array]:
+    if isinstance(data, pa.RecordBatch):
+        data = pa.Table.from_batches([data])
+    if not isinstance(data, pa.Table) and hasattr(data, "to_arrow"):
+        from app.eda import fetch_arrow
+        data = fetch_arrow(data)
+    if not isinstance(data, pa.Table):
+        raise TypeError(f"Cannot encode {type(data).__name__} as JSON")
+    return {name: _column(data.column(i)) for i, name in enumerate(data.column_names)}
+
+
+def _pandas_texts(df: pd.DataFrame) -> Dict[str, pa.Array]:
+    texts = {}
+    for name in df.columns:
+        series = df[name]
+        try:
+            arr = pa.array(series, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+            # Mixed-type object column: fall back to the json module for it alone.
+            texts[str(name)] = pa.array([_dumps_value(v) for v in series.tolist()], pa.string())
+            continue
+        texts[str(name)] = _encode_column(arr)
+    return texts
+
+
+def encode_json(data: pa.Table | pd.DataFrame | Any, orient: str = "records") -> bytes:
+    """Encode an Arrow table, DataFrame or Snowpark DataFrame as JSON bytes.
+
+    ``records`` gives ``[{"col": v, ...}, ...]``; ``columns`` gives the more
+    compact ``{"col": [v, ...], ...}``. Each column is turned into JSON text by
+    Arrow compute kernels (numbers, dates and timestamps vectorized, strings
+    escaped once per distinct value), then stitched together without building
+    per-row Python objects. NaN and infinities become ``null``; floats with an
+    integral value render without a trailing ``.0``.
+    """
+    if orient not in ORIENTS:
+        raise ValueError(f"orient must be one of {', '.join(ORIENTS)}")
+    if isinstance(data, pd.DataFrame):
+        columns = _pandas_texts(data)
+    else:
+        columns = _arrow_columns(data)
+    names = list(columns)
+    if orient == "columns":
+        parts = [json.dumps(n, ensure_ascii=False).encode() + b":[" + _join(columns[n], ",") + b"]" for n in names]
+        return b"{" + b",".join(parts) + b"}"
+    return b"[" + _join(_row_texts(columns), ",") + b"]"
+
+
+def _row_texts(columns: Dict[str, pa.Array]) -> pa.Array:
+    """One ``{"col": v, ...}`` string per row, built element-wise from the column texts."""
+    if not columns:
+        return pa.array([], pa.string())
+    pieces: List[Any] = []
+    for i, (name, texts) in enumerate(columns.items()):
+        pieces += [("{" if i == 0 else ",") + json.dumps(name, ensure_ascii=False) + ":", texts]
+    pieces.append("}")
+    return pc.binary_join_element_wise(*pieces, "")
+
+
+def encode_ndjson(data: pa.Table | pa.RecordBatch | pd.DataFrame) -> bytes:
+    """Newline-delimited JSON objects, one per row, with a trailing newline."""
+    columns = _pandas_texts(data) if isinstance(data, pd.DataFrame) else _arrow_columns(data)
+    body = _join(_row_texts(columns), "\n")
+    return body + b"\n" if body else b""
+
+
+def json_envelope(fields: Dict[str, Any], key: str, data: Any, orient: str = "records") -> bytes:
+    """``{**fields, key: <encoded data>}`` as bytes; ``fields`` are small and go through the json module."""
+    head = dumps_json(fields)[:-1]
+    sep = b"," if fields else b""
+    return head + sep + json.dumps(key).encode() + b":" + encode_json(data, orient) + b"}"
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from snowflake.snowpark import Session
+from snowflake.snowpark.functions import col, lit
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, every process refreshes.
+    fcntl = None
+
+from .eda import _covid_table_name, fetch_arrow, metric_name
+from .paging import RowFilter, arrow_filter, sort_keys
+
+
+_AGG_FUNCS = {"sum": "sum", "avg": "mean", "max": "max", "min": "min", "count": "count"}
+
+_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_loaded: Dict[str, Any] = {"path": None, "mtime": None, "table": None}
+_stats: Dict[str, Any] = {"refreshes": 0, "rows_pulled": 0, "last_refresh_seconds": None, "last_error": None}
+_refresher: threading.Thread | None = None
+_stop = threading.Event()
+# Open while this process holds the refresher lock; the lock goes away with the file or the process.
+_writer_file = None
+
+
+def snapshot_dir() -> str | None:
+    return os.getenv("COVID_SNAPSHOT_DIR") or None
+
+
+def snapshot_enabled() -> bool:
+    return snapshot_dir() is not None
+
+
+def _date_col() -> str:
+    return os.getenv("COVID_SNAPSHOT_DATE_COL", "DATE")
+
+
+def _snapshot_path() -> str:
+    base_dir = snapshot_dir()
+    os.makedirs(base_dir, exist_ok=True)
+    safe = _covid_table_name().replace(".", "_").lower()
+    return os.path.join(base_dir, f"{safe}.arrow")
+
+
+def write_snapshot(table: pa.Table, path: str | None = None) -> str:
+    """Atomically write ``table`` as an uncompressed Arrow IPC file so readers can mmap it."""
+    path = path or _snapshot_path()
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+    return path
+
+
+def load_snapshot(path: str | None = None) -> pa.Table | None:
+    """Memory-map the snapshot; the mapping is shared with every other worker via the page cache."""
+    if path is None:
+        if not snapshot_enabled():
+            return None
+        path = _snapshot_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _lock:
+        if _loaded["path"] == path and _loaded["mtime"] == mtime:
+            return _loaded["table"]
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        _loaded.update(path=path, mtime=mtime, table=table)
+        return table
+
+
+def _watermark(table: pa.Table, date_col: str) -> Any:
+    return pc.max(table[date_col]).as_py()
+
+
+def merge_increment(existing: pa.Table | None, increment: pa.Table, date_col: str, watermark: Any) -> pa.Table:
+    """Replace rows on/after ``watermark`` with ``increment`` (the last day may have been partial)."""
+    if existing is None:
+        return increment
+    if increment.num_rows and increment.schema != existing.schema:
+        try:
+            increment = increment.cast(existing.schema)
+        except (pa.ArrowInvalid, ValueError):
+            pass
+    kept = existing.filter(pc.less(existing[date_col], pa.scalar(watermark, existing.schema.field(date_col).type)))
+    return pa.concat_tables([kept, increment], promote_options="default")
+
+
+def refresh_snapshot(s: Session) -> Dict[str, Any]:
+    """Materialize COVID_TABLE on first run, afterwards pull only rows at/after the max date."""
+    started = time.perf_counter()
+    date_col = _date_col()
+    existing = load_snapshot()
+    df = s.table(_covid_table_name())
+    watermark = None
+    if existing is not None and existing.num_rows:
+        watermark = _watermark(existing, date_col)
+        df = df.where(col(date_col) >= lit(watermark))
+    increment = fetch_arrow(df)
+    table = merge_increment(existing if watermark is not None else None, increment, date_col, watermark)
+    write_snapshot(table)
+    elapsed = time.perf_counter() - started
+    with _stats_lock:
+        _stats["refreshes"] += 1
+        _stats["rows_pulled"] += increment.num_rows
+        _stats["last_refresh_seconds"] = round(elapsed, 3)
+        _stats["last_error"] = None
+    return {"rows": table.num_rows, "pulled": increment.num_rows, "watermark": str(_watermark(table, date_col)), "seconds": round(elapsed, 3)}
+
+
+def _resolve(table: pa.Table, name: str | None) -> str | None:
+    if name is None:
+        return None
+    if name in table.column_names:
+        return name
+    by_upper = {c.upper(): c for c in table.column_names}
+    return by_upper.get(name.upper())
+
+
+def aggregate_metrics(
+    date_col: str,
+    value_cols: list[str],
+    geo_col: str | None = None,
+    aggs: list[str] | None = None,
+    limit: int = 1000,
+    table: pa.Table | None = None,
+    row_filter: RowFilter | None = None,
+    newest: bool = False,
+) -> pa.Table | None:
+    """Answer an aggregate_metrics_table() query from the local snapshot.
+
+    Returns None when there is no snapshot or it lacks one of the columns, so the
+    caller can fall back to Snowflake. ``newest`` keeps the last ``limit`` rows.
+    """
+    table = table if table is not None else load_snapshot()
+    if table is None:
+        return None
+    d, g = _resolve(table, date_col), _resolve(table, geo_col)
+    resolved = {v: _resolve(table, v) for v in value_cols}
+    if d is None or (geo_col and g is None) or any(r is None for r in resolved.values()):
+        return None
+
+    unknown = [a for a in aggs or ["sum"] if a.lower() not in _AGG_FUNCS]
+    if unknown:
+        raise ValueError(f"Unknown agg(s): {', '.join(unknown)}; use {', '.join(_AGG_FUNCS)}")
+    keys = [d, g] if g else [d]
+    specs, renames = [], {d: "date"}
+    if g:
+        renames[g] = "geo"
+    for v in value_cols:
+        for agg in aggs or ["sum"]:
+            fn = _AGG_FUNCS[agg.lower()]
+            out_name = f"{resolved[v]}_{fn}"
+            if out_name not in renames:
+                specs.append((resolved[v], fn))
+                renames[out_name] = metric_name(v, agg)
+    columns = list(dict.fromkeys(keys + [v for v, _ in specs]))
+    rows = arrow_filter(table.select(columns), row_filter, d, g)
+    grouped = rows.group_by(keys).aggregate(specs)
+    grouped = grouped.rename_columns([renames[c] for c in grouped.column_names])
+    grouped = sort_keys(grouped)
+    grouped = grouped.slice(max(grouped.num_rows - int(limit), 0)) if newest else grouped.slice(0, int(limit))
+    order = ["date", "geo"] if g else ["date"]
+    return grouped.select(order + [c for c in grouped.column_names if c not in order])
+
+
+def aggregate(
+    date_col: str,
+    value_col: str,
+    geo_col: str | None = None,
+    agg: str = "sum",
+    limit: int = 1000,
+    table: pa.Table | None = None,
+    row_filter: RowFilter | None = None,
+    newest: bool = False,
+) -> pa.Table | None:
+    """Single-metric aggregate_timeseries_table() equivalent; the metric column is named ``value``."""
+    out = aggregate_metrics(
+        date_col, [value_col], geo_col=geo_col, aggs=[agg], limit=limit, table=table, row_filter=row_filter, newest=newest
+    )
+    if out is None:
+        return None
+    return out.rename_columns([c if c in ("date", "geo") else "value" for c in out.column_names])
+
+
+def snapshot_stats() -> Dict[str, Any]:
+    table = load_snapshot()
+    with _stats_lock:
+        out = dict(_stats, enabled=snapshot_enabled(), writer=_writer_file is not None)
+    if table is not None:
+        out["rows"] = table.num_rows
+        out["bytes"] = table.nbytes
+        date_col = _date_col()
+        if date_col in table.column_names and table.num_rows:
+            out["watermark"] = str(_watermark(table, date_col))
+    return out
+
+
+def _elect_writer() -> bool:
+    """Whether this process is the one worker that refreshes the snapshot.
+
+    Every uvicorn worker runs a refresher, but only the one holding an
+    exclusive ``flock`` on the snapshot directory pulls from Snowflake; the
+    others pick the new file up through :func:`load_snapshot`. The lock dies
+    with its process, so another worker takes over on its next tick.
+    """
+    global _writer_file
+    if fcntl is None or _writer_file is not None:
+        return True
+    handle = open(os.path.join(snapshot_dir(), ".refresh.lock"), "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _writer_file = handle
+    return True
+
+
+def _release_writer() -> None:
+    global _writer_file
+    if _writer_file is not None:
+        _writer_file.close()
+        _writer_file = None
+
+
+def _refresh_loop(interval: float) -> None:
+    from .deps import sf_session
+
+    while True:
+        try:
+            os.makedirs(snapshot_dir(), exist_ok=True)
+            if _elect_writer():
+                with sf_session() as s:
+                    refresh_snapshot(s)
+            else:
+                # Re-maps only when the writer replaced the file since the last read.
+                load_snapshot()
+        except Exception as e:
+            with _stats_lock:
+                _stats["last_error"] = str(e)
+        if _stop.wait(interval):
+            return
+
+
+def start_refresher() -> None:
+    global _refresher
+    if not snapshot_enabled() or _refresher is not None:
+        return
+    interval = float(os.getenv("COVID_SNAPSHOT_REFRESH_SECONDS", "3600"))
+    _stop.clear()
+    _refresher = threading.Thread(target=_refresh_loop, args=(interval,), name="snapshot-refresh", daemon=True)
+    _refresher.start()
+
+
+def stop_refresher() -> None:
+    global _refresher
+    _stop.set()
+    _refresher = None
+    _release_writer()
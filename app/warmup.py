@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import importlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from app import metrics
+
+
+DEFAULT_MODULES = (
+    "numpy,pandas,pyarrow,pyarrow.compute,pyarrow.ipc,snowflake.snowpark,snowflake.snowpark.functions,"
+    "app.deps,app.cache,app.executor,app.eda,app.data,app.formats,app.rollup,app.snapshot,app.mobility,"
+    "app.downsample,app.analytics,app.forecast,app.nosql,app.schema"
+)
+DEFAULT_QUERIES = "schema,mobility,aggregate:DATE:CASES"
+# Without these a worker cannot serve; any other failed step only leaves a cache cold.
+REQUIRED_STEPS = ("sessions",)
+
+_status: Dict[str, Any] = {
+    "state": "pending",
+    "started_at": None,
+    "finished_at": None,
+    "seconds": None,
+    "imports": {},
+    "steps": {},
+    "errors": {},
+}
+_lock = threading.Lock()
+_done = threading.Event()
+_thread: threading.Thread | None = None
+_retry: threading.Thread | None = None
+
+
+def _env_list(name: str, default: str) -> List[str]:
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+def record_import(module: str, seconds: float) -> None:
+    with _lock:
+        _status["imports"][module] = round(seconds, 4)
+    metrics.observe_stage("import", seconds)
+
+
+def preload_modules(modules: List[str]) -> None:
+    for name in modules:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            with _lock:
+                _status["errors"][f"import:{name}"] = str(e)
+            continue
+        record_import(name, time.perf_counter() - started)
+
+
+def open_sessions(count: int) -> None:
+    """Lease ``count`` sessions at once so the pool holds that many logged-in connections."""
+    from app.deps import get_session_pool
+
+    pool = get_session_pool()
+    leased = []
+    try:
+        for _ in range(min(count, pool.max_size)):
+            leased.append(pool.acquire())
+    finally:
+        for s in leased:
+            pool.release(s)
+
+
+def _query(spec: str) -> Callable[[], Any]:
+    """``schema`` | ``mobility`` | ``aggregate:DATE_COL:VALUE_COL[:GEO_COL]`` | ``rollup:DATE_COL:VALUE_COL[:GEO_COL]``."""
+    kind, *args = spec.split(":")
+    if kind == "schema":
+        from app.schema import refresh_all
+        return refresh_all
+    if kind == "mobility":
+        from app.mobility import get_mobility_table
+        return lambda: get_mobility_table()
+    if kind in ("aggregate", "rollup") and len(args) in (2, 3):
+        date_col, value_col = args[0], args[1]
+        geo_col = args[2] if len(args) == 3 else None
+        if kind == "rollup":
+            from app.rollup import get_cube
+            return lambda: get_cube(date_col, value_col, geo_col)
+        from app.data import fetch_aggregate_table
+        return lambda: fetch_aggregate_table(date_col, value_col, geo_col=geo_col)
+    raise ValueError(f"Unknown warm-up query {spec!r}")
+
+
+def _step(name: str, fn: Callable[[], Any]) -> None:
+    started = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        with _lock:
+            _status["errors"][name] = str(e)
+    else:
+        with _lock:
+            _status["errors"].pop(name, None)
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            _status["steps"][name] = round(elapsed, 4)
+        metrics.observe_stage("warmup", elapsed)
+
+
+def _settle() -> List[str]:
+    """Set ``state`` from the recorded errors; returns the failed required steps."""
+    with _lock:
+        failed = [name for name in REQUIRED_STEPS if name in _status["errors"]]
+        _status["state"] = "failed" if failed else ("degraded" if _status["errors"] else "ready")
+    return failed
+
+
+def _retry_sessions(count: int, interval: float) -> None:
+    """Keep trying to open the pool's sessions; the worker turns ready once it succeeds."""
+    global _retry
+    while True:
+        time.sleep(interval)
+        _step("sessions", lambda: open_sessions(count))
+        if not _settle():
+            break
+    _retry = None
+
+
+def run_warmup() -> Dict[str, Any]:
+    """Preload modules, open pooled sessions and prime the declared hot queries.
+
+    Controlled by WARMUP_MODULES, WARMUP_SESSIONS and WARMUP_QUERIES (comma
+    separated; empty disables a phase). Failures are recorded, never raised.
+    A failed session step leaves the worker ``failed`` (not ready) and is
+    retried every WARMUP_RETRY_SECONDS; other failures leave it ``degraded``.
+    """
+    global _retry
+    started = time.perf_counter()
+    with _lock:
+        _status.update(state="running", started_at=time.time())
+    _step("modules", lambda: preload_modules(_env_list("WARMUP_MODULES", DEFAULT_MODULES)))
+    sessions = int(os.getenv("WARMUP_SESSIONS", "1"))
+    if sessions > 0:
+        _step("sessions", lambda: open_sessions(sessions))
+    for spec in _env_list("WARMUP_QUERIES", DEFAULT_QUERIES):
+        _step(f"query:{spec}", lambda spec=spec: _query(spec)())
+    with _lock:
+        _status.update(finished_at=time.time(), seconds=round(time.perf_counter() - started, 4))
+    failed = _settle()
+    _done.set()
+    if failed and _retry is None:
+        interval = float(os.getenv("WARMUP_RETRY_SECONDS", "30"))
+        _retry = threading.Thread(target=_retry_sessions, args=(sessions, interval), name="warmup-retry", daemon=True)
+        _retry.start()
+    return status()
+
+
+def start(blocking: bool | None = None) -> None:
+    """Run the warm-up at startup; in the background unless WARMUP_BLOCKING is set."""
+    global _thread
+    if os.getenv("WARMUP_ENABLED", "1").lower() in ("0", "false", "no"):
+        with _lock:
+            _status["state"] = "ready"
+        _done.set()
+        return
+    if blocking is None:
+        blocking = os.getenv("WARMUP_BLOCKING", "0").lower() in ("1", "true", "yes")
+    if blocking:
+        run_warmup()
+        return
+    if _thread is None:
+        _thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+        _thread.start()
+
+
+def is_ready() -> bool:
+    """Warm-up finished and every required step succeeded."""
+    with _lock:
+        return _done.is_set() and _status["state"] != "failed"
+
+
+def status() -> Dict[str, Any]:
+    with _lock:
+        return {
+            **_status,
+            "ready": _done.is_set() and _status["state"] != "failed",
+            "imports": dict(_status["imports"]),
+            "steps": dict(_status["steps"]),
+            "errors": dict(_status["errors"]),
+        }
+
+
+def _gauges() -> Dict[str, float]:
+    with _lock:
+        values = {f"step:{k}": v for k, v in _status["steps"].items()}
+        values["import_seconds_total"] = sum(_status["imports"].values())
+        values["seconds"] = _status["seconds"] or 0.0
+    values["ready"] = 1.0 if is_ready() else 0.0
+    return values
+
+
+metrics.register_gauges("app_warmup_seconds", "Startup import and warm-up timings.", _gauges)
@@ -0,0 +1,94 @@
+"""Annotation store at scale: SQLite (WAL, indexed) versus the old TinyDB file.
+
+TinyDB rewrites the whole JSON document on every insert and scans it on every
+query, so its single-insert and geo-filter cost grows with the store size.
+
+    python benchmarks/bench_annotations.py --n 100000 --geos 58
+"""
+import argparse
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import nosql
+
+
+def timeit(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {"p50_ms": round(samples[len(samples) // 2] * 1000, 3), "min_ms": round(samples[0] * 1000, 3)}
+
+
+def synthetic(n: int, geos: int) -> list:
+    start = datetime(2020, 3, 1)
+    return [
+        {
+            "geo": f"County{i % geos:02d}",
+            "text": f"note {i}",
+            "author": "bench",
+            "created_at": (start + timedelta(minutes=i)).isoformat() + "Z",
+        }
+        for i in range(n)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--geos", type=int, default=58)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--skip-tinydb", action="store_true")
+    args = parser.parse_args()
+
+    items = synthetic(args.n, args.geos)
+    results = {"annotations": args.n}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["NOSQL_DIR"] = tmp
+        t0 = time.perf_counter()
+        nosql.add_annotations(items)
+        results["sqlite_bulk_insert_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        results["sqlite_single_insert"] = timeit(lambda: nosql.add_annotation("County00", "one more"), args.repeat)
+        results["sqlite_geo_first_page"] = timeit(lambda: nosql.list_annotations_page(geo="County07", limit=100), args.repeat)
+
+        _, cursor = nosql.list_annotations_page(geo="County07", limit=1500)
+        results["sqlite_geo_deep_page"] = timeit(
+            lambda: nosql.list_annotations_page(geo="County07", cursor=cursor, limit=100), args.repeat
+        )
+        mid = items[args.n // 2]["created_at"]
+        results["sqlite_time_range_day"] = timeit(
+            lambda: nosql.list_annotations_page(start=mid, end=nosql._iso(datetime.fromisoformat(mid[:-1]) + timedelta(days=1))),
+            args.repeat,
+        )
+        results["sqlite_geo_all"] = timeit(lambda: nosql.list_annotations(geo="County07"), args.repeat)
+
+        if not args.skip_tinydb:
+            from tinydb import Query, TinyDB
+
+            path = os.path.join(tmp, "tiny.json")
+            with open(path, "w") as fh:
+                json.dump({"_default": {str(i + 1): d for i, d in enumerate(items)}}, fh)
+            repeat = max(3, args.repeat // 5)
+            results["tinydb_single_insert"] = timeit(
+                lambda: TinyDB(path).insert({"geo": "County00", "text": "one more", "author": "bench", "created_at": "x"}),
+                repeat,
+            )
+            results["tinydb_geo_all"] = timeit(lambda: TinyDB(path).search(Query().geo == "County07"), repeat)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
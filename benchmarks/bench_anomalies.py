@@ -0,0 +1,72 @@
+"""Rolling median/MAD z-scores for every geo: a pandas rolling apply versus app.anomalies.
+
+"full" scores the whole history with strided windows; "incremental" appends
+one day to an existing rolling state, which is what a refresh does once a
+new day lands.
+
+    python benchmarks/bench_anomalies.py --days 1000 --geos 59 --window 28
+"""
+import argparse
+import json
+import pathlib
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import anomalies
+
+
+def pandas_rolling(Y: np.ndarray, window: int) -> np.ndarray:
+    # Per-geo rolling windows with MAD computed by a Python callback per window.
+    frame = pd.DataFrame(Y.T)
+    prior = frame.shift(1)
+    median = prior.rolling(window).median()
+    mad = prior.rolling(window).apply(lambda w: np.median(np.abs(w - np.median(w))), raw=True)
+    scale = np.maximum(anomalies.MAD_SCALE * mad, 1.0)
+    return ((frame - median) / scale).to_numpy().T
+
+
+def timed(fn, repeat: int) -> float:
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - started)
+    return round(sorted(runs)[len(runs) // 2] * 1000, 2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=1000)
+    parser.add_argument("--geos", type=int, default=59)
+    parser.add_argument("--window", type=int, default=28)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    Y = np.random.default_rng(0).poisson(40, (args.geos, args.days)).astype(float)
+    dates = np.arange(args.days).astype("datetime64[D]")
+    geos = [f"geo{i}" for i in range(args.geos)]
+    _, _, z = anomalies.rolling_scores(Y, args.window)
+    legacy = pandas_rolling(Y, args.window)[:, args.window:]
+    np.testing.assert_allclose(z, legacy)
+
+    base = anomalies.update_state(None, dates[:-1], geos, Y[:, :-1], args.window)
+    results = {
+        "days": args.days,
+        "geos": args.geos,
+        "window": args.window,
+        "pandas_rolling_apply_ms": timed(lambda: pandas_rolling(Y, args.window), max(1, args.repeat // 5)),
+        "strided_full_ms": timed(lambda: anomalies.update_state(None, dates, geos, Y, args.window), args.repeat),
+        "incremental_one_day_ms": timed(lambda: anomalies.update_state(base, dates, geos, Y, args.window), args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Payload size and latency of /covid/aggregate rows with and without max_points.
+
+Serializes the same way the JSON response does (list of row dicts) so the
+byte counts reflect what the dashboard downloads.
+
+    python benchmarks/bench_downsample.py --points 1000 10000 100000 1000000
+"""
+import argparse
+import json
+import pathlib
+import sys
+import time
+
+import numpy as np
+import pyarrow as pa
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.downsample import downsample_table
+
+
+def series(n: int) -> pa.Table:
+    rng = np.random.default_rng(0)
+    dates = np.datetime64("1990-01-01") + np.arange(n).astype("timedelta64[D]")
+    values = np.cumsum(rng.normal(0, 10, n)) + 1000
+    return pa.table({"date": pa.array(dates.astype("datetime64[D]")), "value": pa.array(values)})
+
+
+def payload_bytes(table: pa.Table) -> int:
+    return len(json.dumps({"cached": True, "rows": table.to_pylist()}, default=str).encode())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--max-points", type=int, default=1500)
+    args = parser.parse_args()
+
+    results = []
+    for n in args.points:
+        table = series(n)
+        t0 = time.perf_counter()
+        raw_bytes = payload_bytes(table)
+        raw_s = time.perf_counter() - t0
+
+        row = {"points": n, "raw_bytes": raw_bytes, "raw_serialize_ms": round(raw_s * 1000, 2)}
+        for method in ("lttb", "minmax"):
+            t0 = time.perf_counter()
+            small = downsample_table(table, args.max_points, method=method)
+            ds_s = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            small_bytes = payload_bytes(small)
+            ser_s = time.perf_counter() - t0
+            row[method] = {
+                "rows": small.num_rows,
+                "bytes": small_bytes,
+                "downsample_ms": round(ds_s * 1000, 2),
+                "serialize_ms": round(ser_s * 1000, 2),
+            }
+        results.append(row)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Drive every endpoint through the ASGI app against a local Snowpark stand-in.
+
+No Snowflake credentials are needed: the session pool is pointed at
+``fake_snowpark.FakeSession`` over synthetic California-sized tables, with a
+simulated warehouse round trip per query. For each endpoint the first (cold)
+request is timed on its own, then ``--requests`` more are issued at
+``--concurrency`` to get p50/p95/p99 and throughput. Results, including peak
+RSS, are written as JSON; pass ``--compare`` an earlier file to see deltas.
+
+    python benchmarks/bench_endpoints.py --concurrency 16 --requests 200 --latency-ms 80
+    python benchmarks/bench_endpoints.py --compare benchmarks/results/endpoints-abc1234.json
+"""
+import argparse
+import asyncio
+import datetime as dt
+import json
+import os
+import pathlib
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from fake_snowpark import CASES_TABLE, FakeSession, california_tables
+
+
+# (name, method, path, params)
+ENDPOINTS = [
+    ("health", "GET", "/health", {}),
+    ("sf_ping", "GET", "/sf/ping", {}),
+    ("covid_summary", "GET", "/covid/summary", {"limit": 5}),
+    ("covid_columns", "GET", "/covid/columns", {}),
+    ("aggregate_json", "GET", "/covid/aggregate", {"date_col": "DATE", "value_col": "CASES", "limit": 1000}),
+    ("aggregate_arrow", "GET", "/covid/aggregate", {"date_col": "DATE", "value_col": "CASES", "limit": 1000, "format": "arrow"}),
+    ("aggregate_geo", "GET", "/covid/aggregate", {"date_col": "DATE", "value_col": "CASES", "geo_col": "AREA", "limit": 100000}),
+    ("aggregate_geo_downsampled", "GET", "/covid/aggregate", {"date_col": "DATE", "value_col": "DEATHS", "geo_col": "AREA", "limit": 100000, "max_points": 200}),
+    ("aggregate_month_grain", "GET", "/covid/aggregate", {"date_col": "DATE", "value_col": "CASES", "grain": "month", "limit": 1000}),
+    ("aggregate_batch", "GET", "/covid/aggregate/batch", [("date_col", "DATE"), ("value_col", "TOTAL_TESTS"), ("value_col", "POSITIVE_TESTS"), ("agg", "sum"), ("agg", "avg")]),
+    ("analytics_summary", "GET", "/analytics/summary", {}),
+    ("analytics_summary_geo", "GET", "/analytics/summary", {"geo_col": "AREA", "top": 10}),
+    ("analytics_forecast", "GET", "/analytics/forecast", {"periods": 14}),
+    ("analytics_forecast_geo", "GET", "/analytics/forecast", {"periods": 14, "geo_col": "AREA", "seasonal": "true"}),
+    ("eda_mobility", "GET", "/eda/mobility", {}),
+    ("eda_mobility_county_week", "GET", "/eda/mobility", {"county": "Alameda", "grain": "week"}),
+    ("annotations_add", "POST", "/annotations", {"geo": "Alameda", "text": "bench", "author": "bench"}),
+    ("annotations_list", "GET", "/annotations", {"geo": "Alameda", "limit": 100}),
+    ("cache_stats", "GET", "/cache/stats", {}),
+]
+
+
+def _percentile(sorted_ms, q: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    idx = min(len(sorted_ms) - 1, max(0, round(q * (len(sorted_ms) - 1))))
+    return round(sorted_ms[idx], 3)
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+async def _one(client, method: str, path: str, params):
+    t0 = time.perf_counter()
+    resp = await client.request(method, path, params=params)
+    await resp.aread()
+    return (time.perf_counter() - t0) * 1000, resp.status_code
+
+
+async def _drive(client, method: str, path: str, params, total: int, concurrency: int) -> dict:
+    latencies, statuses = [], {}
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            ms, status = await _one(client, method, path, params)
+            latencies.append(ms)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": total,
+        "p50_ms": _percentile(latencies, 0.50),
+        "p95_ms": _percentile(latencies, 0.95),
+        "p99_ms": _percentile(latencies, 0.99),
+        "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    from app.deps import SessionPool, set_session_pool
+    from app.main import app
+
+    tables = california_tables(days=args.days)
+    sessions = []
+
+    def factory():
+        s = FakeSession(tables, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000)
+        sessions.append(s)
+        return s
+
+    set_session_pool(SessionPool(factory, max_size=args.pool_size))
+    results = {}
+    selected = [e for e in ENDPOINTS if not args.only or any(o in e[0] for o in args.only)]
+    async with app.router.lifespan_context(app):
+        from app.warmup import status
+        warm = status()
+        print(f"warm-up {warm['seconds']} s, imports {sum(warm['imports'].values()):.3f} s, errors {warm['errors'] or 'none'}")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for name, method, path, params in selected:
+                cold_ms, cold_status = await _one(client, method, path, params)
+                stats = await _drive(client, method, path, params, args.requests, args.concurrency)
+                results[name] = {"cold_ms": round(cold_ms, 3), "cold_status": cold_status, **stats}
+                print(f"{name:28s} cold {cold_ms:9.1f} ms  p50 {stats['p50_ms']:8.2f}  p95 {stats['p95_ms']:8.2f}  "
+                      f"p99 {stats['p99_ms']:8.2f}  {stats['throughput_rps']:8.1f} req/s  {stats['statuses']}")
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "concurrency": args.concurrency,
+            "requests_per_endpoint": args.requests,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "days": args.days,
+            "pool_size": args.pool_size,
+            "warehouse_queries": sum(s.queries for s in sessions),
+            "warmup": {k: warm[k] for k in ("seconds", "imports", "steps", "errors")},
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+        "endpoints": results,
+    }
+
+
+def compare(current: dict, baseline: dict) -> None:
+    print(f"\nvs {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')})")
+    for name, now in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        parts = []
+        for key in ("p50_ms", "p95_ms", "throughput_rps"):
+            if before.get(key):
+                parts.append(f"{key} {100 * (now[key] - before[key]) / before[key]:+6.1f}%")
+        print(f"{name:28s} " + "  ".join(parts))
+    print(f"{'peak_rss_mb':28s} {current['peak_rss_mb']} (was {baseline.get('peak_rss_mb')})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint after the cold one")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="simulated warehouse round trip per query")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--days", type=int, default=1000)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--only", nargs="*", help="substrings of endpoint names to run")
+    parser.add_argument("--out", help="JSON output path (default benchmarks/results/endpoints-<commit>.json)")
+    parser.add_argument("--compare", help="earlier JSON result to diff against")
+    parser.add_argument("--no-warmup", action="store_true", help="skip the startup warm-up (WARMUP_ENABLED=0)")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-endpoints-")
+    os.environ["COVID_TABLE"] = CASES_TABLE
+    os.environ["NOSQL_DIR"] = tmp
+    os.environ.pop("COVID_SNAPSHOT_DIR", None)
+    os.environ.pop("ANALYTICS_API_BASE", None)
+    # Finish the startup warm-up before timing so "cold" means first request after a ready app.
+    os.environ["WARMUP_BLOCKING"] = "1"
+    if args.no_warmup:
+        os.environ["WARMUP_ENABLED"] = "0"
+
+    report = asyncio.run(run(args))
+    out = pathlib.Path(args.out or ROOT / "benchmarks" / "results" / f"endpoints-{report['meta']['commit']}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"\npeak RSS {report['peak_rss_mb']} MB, {report['meta']['warehouse_queries']} warehouse queries -> {out}")
+    if args.compare:
+        compare(report, json.loads(pathlib.Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    main()
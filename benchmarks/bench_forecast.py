@@ -0,0 +1,53 @@
+"""Fit time for one series versus every county at once.
+
+    python benchmarks/bench_forecast.py --days 1000 --geos 58
+"""
+import argparse
+import json
+import pathlib
+import sys
+import time
+
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import forecast
+
+
+def timeit(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {"p50_ms": round(samples[len(samples) // 2] * 1000, 3), "min_ms": round(samples[0] * 1000, 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=1000)
+    parser.add_argument("--geos", type=int, default=58)
+    parser.add_argument("--periods", type=int, default=14)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    Y = rng.poisson(40, (args.geos, args.days)).astype(float)
+    results = {"days": args.days, "geos": args.geos}
+    for seasonal in (False, True):
+        label = "holt_winters" if seasonal else "holt"
+        results[f"{label}_one_series"] = timeit(lambda: forecast.fit_forecast(Y[:1], args.periods, seasonal=seasonal), args.repeat)
+        results[f"{label}_all_geos"] = timeit(lambda: forecast.fit_forecast(Y, args.periods, seasonal=seasonal), args.repeat)
+        results[f"{label}_geo_by_geo"] = timeit(
+            lambda: [forecast.fit_forecast(Y[i:i + 1], args.periods, seasonal=seasonal) for i in range(args.geos)],
+            max(1, args.repeat // 5),
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare rollup-cube lookups with re-aggregating raw rows on every request.
+
+The "scan" path runs the same vectorized group-by the local snapshot uses for
+/covid/aggregate, which is a lower bound for the Snowflake pushdown path (that
+also pays a network round trip and warehouse queueing).
+
+    python benchmarks/bench_rollup.py --days 1000 --geos 58
+"""
+import argparse
+import json
+import pathlib
+import sys
+import time
+
+import numpy as np
+import pyarrow as pa
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import rollup, snapshot
+
+
+def synthetic(days: int, geos: int, rows_per_geo_day: int) -> pa.Table:
+    rng = np.random.default_rng(0)
+    start = np.datetime64("2020-01-01")
+    n = days * geos * rows_per_geo_day
+    dates = start + np.repeat(np.arange(days), geos * rows_per_geo_day).astype("timedelta64[D]")
+    areas = np.tile(np.repeat(np.array([f"County{i:02d}" for i in range(geos)]), rows_per_geo_day), days)
+    return pa.table({
+        "DATE": pa.array(dates.astype("datetime64[D]")),
+        "AREA": pa.array(areas),
+        "CASES": pa.array(rng.poisson(40, n)),
+    })
+
+
+def timeit(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return {"p50_ms": round(samples[len(samples) // 2] * 1000, 3), "min_ms": round(samples[0] * 1000, 3)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=1000)
+    parser.add_argument("--geos", type=int, default=58)
+    parser.add_argument("--rows-per-geo-day", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    raw = synthetic(args.days, args.geos, args.rows_per_geo_day)
+    results = {"rows": raw.num_rows}
+
+    t0 = time.perf_counter()
+    daily = raw.group_by(["DATE", "AREA"]).aggregate(
+        [("CASES", "sum"), ("CASES", "count"), ("CASES", "min"), ("CASES", "max")]
+    )
+    daily = daily.select(["DATE", "AREA", "CASES_sum", "CASES_count", "CASES_min", "CASES_max"])
+    daily = daily.rename_columns(["date", "geo", "sum", "count", "min", "max"])
+    cube = rollup.build_cube(daily)
+    results["cube_build_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+
+    for grain in rollup.GRAINS:
+        for geo in (None, "AREA"):
+            label = f"{grain}{'_geo' if geo else ''}"
+            if geo is None:
+                flat = daily.group_by(["date"]).aggregate(
+                    [("sum", "sum"), ("count", "sum"), ("min", "min"), ("max", "max")]
+                )
+                flat = rollup.build_cube(
+                    flat.select(["date", "sum_sum", "count_sum", "min_min", "max_max"])
+                    .rename_columns(["date", "sum", "count", "min", "max"])
+                )
+            target = cube if geo else flat
+            results[f"lookup_{label}"] = timeit(lambda: rollup.lookup(target, grain=grain, agg="sum", limit=20000), args.repeat)
+            if grain == "day":
+                results[f"scan_{label}"] = timeit(
+                    lambda: snapshot.aggregate("DATE", "CASES", geo_col=geo, agg="sum", limit=20000, table=raw), args.repeat
+                )
+            else:
+                def scan():
+                    coarse = raw.set_column(0, "DATE", rollup._truncate(raw["DATE"], grain))
+                    keys = ["DATE", "AREA"] if geo else ["DATE"]
+                    coarse.select(keys + ["CASES"]).group_by(keys).aggregate([("CASES", "sum")]).sort_by([("DATE", "ascending")])
+
+                results[f"scan_{label}"] = timeit(scan, args.repeat)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""JSON encoding of a 100k-row result: the previous per-row paths versus app.serialize.
+
+Each path is timed (wall and CPU) and run once under tracemalloc for its peak
+Python-heap allocation. Arrow's intermediate buffers live in its own memory
+pool and are not counted; they are columnar and short-lived.
+
+    python benchmarks/bench_serialize.py --rows 100000 --geos 58
+"""
+import argparse
+import datetime as dt
+import json
+import pathlib
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pyarrow as pa
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from fastapi.encoders import jsonable_encoder
+
+from app.serialize import encode_json, json_envelope
+
+
+def build_table(rows: int, geos: int) -> pa.Table:
+    rng = np.random.default_rng(0)
+    days = max(1, rows // geos)
+    start = dt.date(2020, 3, 1)
+    dates = np.array([start + dt.timedelta(days=i) for i in range(days)], dtype="datetime64[D]")
+    values = rng.poisson(40, rows).astype(float)
+    values[rng.random(rows) < 0.02] = np.nan
+    return pa.table({
+        "date": pa.array(np.resize(np.repeat(dates, geos), rows)),
+        "geo": pa.array([f"County {i}" for i in range(geos)] * (rows // geos + 1))[:rows],
+        "value": pa.array(values),
+    })
+
+
+def legacy_json_safe_records(table: pa.Table) -> bytes:
+    # The former app.main.json_safe_records plus Starlette's JSONResponse rendering.
+    df = table.to_pandas()
+    df = df.replace({np.nan: None, np.inf: None, -np.inf: None})
+    rows = df.to_dict("records")
+    return json.dumps(jsonable_encoder({"cached": True, "rows": rows}), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def legacy_row_dicts(table: pa.Table) -> bytes:
+    # The former Row.asDict() loop with a second dict per row to lower-case keys.
+    rows = []
+    for r in table.rename_columns([c.upper() for c in table.column_names]).to_pylist():
+        d = dict(r)
+        rows.append({str(k).lower(): v for k, v in d.items()})
+    payload = jsonable_encoder({"cached": True, "rows": rows})
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def measure(fn, repeat: int) -> dict:
+    walls, cpus = [], []
+    for _ in range(repeat):
+        w, c = time.perf_counter(), time.process_time()
+        out = fn()
+        walls.append(time.perf_counter() - w)
+        cpus.append(time.process_time() - c)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    walls.sort()
+    cpus.sort()
+    return {
+        "wall_p50_ms": round(walls[len(walls) // 2] * 1000, 1),
+        "cpu_p50_ms": round(cpus[len(cpus) // 2] * 1000, 1),
+        "py_heap_peak_mb": round(peak / 2**20, 1),
+        "output_mb": round(len(out) / 2**20, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--geos", type=int, default=58)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    table = build_table(args.rows, args.geos)
+    frame = table.to_pandas()
+    assert json.loads(legacy_json_safe_records(table)) == json.loads(json_envelope({"cached": True}, "rows", table))
+
+    paths = {
+        "legacy_json_safe_records": lambda: legacy_json_safe_records(table),
+        "legacy_row_dicts": lambda: legacy_row_dicts(table),
+        "serialize_records": lambda: json_envelope({"cached": True}, "rows", table),
+        "serialize_columns": lambda: json_envelope({"cached": True}, "columns", table, orient="columns"),
+        "serialize_dataframe": lambda: encode_json(frame),
+    }
+    results = {"rows": args.rows, "geos": args.geos}
+    for name, fn in paths.items():
+        results[name] = measure(fn, args.repeat)
+        print(f"{name:26s} {results[name]}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
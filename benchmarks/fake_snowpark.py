@@ -0,0 +1,389 @@
+"""A pandas-backed stand-in for the slice of Snowpark this app uses.
+
+``FakeSession`` evaluates the real ``snowflake.snowpark.functions`` column
+expressions the app builds (col, lit, comparisons, &, |, is_null, date_trunc,
+sum/avg/min/max/count, alias) against in-memory DataFrames, and sleeps for a
+configurable "warehouse" latency on every action (collect, to_pandas,
+to_arrow, count). Transformations are eager and free, like building a lazy
+Snowpark plan.
+
+    tables = california_tables(days=1000)
+    session = FakeSession(tables, latency=0.05, jitter=0.01)
+"""
+from __future__ import annotations
+
+import datetime as dt
+import itertools
+import random
+import threading
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from snowflake.snowpark import Column, Row
+from snowflake.snowpark.functions import col
+from snowflake.snowpark.types import BooleanType, DateType, DoubleType, LongType, StringType, StructField, StructType
+
+
+CASES_TABLE = "CALIFORNIA_COVID19_DATASETS.COVID.CASES"
+MOBILITY_TABLE = "COVID19_EPIDEMIOLOGICAL_DATA.PUBLIC.GOOG_GLOBAL_MOBILITY_REPORT"
+
+COUNTIES = [
+    "Alameda", "Alpine", "Amador", "Butte", "Calaveras", "Colusa", "Contra Costa", "Del Norte",
+    "El Dorado", "Fresno", "Glenn", "Humboldt", "Imperial", "Inyo", "Kern", "Kings", "Lake",
+    "Lassen", "Los Angeles", "Madera", "Marin", "Mariposa", "Mendocino", "Merced", "Modoc",
+    "Mono", "Monterey", "Napa", "Nevada", "Orange", "Placer", "Plumas", "Riverside", "Sacramento",
+    "San Benito", "San Bernardino", "San Diego", "San Francisco", "San Joaquin", "San Luis Obispo",
+    "San Mateo", "Santa Barbara", "Santa Clara", "Santa Cruz", "Shasta", "Sierra", "Siskiyou",
+    "Solano", "Sonoma", "Stanislaus", "Sutter", "Tehama", "Trinity", "Tulare", "Tuolumne",
+    "Ventura", "Yolo", "Yuba",
+]
+
+MOBILITY_COLUMNS = [
+    "RETAIL_AND_RECREATION_CHANGE_PERC",
+    "GROCERY_AND_PHARMACY_CHANGE_PERC",
+    "PARKS_CHANGE_PERC",
+    "TRANSIT_STATIONS_CHANGE_PERC",
+    "WORKPLACES_CHANGE_PERC",
+    "RESIDENTIAL_CHANGE_PERC",
+]
+
+
+def california_tables(days: int = 1000, seed: int = 0, start: str = "2020-02-01") -> Dict[str, pd.DataFrame]:
+    """Synthetic CASES and mobility tables shaped like the California datasets (58 counties)."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=days, freq="D")
+    t = np.arange(days)
+    waves = 1.2 + np.sin(t / 60.0) + 0.8 * np.exp(-((t - 330) / 30.0) ** 2) * 6
+    weekly = 1.0 - 0.25 * (dates.dayofweek >= 5)
+
+    areas = COUNTIES + ["Unknown"]
+    population = rng.integers(1_000, 10_000_000, len(areas))
+    frames = []
+    for area, pop in zip(areas, population):
+        lam = np.maximum(pop / 1e5 * 3 * waves * weekly, 0.1)
+        cases = rng.poisson(lam)
+        tests = rng.poisson(lam * 12 + 5)
+        frames.append(pd.DataFrame({
+            "DATE": dates,
+            "AREA": area,
+            "AREA_TYPE": "County",
+            "POPULATION": float(pop),
+            "CASES": cases.astype(float),
+            "DEATHS": rng.binomial(cases, 0.012).astype(float),
+            "TOTAL_TESTS": tests.astype(float),
+            "POSITIVE_TESTS": np.minimum(cases, tests).astype(float),
+            "REPORTED_CASES": cases.astype(float),
+            "REPORTED_DEATHS": rng.binomial(cases, 0.012).astype(float),
+            "REPORTED_TESTS": tests.astype(float),
+        }))
+    cases = pd.concat(frames, ignore_index=True)
+
+    regions = [None] + [f"{c} County" for c in COUNTIES]
+    mob = []
+    for region in regions:
+        base = {c: rng.normal(-20 if "RESIDENTIAL" not in c else 10, 8, days) for c in MOBILITY_COLUMNS}
+        mob.append(pd.DataFrame({
+            "COUNTRY_REGION": "United States",
+            "PROVINCE_STATE": "California",
+            "SUB_REGION_2": region,
+            "DATE": dates,
+            **base,
+        }))
+    return {CASES_TABLE: cases, MOBILITY_TABLE: pd.concat(mob, ignore_index=True)}
+
+
+def _unquote(name: str) -> str:
+    return name[1:-1] if len(name) > 1 and name[0] == name[-1] == '"' else name.upper()
+
+
+def _as_timestamp(value: Any) -> Any:
+    if isinstance(value, dt.date) and not isinstance(value, dt.datetime):
+        return pd.Timestamp(value)
+    return value
+
+
+def _snowpark_type(dtype) -> Any:
+    if pd.api.types.is_bool_dtype(dtype):
+        return BooleanType()
+    if pd.api.types.is_integer_dtype(dtype):
+        return LongType()
+    if pd.api.types.is_float_dtype(dtype):
+        return DoubleType()
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return DateType()
+    return StringType()
+
+
+def _truncate(values: pd.Series, unit: str) -> pd.Series:
+    values = pd.to_datetime(values)
+    unit = unit.lower()
+    if unit == "day":
+        return values.dt.normalize()
+    if unit == "week":
+        return (values - pd.to_timedelta(values.dt.dayofweek, unit="D")).dt.normalize()
+    if unit == "month":
+        return values.dt.to_period("M").dt.start_time
+    if unit == "year":
+        return values.dt.to_period("Y").dt.start_time
+    raise NotImplementedError(f"date_trunc unit {unit!r}")
+
+
+_BINARY = {
+    "EqualTo": lambda a, b: a == b,
+    "NotEqualTo": lambda a, b: a != b,
+    "GreaterThan": lambda a, b: a > b,
+    "GreaterThanOrEqual": lambda a, b: a >= b,
+    "LessThan": lambda a, b: a < b,
+    "LessThanOrEqual": lambda a, b: a <= b,
+    "And": lambda a, b: a & b,
+    "Or": lambda a, b: a | b,
+    "Add": lambda a, b: a + b,
+    "Subtract": lambda a, b: a - b,
+    "Multiply": lambda a, b: a * b,
+    "Divide": lambda a, b: a / b,
+}
+_AGGS = {"sum": "sum", "avg": "mean", "mean": "mean", "min": "min", "max": "max", "count": "count"}
+
+_counter = itertools.count()
+
+
+class FakeDataFrame:
+    def __init__(self, session: "FakeSession", frame: pd.DataFrame, refs: Dict[int, tuple] | None = None):
+        self._session = session
+        self._frame = frame
+        # id(expression) -> (expression, column name) for columns handed out by df["NAME"].
+        self._refs: Dict[int, tuple] = dict(refs or {})
+
+    # -- expression evaluation -------------------------------------------------
+    def _column_name(self, name: str) -> str:
+        if name in self._frame.columns:
+            return name
+        by_upper = {str(c).upper(): c for c in self._frame.columns}
+        if name.upper() in by_upper:
+            return by_upper[name.upper()]
+        raise KeyError(f"invalid identifier '{name}'")
+
+    def _attr(self, expr) -> str:
+        ref = self._refs.get(id(expr))
+        if ref is not None and ref[0] is expr:
+            return ref[1]
+        return self._column_name(_unquote(expr.name))
+
+    def _eval(self, expr) -> Any:
+        kind = type(expr).__name__
+        if kind == "UnresolvedAttribute":
+            return self._frame[self._attr(expr)]
+        if kind == "Literal":
+            return _as_timestamp(expr.value)
+        if kind == "Alias":
+            return self._eval(expr.child)
+        if kind in _BINARY:
+            return _BINARY[kind](self._eval(expr.left), self._eval(expr.right))
+        if kind == "Not":
+            return ~self._eval(expr.child)
+        if kind == "IsNull":
+            return self._eval(expr.child).isna()
+        if kind == "IsNotNull":
+            return self._eval(expr.child).notna()
+        if kind == "Cast":
+            return self._eval(expr.child)
+        if kind == "InExpression":
+            return self._eval(expr.columns).isin([self._eval(v) for v in expr.values])
+        if kind == "FunctionExpression" and expr.name.lower() == "date_trunc":
+            return _truncate(self._eval(expr.children[1]), expr.children[0].value)
+        raise NotImplementedError(f"FakeSession cannot evaluate {kind} {getattr(expr, 'name', '')}")
+
+    @staticmethod
+    def _expr(c):
+        return col(c)._expression if isinstance(c, str) else c._expression
+
+    def _output_name(self, expr) -> str:
+        kind = type(expr).__name__
+        if kind == "Alias":
+            return _unquote(expr.name)
+        if kind == "UnresolvedAttribute":
+            return _unquote(expr.name)
+        if kind == "FunctionExpression":
+            return f"{expr.name.upper()}({', '.join(self._output_name(c) for c in expr.children)})"
+        return f"EXPR_{next(_counter)}"
+
+    def _derive(self, frame: pd.DataFrame) -> "FakeDataFrame":
+        return FakeDataFrame(self._session, frame, self._refs)
+
+    # -- transformations -------------------------------------------------------
+    @property
+    def columns(self) -> List[str]:
+        return [str(c) for c in self._frame.columns]
+
+    @property
+    def schema(self) -> StructType:
+        # Like Snowpark, describing a DataFrame is a round trip to the warehouse.
+        self._session._execute(0)
+        return StructType([StructField(str(c), _snowpark_type(dtype)) for c, dtype in self._frame.dtypes.items()])
+
+    def __getitem__(self, name: str) -> Column:
+        c = col(name)
+        self._refs[id(c._expression)] = (c._expression, self._column_name(_unquote(c._expression.name)))
+        return c
+
+    def where(self, condition) -> "FakeDataFrame":
+        mask = self._eval(self._expr(condition))
+        return self._derive(self._frame[mask.fillna(False).astype(bool)])
+
+    filter = where
+
+    def with_column(self, name: str, column) -> "FakeDataFrame":
+        values = self._eval(self._expr(column))
+        return self._derive(self._frame.assign(**{_unquote(col(name)._expression.name): values}))
+
+    def select(self, *cols) -> "FakeDataFrame":
+        if len(cols) == 1 and isinstance(cols[0], (list, tuple)):
+            cols = tuple(cols[0])
+        out = {}
+        for c in cols:
+            expr = self._expr(c)
+            value = self._eval(expr)
+            out[self._output_name(expr)] = value.values if isinstance(value, pd.Series) else value
+        return self._derive(pd.DataFrame(out, index=self._frame.index).reset_index(drop=True))
+
+    def group_by(self, *cols) -> "FakeGroupBy":
+        if len(cols) == 1 and isinstance(cols[0], (list, tuple)):
+            cols = tuple(cols[0])
+        return FakeGroupBy(self, [self._attr(self._expr(c)) for c in cols])
+
+    groupBy = group_by
+
+    def join(self, right: "FakeDataFrame", on, how: str = "inner") -> "FakeDataFrame":
+        expr = self._expr(on)
+        if type(expr).__name__ != "EqualTo":
+            raise NotImplementedError("FakeSession joins support a single equality condition")
+        left_key, right_key = self._attr(expr.left), right._attr(expr.right)
+        suffix = f"__R{next(_counter)}"
+        rename = {c: f"{c}{suffix}" for c in right._frame.columns if c in self._frame.columns}
+        rframe = right._frame.rename(columns=rename)
+        merged = self._frame.merge(rframe, how=how, left_on=left_key, right_on=rename.get(right_key, right_key))
+        refs = dict(self._refs)
+        for key, (e, name) in right._refs.items():
+            refs[key] = (e, rename.get(name, name))
+        return FakeDataFrame(self._session, merged.reset_index(drop=True), refs)
+
+    def order_by(self, *cols) -> "FakeDataFrame":
+        if len(cols) == 1 and isinstance(cols[0], (list, tuple)):
+            cols = tuple(cols[0])
+        names, ascending = [], []
+        for c in cols:
+            expr = self._expr(c)
+            if type(expr).__name__ == "SortOrder":
+                ascending.append(type(expr.direction).__name__ == "Ascending")
+                expr = expr.child
+            else:
+                ascending.append(True)
+            names.append(self._attr(expr))
+        return self._derive(self._frame.sort_values(names, ascending=ascending, kind="stable").reset_index(drop=True))
+
+    sort = order_by
+
+    def limit(self, n: int) -> "FakeDataFrame":
+        return self._derive(self._frame.head(int(n)))
+
+    # -- actions ---------------------------------------------------------------
+    def _result(self) -> pd.DataFrame:
+        self._session._execute(len(self._frame))
+        frame = self._frame.copy()
+        for c in frame.columns:
+            if pd.api.types.is_datetime64_any_dtype(frame[c]):
+                frame[c] = frame[c].dt.date
+        return frame
+
+    def collect(self) -> List[Row]:
+        frame = self._result()
+        names = self.columns
+        return [Row(**dict(zip(names, values))) for values in frame.itertuples(index=False, name=None)]
+
+    def to_pandas(self) -> pd.DataFrame:
+        return self._result()
+
+    def to_arrow(self) -> pa.Table:
+        frame = self._result()
+        return pa.Table.from_pandas(frame, preserve_index=False)
+
+    def count(self) -> int:
+        self._session._execute(len(self._frame))
+        return len(self._frame)
+
+
+class FakeGroupBy:
+    def __init__(self, df: FakeDataFrame, keys: List[str]):
+        self._df = df
+        self._keys = keys
+
+    def agg(self, *exprs) -> FakeDataFrame:
+        if len(exprs) == 1 and isinstance(exprs[0], (list, tuple)):
+            exprs = tuple(exprs[0])
+        df = self._df
+        work = df._frame[self._keys].copy()
+        named = {}
+        for i, c in enumerate(exprs):
+            expr = df._expr(c)
+            fn = expr.child if type(expr).__name__ == "Alias" else expr
+            if type(fn).__name__ != "FunctionExpression" or fn.name.lower() not in _AGGS:
+                raise NotImplementedError(f"FakeSession cannot aggregate {type(fn).__name__}")
+            tmp = f"__agg{i}"
+            work[tmp] = df._eval(fn.children[0])
+            named[df._output_name(expr)] = (tmp, _AGGS[fn.name.lower()])
+        grouped = work.groupby(self._keys, dropna=False, sort=False).agg(**named).reset_index()
+        return df._derive(grouped)
+
+
+class FakeSession:
+    """Thread-safe, pandas-backed Session stand-in with simulated warehouse latency."""
+
+    def __init__(
+        self,
+        tables: Dict[str, pd.DataFrame],
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        seconds_per_mrow: float = 0.0,
+        versions: Dict[str, int] | None = None,
+    ):
+        self._tables = {name.upper(): frame for name, frame in tables.items()}
+        # Change tokens for system$last_change_commit_time; share one dict between sessions and bump it to "modify" a table.
+        self.versions = versions if versions is not None else {}
+        self.latency = latency
+        self.jitter = jitter
+        self.seconds_per_mrow = seconds_per_mrow
+        self.queries = 0
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+
+    def _execute(self, rows: int) -> None:
+        with self._lock:
+            self.queries += 1
+        delay = self.latency + random.uniform(0, self.jitter) + self.seconds_per_mrow * rows / 1e6
+        # Like cancel_all(), only a query that is running when the cancel arrives is aborted.
+        self._cancelled.clear()
+        if delay > 0 and self._cancelled.wait(delay):
+            raise RuntimeError("SQL execution canceled")
+
+    def table(self, name: str) -> FakeDataFrame:
+        try:
+            return FakeDataFrame(self, self._tables[name.upper()])
+        except KeyError:
+            raise KeyError(f"Object '{name}' does not exist or not authorized.")
+
+    def sql(self, query: str) -> FakeDataFrame:
+        text = query.strip().lower()
+        if "current_version" in text:
+            return FakeDataFrame(self, pd.DataFrame({"CURRENT_VERSION()": ["fake-snowpark"]}))
+        if "system$last_change_commit_time" in text:
+            name = query.split("'")[1].upper()
+            return FakeDataFrame(self, pd.DataFrame({"VERSION": [self.versions.get(name, 1)]}))
+        return FakeDataFrame(self, pd.DataFrame({"1": [1]}))
+
+    def cancel_all(self) -> None:
+        self._cancelled.set()
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,56 @@
+import sys
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.analytics import basic_patterns, geo_patterns, rank_geos
+
+
+def _frame():
+    dates = pd.date_range("2020-01-01", periods=28)
+    return pd.DataFrame({
+        "date": list(dates) * 2,
+        "geo": ["A"] * 28 + ["B"] * 28,
+        "value": list(np.arange(28.0)) + [5.0] * 28,
+    })
+
+
+def test_geo_patterns_one_row_per_geo_from_arrow():
+    g = geo_patterns(pa.Table.from_pandas(_frame())).set_index("geo")
+    assert g.loc["A", "total"] == sum(range(28))
+    assert g.loc["A", "avg_7d"] == np.mean(range(21, 28))
+    assert g.loc["A", "growth_7d"] == pytest.approx((sum(range(21, 28)) - sum(range(14, 21))) / sum(range(14, 21)))
+    assert g.loc["B", "growth_14d"] == 0.0
+    assert list(g["trend"]) == ["increasing", "decreasing"]
+
+
+def test_rank_geos_and_single_series_patterns():
+    ranked = rank_geos(geo_patterns(_frame()), sort="avg_7d", top=1)
+    assert [r["geo"] for r in ranked] == ["A"]
+    with pytest.raises(ValueError):
+        rank_geos(geo_patterns(_frame()), sort="worst")
+
+    single = basic_patterns(_frame()[lambda d: d.geo == "B"])
+    assert single["total_cases"] == 140
+    assert single["date_range"] == {"start": "2020-01-01", "end": "2020-01-28"}
+    assert single["growth_7d"] == 0.0
+    assert basic_patterns(pd.DataFrame()) == {}
+
+
+def test_geo_with_only_null_values_is_summarized_with_nulls():
+    table = pa.table({
+        "date": pa.array(pd.date_range("2020-03-01", periods=3).date.tolist() * 2),
+        "geo": ["A"] * 3 + ["B"] * 3,
+        "value": pa.array([1.0, 2.0, 3.0, None, None, None]),
+    })
+    rows = {r["geo"]: r for r in rank_geos(geo_patterns(table), sort="max")}
+    assert rows["A"]["max_cases_in_day"] == 3
+    assert rows["B"]["max_cases_in_day"] is None and rows["B"]["avg_cases_per_day"] is None
+    assert rows["B"]["total_records"] == 3
@@ -0,0 +1,123 @@
+import sys
+import pathlib
+import json
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import nosql
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv("NOSQL_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_tinydb_file_is_migrated_once(store):
+    legacy = {"_default": {
+        "2": {"geo": "LosAngeles", "text": "Spike", "author": "a", "created_at": "2025-08-21T06:59:58.424641Z"},
+        "3": {"geo": "Test", "text": "Hello", "author": "anonymous", "created_at": "2025-08-21T07:04:27Z"},
+    }}
+    (store / "annotations.json").write_text(json.dumps(legacy))
+    items = nosql.list_annotations()
+    assert [i["text"] for i in items] == ["Spike", "Hello"]
+    assert items[1]["created_at"] == "2025-08-21T07:04:27.000000Z"
+    assert nosql.migrate_tinydb() == 0
+    assert len(nosql.list_annotations()) == 2
+
+
+def test_bulk_insert_pagination_and_time_range(store):
+    items = [
+        {"geo": "A" if i % 2 else "B", "text": f"note {i}", "created_at": f"2021-01-{i + 1:02d}T00:00:00Z"}
+        for i in range(20)
+    ]
+    assert nosql.add_annotations(items) == 20
+    with pytest.raises(ValueError):
+        nosql.add_annotations([{"geo": "A"}])
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = nosql.list_annotations_page(geo="A", cursor=cursor, limit=3)
+        seen.extend(page)
+        if cursor is None:
+            break
+    assert [i["text"] for i in seen] == [f"note {i}" for i in range(1, 20, 2)]
+
+    window, cursor = nosql.list_annotations_page(start="2021-01-05T00:00:00Z", end="2021-01-08T00:00:00Z")
+    assert [i["text"] for i in window] == ["note 4", "note 5", "note 6", "note 7"]
+    assert cursor is None
+
+    with pytest.raises(ValueError):
+        nosql.list_annotations_page(cursor="not-a-cursor")
+
+
+def test_only_new_annotations_are_added(store):
+    items = [{"geo": f"G{i % 3}", "text": f"spike {i}"} for i in range(900)]
+    assert len(nosql.add_new_annotations(items[:500])) == 500
+    assert len(nosql.existing_annotations(items)) == 500
+    added = nosql.add_new_annotations(items + items[:10])
+    assert [a["text"] for a in added] == [f"spike {i}" for i in range(500, 900)]
+    assert nosql.add_new_annotations(items) == []
+    assert len(nosql.list_annotations()) == 900
+
+
+def test_add_annotation_returns_id(store):
+    first = nosql.add_annotation(geo="G", text="one")
+    second = nosql.add_annotation(geo="G", text="two", author="me")
+    assert second["id"] > first["id"]
+    assert [i["author"] for i in nosql.list_annotations(geo="G")] == ["anonymous", "me"]
+
+
+class _Client:
+    def __init__(self, polls):
+        self.polls = polls
+
+    async def is_disconnected(self):
+        self.polls -= 1
+        return self.polls < 0
+
+
+def test_stream_resumes_and_pushes_new_annotations(store):
+    import asyncio
+    from app.feed import annotation_events
+
+    first = nosql.add_annotation(geo="A", text="before")
+    nosql.add_annotation(geo="B", text="other geo")
+
+    async def consume():
+        events = []
+        stream = annotation_events(_Client(polls=3), geo="A", last_id=0, poll_seconds=5, heartbeat_seconds=60)
+        events.append(await stream.__anext__())
+        events.append(await stream.__anext__())
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.05)
+        await asyncio.to_thread(nosql.add_annotation, "A", "pushed")
+        events.append(await asyncio.wait_for(pending, timeout=2))
+        await stream.aclose()
+        return events
+
+    retry, resumed, pushed = asyncio.run(consume())
+    assert retry.startswith("retry:")
+    assert resumed.startswith(f"id: {first['id']}\n") and '"text":"before"' in resumed
+    assert '"text":"pushed"' in pushed
+    assert not nosql._listeners
+
+
+def test_annotations_endpoint_returns_everything_unless_paging(store):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    nosql.add_annotations([{"geo": "G", "text": f"n{i}", "created_at": f"2021-01-01T00:{i // 60:02d}:{i % 60:02d}Z"} for i in range(1100)])
+    client = TestClient(app)
+    everything = client.get("/annotations")
+    assert len(everything.json()) == 1100 and "X-Next-Cursor" not in everything.headers
+
+    first = client.get("/annotations", params={"limit": 600})
+    assert len(first.json()) == 600
+    rest = client.get("/annotations", params={"cursor": first.headers["X-Next-Cursor"]})
+    assert [a["text"] for a in first.json() + rest.json()] == [a["text"] for a in everything.json()]
+    assert "X-Next-Cursor" not in rest.headers
@@ -0,0 +1,144 @@
+import sys
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from fake_snowpark import CASES_TABLE, FakeSession, california_tables
+from app import anomalies
+from app.deps import SessionPool, set_session_pool
+from app.main import app
+
+
+def _history(days=120):
+    rng = np.random.default_rng(3)
+    values = rng.poisson(30, (2, days)).astype(float)
+    values[0, 70] = 300.0
+    values[1, 90] = 0.0
+    dates = pd.date_range("2021-01-01", periods=days)
+    return pd.DataFrame({
+        "date": list(dates) * 2,
+        "geo": ["A"] * days + ["B"] * days,
+        "value": values.ravel(),
+    })
+
+
+def test_rolling_scores_match_a_per_window_loop():
+    Y = np.random.default_rng(0).poisson(20, (3, 60)).astype(float)
+    median, scale, z = anomalies.rolling_scores(Y, 14)
+    for r in range(3):
+        for t in range(14, 60):
+            w = Y[r, t - 14:t]
+            m = np.median(w)
+            s = max(anomalies.MAD_SCALE * np.median(np.abs(w - m)), 1.0)
+            assert median[r, t - 14] == m
+            assert z[r, t - 14] == pytest.approx((Y[r, t] - m) / s)
+
+
+def test_spikes_and_drops_are_flagged_per_geo():
+    scores = anomalies.score_history(_history(), ("test", "flag"), window=28)
+    found = anomalies.anomalies(scores, threshold=5).to_pylist()
+    assert [(r["geo"], str(r["date"]), r["kind"]) for r in found] == [
+        ("A", "2021-03-12", "spike"),
+        ("B", "2021-04-01", "drop"),
+    ]
+    assert anomalies.anomalies(scores, threshold=5, since=pd.Timestamp("2021-03-20").date()).num_rows == 1
+    assert scores.filter(pa.compute.is_null(scores["z"])).num_rows == 2 * 28
+
+
+def test_gaps_and_lagging_geos_are_not_drops():
+    full = _history(120)
+    # B stops reporting 10 days early and skips a week; A reports every day.
+    lagging = full[~((full["geo"] == "B") & ((full["date"] >= "2021-04-21") | full["date"].between("2021-02-10", "2021-02-16")))]
+    scores = anomalies.score_history(lagging, ("test", "gaps"), window=28)
+    found = anomalies.anomalies(scores, threshold=5).to_pylist()
+    assert [(r["geo"], str(r["date"]), r["kind"]) for r in found] == [
+        ("A", "2021-03-12", "spike"),
+        ("B", "2021-04-01", "drop"),
+    ]
+    last_b = max(r["date"] for r in scores.to_pylist() if r["geo"] == "B")
+    assert str(last_b) == "2021-04-20" and scores.num_rows == len(lagging)
+
+    # B filling its gaps later rescores from the first filled day; everything before is reused.
+    before = anomalies.anomaly_stats()
+    again = anomalies.score_history(full, ("test", "gaps"), window=28)
+    assert again.num_rows == len(full)
+    assert anomalies.anomaly_stats()["incremental_runs"] == before["incremental_runs"] + 1
+
+
+def test_new_and_revised_days_are_scored_incrementally():
+    full = _history(120)
+    dates, geos, Y = anomalies.to_matrix(full)
+    before = anomalies.anomaly_stats()
+    state = anomalies.update_state(None, dates[:100], geos, Y[:, :100], 28)
+    grown = anomalies.update_state(state, dates, geos, Y, 28)
+    after = anomalies.anomaly_stats()
+    assert after["incremental_runs"] - before["incremental_runs"] == 1
+    assert after["days_scored"] - before["days_scored"] == (100 - 28) + 20
+
+    fresh = anomalies.update_state(None, dates, geos, Y, 28)
+    np.testing.assert_array_equal(grown.z, fresh.z)
+
+    revised = Y.copy()
+    revised[1, 110] = 500.0
+    again = anomalies.update_state(grown, dates, geos, revised, 28)
+    np.testing.assert_array_equal(again.z, anomalies.update_state(None, dates, geos, revised, 28).z)
+    np.testing.assert_array_equal(again.z[:, :110], grown.z[:, :110])
+
+
+def test_truncated_history_moving_forward_reuses_the_overlap():
+    dates, geos, Y = anomalies.to_matrix(_history(120))
+    state = anomalies.update_state(None, dates[:100], geos, Y[:, :100], 28)
+    before = anomalies.anomaly_stats()
+    moved = anomalies.update_state(state, dates[10:101], geos, Y[:, 10:101], 28)
+    assert anomalies.anomaly_stats()["days_scored"] - before["days_scored"] == 1
+    np.testing.assert_array_equal(moved.z[:, :90], state.z[:, 10:])
+    np.testing.assert_array_equal(moved.z[:, -1], anomalies.update_state(None, dates[:101], geos, Y[:, :101], 28).z[:, -1])
+
+
+def test_suggestions_skip_existing_annotations():
+    scores = anomalies.score_history(_history(), ("test", "suggest"), window=28)
+    found = anomalies.anomalies(scores, threshold=5)
+    suggestions = anomalies.suggest_annotations(found, "CASES")
+    assert suggestions[0]["geo"] == "A" and suggestions[0]["text"].startswith("Spike: CASES 300 on 2021-03-12")
+    assert anomalies.suggest_annotations(found, "CASES", existing=suggestions[:1]) == suggestions[1:]
+
+
+@pytest.fixture
+def fake_client(monkeypatch, tmp_path):
+    monkeypatch.setenv("COVID_TABLE", CASES_TABLE)
+    monkeypatch.setenv("NOSQL_DIR", str(tmp_path))
+    monkeypatch.delenv("COVID_SNAPSHOT_DIR", raising=False)
+    tables = california_tables(days=90)
+    previous = set_session_pool(SessionPool(lambda: FakeSession(tables), max_size=2))
+    try:
+        yield TestClient(app)
+    finally:
+        set_session_pool(previous)
+
+
+def test_anomaly_endpoints(fake_client):
+    params = {"value_col": "REPORTED_TESTS", "geo_col": "AREA", "window": 14, "threshold": 2.5}
+    r = fake_client.get("/analytics/anomalies", params=params)
+    assert r.status_code == 200
+    rows = r.json()["anomalies"]
+    assert rows and set(rows[0]) == {"date", "geo", "value", "median", "z", "kind"}
+    assert all(abs(row["z"]) >= 2.5 for row in rows)
+    assert fake_client.get("/analytics/anomalies", params={**params, "window": 1}).status_code == 422
+
+    suggested = fake_client.get("/analytics/anomalies/annotations", params=params).json()["annotations"]
+    assert len(suggested) == len(rows)
+    assert fake_client.post("/analytics/anomalies/annotations", params=params).json()["inserted"] == len(rows)
+    assert fake_client.post("/analytics/anomalies/annotations", params=params).json()["inserted"] == 0
+    assert fake_client.get("/analytics/anomalies/annotations", params=params).json()["annotations"] == []
+    operations = [op["operationId"] for path in app.openapi()["paths"].values() for op in path.values()]
+    assert len(operations) == len(set(operations))
+    assert fake_client.get("/analytics/anomalies/stats").json()["states"] >= 1
@@ -0,0 +1,199 @@
+import sys
+import pathlib
+import threading
+import time
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.cache import TTLCache
+
+
+def test_ttl_expiry_and_sweep():
+    c = TTLCache(sweep_interval=0)
+    c.set("a", 1, ttl_seconds=-1)
+    c.set("b", 2, ttl_seconds=60)
+    assert c.sweep() == 1
+    assert c.get("a") is None
+    assert c.get("b") == 2
+    stats = c.stats()
+    assert stats["entries"] == 1
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_peek_then_compute_counts_one_miss():
+    c = TTLCache(sweep_interval=0)
+    assert c.peek("k") is None
+    assert c.get_or_compute("k", lambda: 1) == (1, False)
+    assert c.peek("k") == 1
+    assert c.peek_all(["k", "other"]) is None
+    assert c.peek_all(["k"]) == [1]
+    stats = c.stats()
+    assert stats["misses"] == 1 and stats["hits"] == 2
+
+
+def test_lru_eviction_by_count_and_bytes():
+    c = TTLCache(max_entries=2, sweep_interval=0)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+    assert c.stats()["evictions"] == 1
+
+    small = TTLCache(max_bytes=10_000, sweep_interval=0)
+    small.set("x", "x" * 6000)
+    small.set("y", "y" * 6000)
+    assert small.get("x") is None
+    assert small.get("y") is not None
+    small.set("huge", "z" * 20_000)
+    assert small.get("huge") is None
+
+
+def test_single_flight_coalesces_concurrent_misses():
+    c = TTLCache(sweep_interval=0)
+    calls = []
+    gate = threading.Event()
+
+    def compute():
+        calls.append(1)
+        gate.wait(2)
+        return [{"date": "2020-01-01", "value": 1}]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(c.get_or_compute("k", compute))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join(2)
+
+    assert len(calls) == 1
+    assert len(results) == 8
+    assert sum(1 for _, cached in results if not cached) == 1
+    assert c.stats()["coalesced_waits"] >= 1
+
+
+def test_waiting_on_a_stuck_computation_times_out():
+    c = TTLCache(sweep_interval=0, wait_timeout=0.05)
+    gate, started = threading.Event(), threading.Event()
+
+    def compute():
+        started.set()
+        gate.wait(2)
+        return 1
+
+    leader = threading.Thread(target=lambda: c.get_or_compute("k", compute))
+    leader.start()
+    assert started.wait(2)
+    with pytest.raises(TimeoutError):
+        c.get_or_compute("k", compute)
+    gate.set()
+    leader.join(2)
+    assert c.stats()["wait_timeouts"] == 1
+    assert c.get_or_compute("k", compute) == (1, True)
+
+
+def test_refreshes_go_to_the_submitter_and_back_off_when_it_is_full():
+    class Full(Exception):
+        retry_after = 60
+
+    submitted = []
+
+    def submit(fn, *args):
+        submitted.append(args[0])
+        if len(submitted) == 1:
+            raise Full()
+        fn(*args)
+
+    c = TTLCache(sweep_interval=0, stale_seconds=60, refresh_submit=submit)
+    c.get_or_compute("k", lambda: len(submitted) + 1, ttl_seconds=-1)
+    assert c.get("k") == 1 and submitted == ["k"]
+    # Rejected: no retry until the submitter's retry_after has passed.
+    assert c.get("k") == 1 and submitted == ["k"]
+    c._data["k"].retry_at = 0
+    assert c.get("k") == 1
+    assert submitted == ["k", "k"] and c.get("k") == 3
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_stale_value_is_served_while_refreshing_in_background():
+    c = TTLCache(sweep_interval=0, stale_seconds=60)
+    version = [0]
+    gate = threading.Event()
+
+    def compute():
+        if version[0]:
+            gate.wait(2)
+        version[0] += 1
+        return version[0]
+
+    assert c.get_or_compute("k", compute, ttl_seconds=-1) == (1, False)
+    # Past the soft TTL: the old value comes back at once and one refresh starts.
+    assert c.get_or_compute("k", compute, ttl_seconds=-1) == (1, True)
+    assert c.get("k") == 1
+    gate.set()
+    assert _wait_for(lambda: c.stats()["refreshes"] == 1)
+    assert c.get("k") == 2
+    stats = c.stats()
+    assert stats["stale_served"] >= 2
+    assert c.refresh_stats()["k"]["refreshes"] == 1
+
+    # Entries without a way to recompute themselves still expire at their TTL.
+    c.set("plain", 1, ttl_seconds=-1)
+    assert c.get("plain") is None
+
+
+def test_failed_refresh_keeps_stale_value_and_backs_off():
+    c = TTLCache(sweep_interval=0, stale_seconds=60, refresh_backoff=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError("warehouse down")
+        return "v1"
+
+    c.get_or_compute("k", compute, ttl_seconds=-1)
+    assert c.get("k") == "v1"
+    assert _wait_for(lambda: c.stats()["refresh_failures"] == 1)
+    assert c.get("k") == "v1"
+    assert len(calls) == 2
+    log = c.refresh_stats()["k"]
+    assert log["failures"] == 1 and log["last_error"] == "warehouse down" and log["stale"]
+
+
+def test_scheduler_refreshes_only_the_most_used_keys_due_soon():
+    c = TTLCache(sweep_interval=0, stale_seconds=60, refresh_interval=10, refresh_top_n=2)
+    computed = []
+
+    def make(key):
+        def compute():
+            computed.append(key)
+            return key
+        return compute
+
+    for key, ttl in (("hot", 5), ("warm", 5), ("cold", 5), ("later", 3600)):
+        c.get_or_compute(key, make(key), ttl_seconds=ttl)
+    for _ in range(5):
+        c.get("hot")
+        c.get("later")
+    for _ in range(3):
+        c.get("warm")
+    c.get("cold")
+    computed.clear()
+
+    assert sorted(c.refresh_hot()) == ["hot"]
+    assert _wait_for(lambda: c.stats()["refreshes"] == 1)
+    assert computed == ["hot"]
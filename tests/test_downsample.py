@@ -0,0 +1,44 @@
+import sys
+import pathlib
+import datetime as dt
+
+import numpy as np
+import pyarrow as pa
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.downsample import downsample_table, lttb_indices, minmax_indices
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[500] = 100.0
+    idx = lttb_indices(x, y, 20)
+    assert len(idx) == 20
+    assert idx[0] == 0 and idx[-1] == 999
+    assert 500 in idx
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_minmax_keeps_bucket_extremes():
+    y = np.array([5, 1, 9, 3, 7, 2, 8, 0], dtype=float)
+    idx = minmax_indices(y, 4)
+    assert set(y[idx]) == {1, 9, 0, 8}
+
+
+def test_downsample_table_per_geo():
+    days = [dt.date(2020, 1, 1) + dt.timedelta(days=i) for i in range(400)]
+    table = pa.table({
+        "date": days * 2,
+        "geo": ["Kern"] * 400 + ["Yolo"] * 400,
+        "value": list(range(400)) + list(range(400, 0, -1)),
+    })
+    out = downsample_table(table, 50)
+    counts = {r["geo"]: r["value_count"] for r in out.group_by("geo").aggregate([("value", "count")]).to_pylist()}
+    assert counts == {"Kern": 50, "Yolo": 50}
+    dates = out["date"].to_pylist()
+    assert dates == sorted(dates)
+    assert downsample_table(table, 5000) is table
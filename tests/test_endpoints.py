@@ -35,13 +35,25 @@ def test_openapi_has_expected_paths(client):
         "/health",
         "/sf/ping",
         "/sf/config",
+        "/sf/pool",
         "/covid/summary",
         "/covid/columns",
+        "/covid/schema",
         "/covid/aggregate",
         "/analytics/summary",
         "/analytics/forecast",
+        "/analytics/anomalies",
+        "/analytics/anomalies/annotations",
         "/annotations",
         "/eda/mobility",
+        "/cache/stats",
+        "/cache/refresh/stats",
+        "/cache/store/stats",
+        "/sf/executor",
+        "/covid/aggregate/batch",
+        "/covid/rollup",
+        "/mobility/stats",
+        "/annotations/stream",
     }
     assert expected.issubset(paths)
 
@@ -99,3 +111,150 @@ def test_eda_mobility(client):
         assert "rows" in r.json()
 
 
+
+
+class _FakeProvider:
+    def aggregate_frame(self, date_col, value_col, geo_col=None, agg="sum", limit=1000, max_points=None, newest=False):
+        import pandas as pd
+        return pd.DataFrame({
+            "date": pd.date_range("2020-03-01", periods=10),
+            "value": [float(i * 3) for i in range(10)],
+        })
+
+
+def test_analytics_uses_in_process_provider(client):
+    from app.data import set_data_provider
+    previous = set_data_provider(_FakeProvider())
+    try:
+        s = client.get("/analytics/summary")
+        assert s.status_code == 200
+        assert s.json()["total_records"] == 10
+        f = client.get("/analytics/forecast", params={"periods": 3})
+        assert f.status_code == 200
+        assert len(f.json()["forecast"]) == 3
+    finally:
+        set_data_provider(previous)
+
+
+class _GeoProvider:
+    def aggregate_frame(self, date_col, value_col, geo_col=None, agg="sum", limit=1000, max_points=None, newest=False):
+        import pandas as pd
+        dates = pd.date_range("2020-03-01", periods=30)
+        return pd.DataFrame({
+            "date": list(dates) * 3,
+            "geo": [g for g in ("Alameda", "Fresno", "Kern") for _ in dates],
+            "value": [float(i + k * 10) for k in range(3) for i in range(30)],
+        })
+
+
+def test_forecast_every_geo_in_one_request(client):
+    from app.data import set_data_provider
+    previous = set_data_provider(_GeoProvider())
+    try:
+        params = {"periods": 4, "value_col": "GEO_TEST", "geo_col": "AREA", "seasonal": True}
+        f = client.get("/analytics/forecast", params=params)
+        assert f.status_code == 200
+        body = f.json()
+        assert not body["cached"]
+        assert {r["geo"] for r in body["forecast"]} == {"Alameda", "Fresno", "Kern"}
+        assert len(body["forecast"]) == 12
+        assert client.get("/analytics/forecast", params=params).json()["cached"]
+        assert client.get("/analytics/forecast", params={**params, "method": "arima"}).status_code == 400
+    finally:
+        set_data_provider(previous)
+
+
+def test_summary_ranks_every_geo(client):
+    from app.data import set_data_provider
+    previous = set_data_provider(_GeoProvider())
+    try:
+        r = client.get("/analytics/summary", params={"value_col": "GEO_TEST", "geo_col": "AREA", "top": 2})
+        assert r.status_code == 200
+        assert [g["geo"] for g in r.json()["geos"]] == ["Kern", "Fresno"]
+        assert client.get("/analytics/summary", params={"geo_col": "AREA", "sort": "worst"}).status_code == 400
+    finally:
+        set_data_provider(previous)
+
+
+def test_aggregate_streaming_formats(client):
+    import datetime as dt
+    import json
+    import pyarrow as pa
+    from app.cache import set_with_ttl
+
+    table = pa.table({
+        "date": [dt.date(2020, 3, 1), dt.date(2020, 3, 2)],
+        "value": [1.5, None],
+    })
+    set_with_ttl("agg:DATE:FMT_TEST:None:sum:5", table, ttl_seconds=60)
+    params = {"date_col": "DATE", "value_col": "FMT_TEST", "limit": 5}
+
+    r = client.get("/covid/aggregate", params={**params, "format": "arrow"})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/vnd.apache.arrow.stream")
+    assert pa.ipc.open_stream(r.content).read_all().equals(table)
+
+    r = client.get("/covid/aggregate", params=params, headers={"Accept": "application/x-ndjson"})
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines == [{"date": "2020-03-01", "value": 1.5}, {"date": "2020-03-02", "value": None}]
+
+    r = client.get("/covid/aggregate", params=params)
+    assert r.json() == {"cached": True, "rows": [{"date": "2020-03-01", "value": 1.5}, {"date": "2020-03-02", "value": None}]}
+
+    r = client.get("/covid/aggregate", params={**params, "orient": "columns"})
+    assert r.json() == {"cached": True, "columns": {"date": ["2020-03-01", "2020-03-02"], "value": [1.5, None]}}
+
+    assert client.get("/covid/aggregate", params={**params, "format": "xml"}).status_code == 400
+    assert client.get("/covid/aggregate", params={**params, "orient": "split"}).status_code == 400
+
+
+def test_conditional_get_and_compression(client):
+    import datetime as dt
+    import pyarrow as pa
+    from app.cache import set_with_ttl
+    from app.data import HttpProvider
+
+    days = [dt.date(2020, 1, 1) + dt.timedelta(days=i) for i in range(400)]
+    table = pa.table({"date": days, "value": [float(i) for i in range(400)]})
+    set_with_ttl("agg:DATE:ETAG_TEST:None:sum:400", table, ttl_seconds=60)
+    params = {"date_col": "DATE", "value_col": "ETAG_TEST", "limit": 400}
+
+    r = client.get("/covid/aggregate", params=params, headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    etag = r.headers["etag"]
+    assert len(r.json()["rows"]) == 400
+
+    # Same content -> same ETag, and a matching If-None-Match gets an empty 304.
+    again = client.get("/covid/aggregate", params=params, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == etag
+    raw = client.get("/covid/aggregate", params=params, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers and raw.headers["etag"] == etag
+
+    arrow = client.get("/covid/aggregate", params={**params, "format": "arrow"}, headers={"Accept-Encoding": "gzip"})
+    assert arrow.headers["etag"] != etag
+    assert pa.ipc.open_stream(arrow.content).read_all().equals(table)
+
+    provider = HttpProvider("http://testserver")
+    provider.http = client
+    first = provider.get_table("/covid/aggregate", **params, format="arrow")
+    assert first.equals(table)
+    assert provider.get_table("/covid/aggregate", **params, format="arrow") is first
+
+    set_with_ttl("agg:DATE:ETAG_TEST:None:sum:400", table.slice(0, 10), ttl_seconds=60)
+    assert provider.get_table("/covid/aggregate", **params, format="arrow").num_rows == 10
+
+
+def test_etag_of_a_slice_hashes_only_the_slice():
+    import pyarrow as pa
+    from app.formats import table_etag
+
+    big = pa.table({"value": pa.array(range(1_000_000), pa.int64()), "name": [str(i % 7) for i in range(1_000_000)]})
+    page = big.slice(500, 20)
+    assert table_etag(page, "json") == table_etag(big.slice(500, 20), "json")
+    assert table_etag(page, "json") != table_etag(big.slice(501, 20), "json")
+    # The page of another parent with the same rows is the same content.
+    other = pa.table({"value": pa.array(range(500, 2000), pa.int64()), "name": [str(i % 7) for i in range(500, 2000)]})
+    assert table_etag(other.slice(0, 20), "json") == table_etag(page, "json")
@@ -0,0 +1,76 @@
+import sys
+import pathlib
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.executor import Overloaded, WarehouseExecutor, set_executor, track_session
+from app.main import app
+
+
+def test_executor_runs_and_rejects_when_full():
+    ex = WarehouseExecutor(max_workers=1, max_queue=1, timeout=2)
+    gate = threading.Event()
+
+    async def scenario():
+        first = asyncio.ensure_future(ex.run(gate.wait, 2))
+        second = asyncio.ensure_future(ex.run(lambda: "queued"))
+        await asyncio.sleep(0.05)
+        with pytest.raises(Overloaded) as info:
+            await ex.run(lambda: "rejected")
+        assert info.value.retry_after >= 1
+        gate.set()
+        return await first, await second
+
+    assert asyncio.run(scenario()) == (True, "queued")
+    stats = ex.stats()
+    assert stats["rejected"] == 1 and stats["submitted"] == 2
+    ex.shutdown()
+
+
+def test_executor_timeout_cancels_tracked_sessions():
+    ex = WarehouseExecutor(max_workers=1, max_queue=0, timeout=0.05)
+    release = threading.Event()
+
+    class FakeSession:
+        cancelled = False
+
+        def cancel_all(self):
+            self.cancelled = True
+            release.set()
+
+    session = FakeSession()
+
+    def slow_query():
+        with track_session(session):
+            release.wait(2)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(ex.run(slow_query))
+    assert session.cancelled
+    assert ex.stats()["timeouts"] == 1
+    ex.shutdown()
+
+
+def test_full_queue_returns_503_with_retry_after():
+    ex = WarehouseExecutor(max_workers=1, max_queue=0, timeout=2)
+    gate = threading.Event()
+    fut, _ = ex.submit(gate.wait, 2)
+    previous = set_executor(ex)
+    try:
+        client = TestClient(app)
+        r = client.get("/covid/columns")
+        assert r.status_code == 503
+        assert int(r.headers["Retry-After"]) >= 1
+        assert client.get("/health").status_code == 200
+    finally:
+        gate.set()
+        fut.result(2)
+        set_executor(previous)
+        ex.shutdown()
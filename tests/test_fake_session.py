@@ -0,0 +1,148 @@
+import sys
+import pathlib
+import datetime as dt
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from fake_snowpark import CASES_TABLE, FakeSession, california_tables
+from app.deps import SessionPool, set_session_pool
+from app.main import app
+
+
+@pytest.fixture
+def fake_client(monkeypatch, tmp_path):
+    monkeypatch.setenv("COVID_TABLE", CASES_TABLE)
+    monkeypatch.setenv("NOSQL_DIR", str(tmp_path))
+    monkeypatch.delenv("COVID_SNAPSHOT_DIR", raising=False)
+    tables = california_tables(days=60)
+    previous = set_session_pool(SessionPool(lambda: FakeSession(tables), max_size=2))
+    try:
+        yield TestClient(app)
+    finally:
+        set_session_pool(previous)
+
+
+def test_warehouse_endpoints_run_against_fake_session(fake_client):
+    assert fake_client.get("/sf/ping").json() == {"snowflake_version": "fake-snowpark"}
+    assert "CASES" in fake_client.get("/covid/columns").json()
+    summary = fake_client.get("/covid/summary", params={"limit": 3}).json()
+    assert len(summary) == 3 and "CASES" in summary[0]
+
+    r = fake_client.get("/covid/aggregate", params={"date_col": "DATE", "value_col": "REPORTED_TESTS", "geo_col": "AREA", "limit": 100000})
+    assert r.status_code == 200
+    rows = r.json()["rows"]
+    assert len(rows) == 60 * 59
+    assert set(rows[0]) == {"date", "geo", "value"}
+
+    m = fake_client.get("/eda/mobility", params={"county": "Fresno", "grain": "week", "columns": ["parks"]})
+    assert m.status_code == 200
+    assert set(m.json()["rows"][0]) == {"WEEK", "WEEKLY_CASES", "PARKS"}
+
+
+def test_aggregate_filters_and_keyset_pages(fake_client):
+    base = {"date_col": "DATE", "value_col": "REPORTED_TESTS", "geo_col": "AREA",
+            "start": "2020-02-10", "end": "2020-03-05", "geo_in": ["Fresno", "Alameda", "Kern"]}
+    full = fake_client.get("/covid/aggregate", params={**base, "limit": 100000})
+    assert full.status_code == 200 and "X-Next-Cursor" not in full.headers
+    rows = full.json()["rows"]
+    assert len(rows) == 25 * 3
+    assert {r["geo"] for r in rows} == {"Fresno", "Alameda", "Kern"}
+    assert rows[0]["date"].startswith("2020-02-10") and rows[-1]["date"].startswith("2020-03-05")
+
+    pages, cursor = [], None
+    while True:
+        r = fake_client.get("/covid/aggregate", params={**base, "limit": 10, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200
+        pages += r.json()["rows"]
+        cursor = r.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert pages == rows
+
+    bad = fake_client.get("/covid/aggregate", params={**base, "cursor": "garbage"})
+    assert bad.status_code == 400
+    no_geo = fake_client.get("/covid/aggregate", params={"date_col": "DATE", "value_col": "CASES", "geo_in": "Kern"})
+    assert no_geo.status_code == 400
+
+
+def test_newest_returns_the_latest_rows_oldest_first(fake_client, monkeypatch):
+    base = {"date_col": "DATE", "value_col": "REPORTED_TESTS", "geo_col": "AREA", "limit": 59 * 3}
+    full = fake_client.get("/covid/aggregate", params={**base, "limit": 100000}).json()["rows"]
+    latest = fake_client.get("/covid/aggregate", params={**base, "newest": True})
+    assert latest.status_code == 200 and "X-Next-Cursor" not in latest.headers
+    assert latest.json()["rows"] == full[-59 * 3:]
+    day = fake_client.get("/covid/aggregate", params={**base, "newest": True, "grain": "month", "limit": 2}).json()["rows"]
+    month = fake_client.get("/covid/aggregate", params={**base, "grain": "month", "limit": 100000}).json()["rows"]
+    assert day == month[-2:]
+    assert fake_client.get("/covid/aggregate", params={**base, "newest": True, "cursor": "x"}).status_code == 400
+    paged = fake_client.get("/covid/aggregate", params=base, headers={"Origin": "https://dashboard.example"})
+    exposed = paged.headers["Access-Control-Expose-Headers"]
+    assert "X-Next-Cursor" in paged.headers and "X-Next-Cursor" in exposed and "ETag" in exposed
+
+    from app import analytics
+    monkeypatch.setattr(analytics, "HISTORY_ROWS", 59 * 20)
+    params = {"value_col": "REPORTED_TESTS", "geo_col": "AREA", "periods": 1}
+    forecast = fake_client.get("/analytics/forecast", params=params)
+    assert forecast.headers["X-History-Truncated"] == "true"
+    last_day = full[-1]["date"][:10]
+    assert {r["date"][:10] for r in forecast.json()["forecast"]} == {
+        (dt.date.fromisoformat(last_day) + dt.timedelta(days=1)).isoformat()
+    }
+    summary = fake_client.get("/analytics/summary", params={"value_col": "REPORTED_TESTS", "geo_col": "AREA"}).json()
+    assert summary["truncated"] and summary["geos"][0]["date_range"]["end"] == last_day
+
+
+def test_cold_requests_count_each_miss_once(fake_client):
+    from app.cache import cache_stats
+
+    def delta(before, field):
+        return cache_stats()[field] - before[field]
+
+    params = {"date_col": "DATE", "value_col": "POSITIVE_TESTS", "limit": 77}
+    before = cache_stats()
+    assert fake_client.get("/covid/aggregate", params=params).status_code == 200
+    assert (delta(before, "misses"), delta(before, "hits")) == (1, 0)
+
+    batch = {"date_col": "DATE", "value_col": ["POSITIVE_TESTS", "DEATHS"], "limit": 77}
+    before = cache_stats()
+    assert fake_client.get("/covid/aggregate/batch", params=batch).status_code == 200
+    assert (delta(before, "misses"), delta(before, "hits")) == (1, 1)
+    before = cache_stats()
+    assert fake_client.get("/covid/aggregate/batch", params=batch).status_code == 200
+    assert (delta(before, "misses"), delta(before, "hits")) == (0, 2)
+
+    # Every peek-then-compute endpoint counts a cold request once and a warm one as a hit.
+    for path, params in (
+        ("/analytics/forecast", {"value_col": "POSITIVE_TESTS", "periods": 3}),
+        ("/analytics/anomalies", {"value_col": "DEATHS", "window": 7}),
+    ):
+        before = cache_stats()
+        assert fake_client.get(path, params=params).status_code == 200
+        # One miss for the result and one for the history it is computed from.
+        assert (delta(before, "misses"), delta(before, "hits")) == (2, 0), path
+        before = cache_stats()
+        assert fake_client.get(path, params=params).status_code == 200
+        assert (delta(before, "misses"), delta(before, "hits")) == (0, 1), path
+
+
+def test_cached_summary_is_served_without_an_executor_slot(fake_client, monkeypatch):
+    from app import main
+
+    for params in ({"value_col": "DEATHS", "geo_col": "AREA", "top": 3}, {"value_col": "DEATHS"}):
+        first = fake_client.get("/analytics/summary", params=params)
+        assert first.status_code == 200
+
+        async def saturated(*args, **kwargs):
+            raise main.HTTPException(status_code=503, detail="Warehouse executor is saturated")
+
+        with monkeypatch.context() as m:
+            m.setattr(main, "run_in_warehouse", saturated)
+            again = fake_client.get("/analytics/summary", params=params)
+        assert again.status_code == 200
+        assert again.json() == {**first.json(), **({"cached": True} if "geo_col" in params else {})}
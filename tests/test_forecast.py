@@ -0,0 +1,92 @@
+import sys
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import forecast
+from app.analytics import simple_forecast
+
+
+def test_holt_extends_a_linear_trend():
+    t = np.arange(120.0)
+    out = forecast.fit_forecast(np.vstack([10 + 2 * t]), periods=5)
+    np.testing.assert_allclose(out[0], 10 + 2 * np.arange(120, 125), rtol=1e-3)
+
+
+def test_weekly_seasonality_is_recovered():
+    t = np.arange(210.0)
+    y = 50 + 10 * np.sin(2 * np.pi * t / 7) + 0.5 * t
+    out = forecast.fit_forecast(np.vstack([y]), periods=7, seasonal=True)
+    future = np.arange(210, 217)
+    np.testing.assert_allclose(out[0], 50 + 10 * np.sin(2 * np.pi * future / 7) + 0.5 * future, atol=0.5)
+
+
+def test_many_geos_match_fitting_each_alone():
+    rng = np.random.default_rng(1)
+    Y = rng.poisson(30, (6, 90)).astype(float)
+    together = forecast.fit_forecast(Y, periods=3, seasonal=True)
+    alone = np.vstack([forecast.fit_forecast(Y[i:i + 1], periods=3, seasonal=True) for i in range(6)])
+    np.testing.assert_allclose(together, alone)
+
+
+def test_forecast_table_per_geo_and_gaps():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2020-01-01", "2020-01-03", "2020-01-01", "2020-01-02", "2020-01-03"]),
+        "geo": ["A", "A", "B", "B", "B"],
+        "value": [1.0, 3.0, 5.0, 4.0, 3.0],
+    })
+    dates, geos, Y = forecast.to_matrix(df)
+    assert geos == ["A", "B"]
+    assert Y.tolist() == [[1.0, 0.0, 3.0], [5.0, 4.0, 3.0]]
+    table = forecast.forecast_table(df, periods=2, method="ses")
+    assert table.column_names == ["date", "geo", "value", "type"]
+    assert table["geo"].to_pylist() == ["A", "A", "B", "B"]
+    assert min(table["value"].to_pylist()) >= 0
+    with pytest.raises(ValueError):
+        forecast.fit_forecast(Y, method="arima")
+
+
+def test_lagging_geo_is_forecast_from_its_own_last_day():
+    days = pd.date_range("2020-01-01", periods=60)
+    df = pd.DataFrame({
+        "date": list(days) + list(days[:50]),
+        "geo": ["A"] * 60 + ["B"] * 50,
+        "value": [100.0] * 110,
+    })
+    table = forecast.forecast_table(df, periods=2, method="ses").to_pylist()
+    by_geo = {g: [r for r in table if r["geo"] == g] for g in ("A", "B")}
+    assert [str(r["date"]) for r in by_geo["A"]] == ["2020-03-01", "2020-03-02"]
+    assert [str(r["date"]) for r in by_geo["B"]] == ["2020-02-20", "2020-02-21"]
+    assert all(r["value"] == pytest.approx(100.0) for r in table)
+
+
+def test_staggered_spans_share_one_pass_and_match_fitting_each_alone():
+    rng = np.random.default_rng(2)
+    days = pd.date_range("2020-01-01", periods=80)
+    spans = {"A": (0, 80), "B": (5, 80), "C": (0, 61), "D": (12, 70), "E": (70, 80)}
+    df = pd.concat([
+        pd.DataFrame({"date": days[lo:hi], "geo": g, "value": rng.poisson(40, hi - lo).astype(float)})
+        for g, (lo, hi) in spans.items()
+    ])
+    df = df.drop(df.index[(df["geo"] == "D") & (df["date"] == days[30])])
+    together = forecast.forecast_table(df, periods=3, seasonal=True).to_pandas()
+    for g in spans:
+        alone = forecast.forecast_table(df[df["geo"] == g], periods=3, seasonal=True).to_pandas()
+        mine = together[together["geo"] == g].reset_index(drop=True)
+        assert (mine["date"] == alone["date"]).all()
+        np.testing.assert_allclose(mine["value"], alone["value"])
+
+
+def test_simple_forecast_leaves_input_alone():
+    df = pd.DataFrame({"date": pd.date_range("2020-01-01", periods=10), "value": np.arange(10.0)})
+    before = df.copy()
+    out = simple_forecast(df, periods=3)
+    pd.testing.assert_frame_equal(df, before)
+    assert list(out.columns) == ["date", "value", "type"]
+    assert out["date"].iloc[0] == pd.Timestamp("2020-01-11")
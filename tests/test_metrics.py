@@ -0,0 +1,43 @@
+import sys
+import pathlib
+
+from fastapi.testclient import TestClient
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import metrics
+from app.main import app
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.Histogram("t_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 5.0):
+        h.observe(v, "a")
+    lines = h.render()
+    assert 't_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="a",le="1"} 2' in lines
+    assert 't_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 't_seconds_count{stage="a"} 3' in lines
+
+
+def test_metrics_endpoint_reports_routes_stages_and_cache():
+    client = TestClient(app)
+    before = metrics.REQUEST_SECONDS.count("/health", "GET", "200")
+    assert client.get("/health").status_code == 200
+    assert metrics.REQUEST_SECONDS.count("/health", "GET", "200") == before + 1
+
+    with metrics.timed("unit_test_stage"):
+        pass
+    metrics.cache_result("agg:DATE:CASES", hit=True)
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    body = r.text
+    assert 'http_request_duration_seconds_count{route="/health",method="GET",status="200"}' in body
+    assert 'http_response_size_bytes_count{route="/health"}' in body
+    assert 'app_stage_duration_seconds_count{stage="unit_test_stage"} 1' in body
+    assert 'app_cache_requests_total{cache="agg",result="hit"}' in body
+    assert 'app_session_pool{field="max_size"}' in body
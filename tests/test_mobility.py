@@ -0,0 +1,171 @@
+import sys
+import pathlib
+import datetime as dt
+import threading
+import time
+from collections import OrderedDict
+
+import pyarrow as pa
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import mobility
+
+
+MONTHS = [dt.date(2020, m, 1) for m in range(1, 13)] + [dt.date(2021, m, 1) for m in range(1, 4)]
+
+
+@pytest.fixture
+def fake_warehouse(monkeypatch):
+    calls = []
+
+    def fetch(q, lo, hi):
+        calls.append((lo, hi))
+        months = [m for m in MONTHS if (lo is None or m >= lo) and (hi is None or m < hi)]
+        return pa.table({
+            q.period_col: pa.array(months, pa.date32()),
+            q.cases_col: [float(len(calls))] * len(months),
+            **{c: [-10.0] * len(months) for c in q.columns},
+        })
+
+    monkeypatch.setattr(mobility, "_fetch", fetch)
+    monkeypatch.setattr(mobility, "_store", OrderedDict())
+    monkeypatch.setattr(mobility, "_stats", {k: 0 for k in mobility._stats})
+    monkeypatch.setattr(mobility, "closed_before", lambda today=None: dt.date(2021, 2, 1))
+    return calls
+
+
+def test_closed_months_are_fetched_once(fake_warehouse, monkeypatch):
+    q = mobility.MobilityQuery()
+    table, cached = mobility.get_mobility_table(q)
+    assert not cached and table.num_rows == len(MONTHS)
+    assert fake_warehouse == [(None, None)]
+
+    table, cached = mobility.get_mobility_table(q)
+    assert cached and len(fake_warehouse) == 1
+
+    # Once the open partitions expire past the stale window only months from the closed boundary are re-queried.
+    monkeypatch.setattr(mobility, "OPEN_TTL", -1.0)
+    monkeypatch.setattr(mobility, "OPEN_STALE", 0.0)
+    table, cached = mobility.get_mobility_table(q)
+    assert not cached
+    assert fake_warehouse[-1] == (dt.date(2021, 2, 1), None)
+    cases = dict(zip(table["MONTH"].to_pylist(), table["MONTHLY_CASES"].to_pylist()))
+    assert cases[dt.date(2020, 6, 1)] == 1.0
+    assert cases[dt.date(2021, 3, 1)] == 2.0
+
+
+def test_stale_open_months_are_served_while_refreshing(fake_warehouse, monkeypatch):
+    q = mobility.MobilityQuery()
+    mobility.get_mobility_table(q)
+    monkeypatch.setattr(mobility, "OPEN_TTL", -1.0)
+
+    gate, fetching = threading.Event(), threading.Event()
+    fetch = mobility._fetch
+
+    def slow_fetch(q, lo, hi):
+        fetching.set()
+        gate.wait(2)
+        return fetch(q, lo, hi)
+
+    monkeypatch.setattr(mobility, "_fetch", slow_fetch)
+    table, cached = mobility.get_mobility_table(q)
+    assert cached and table.num_rows == len(MONTHS)
+    # The peek never waits for the partition lock; once the refresh is querying, it does not hold it.
+    assert fetching.wait(2)
+    assert mobility.peek_mobility_table(q) is not None
+    assert mobility.mobility_stats()["stale_served"] == 2
+
+    gate.set()
+    deadline = time.time() + 2
+    p = mobility._partitions(q)
+    while (p.refreshing or p.lock.locked()) and time.time() < deadline:
+        time.sleep(0.01)
+    assert mobility.mobility_stats()["background_refreshes"] == 1
+    assert fake_warehouse == [(None, None), (dt.date(2021, 2, 1), None)]
+    # Fresh again, so this peek does not start a refresh that would outlive the test.
+    monkeypatch.setattr(mobility, "OPEN_TTL", 600.0)
+    cases = dict(zip(*(mobility.peek_mobility_table(q)[c].to_pylist() for c in ("MONTH", "MONTHLY_CASES"))))
+    assert cases[dt.date(2020, 6, 1)] == 1.0 and cases[dt.date(2021, 3, 1)] == 2.0
+
+
+def test_failed_refresh_keeps_serving_stale_months(fake_warehouse, monkeypatch):
+    q = mobility.MobilityQuery()
+    mobility.get_mobility_table(q)
+    monkeypatch.setattr(mobility, "OPEN_TTL", -1.0)
+
+    def down(q, lo, hi):
+        raise RuntimeError("warehouse unavailable")
+
+    monkeypatch.setattr(mobility, "_fetch", down)
+    table, cached = mobility.get_mobility_table(q)
+    deadline = time.time() + 2
+    while mobility.mobility_stats()["refresh_failures"] < 1 and time.time() < deadline:
+        time.sleep(0.01)
+    table, cached = mobility.get_mobility_table(q)
+    assert cached and table.num_rows == len(MONTHS)
+    assert mobility.mobility_stats()["refresh_failures"] == 1
+
+
+def test_date_range_fetches_only_missing_history(fake_warehouse):
+    q = mobility.MobilityQuery(grain="month", columns=("parks",))
+    table, _ = mobility.get_mobility_table(q, start=dt.date(2020, 10, 15))
+    assert fake_warehouse == [(dt.date(2020, 10, 1), None)]
+    assert table["MONTH"].to_pylist()[0] == dt.date(2020, 11, 1)
+    assert table.column_names == ["MONTH", "MONTHLY_CASES", "PARKS"]
+
+    assert mobility.peek_mobility_table(q, start=dt.date(2020, 11, 1), end=dt.date(2020, 12, 31)).num_rows == 2
+    assert mobility.peek_mobility_table(q, start=dt.date(2020, 1, 1)) is None
+
+    table, cached = mobility.get_mobility_table(q, start=dt.date(2020, 3, 1), end=dt.date(2020, 11, 30))
+    assert not cached
+    assert fake_warehouse[-1] == (dt.date(2020, 3, 1), dt.date(2020, 10, 1))
+    assert table["MONTH"].to_pylist() == MONTHS[2:11]
+
+
+def test_query_parameters_are_validated():
+    with pytest.raises(ValueError):
+        mobility.MobilityQuery(grain="year")
+    with pytest.raises(ValueError):
+        mobility.MobilityQuery(columns=("NIGHTLIFE",))
+    with pytest.raises(ValueError):
+        mobility.MobilityQuery(county="Los Angeles'; drop table x --" + "x" * 80)
+    assert mobility.MobilityQuery(county=" Los Angeles ").county == "Los Angeles"
+
+
+def test_fetch_does_not_block_peeks_and_is_shared(fake_warehouse, monkeypatch):
+    q = mobility.MobilityQuery()
+    gate, started = threading.Event(), threading.Event()
+    fetch = mobility._fetch
+
+    def slow_fetch(q, lo, hi):
+        started.set()
+        gate.wait(2)
+        return fetch(q, lo, hi)
+
+    monkeypatch.setattr(mobility, "_fetch", slow_fetch)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(mobility.get_mobility_table(q))) for _ in range(3)]
+    for t in threads:
+        t.start()
+    assert started.wait(2)
+    began = time.perf_counter()
+    assert mobility.peek_mobility_table(q) is None
+    assert time.perf_counter() - began < 0.5
+    gate.set()
+    for t in threads:
+        t.join(2)
+    assert fake_warehouse == [(None, None)]
+    assert sorted(cached for _, cached in results) == [False, True, True]
+
+
+def test_parameter_sets_are_bounded(fake_warehouse, monkeypatch):
+    monkeypatch.setattr(mobility, "MAX_PARAMETER_SETS", 2)
+    for county in ("Alameda", "Fresno", "Kern"):
+        mobility.get_mobility_table(mobility.MobilityQuery(county=county))
+    assert [e["county"] for e in mobility.mobility_stats()["parameter_sets"]] == ["Fresno", "Kern"]
+    assert mobility.MobilityQuery(columns=()).columns == mobility.DEFAULT_COLUMNS
+    assert mobility.MobilityQuery(county="Alameda") != mobility.MobilityQuery()
@@ -0,0 +1,90 @@
+import sys
+import pathlib
+import datetime as dt
+
+import pyarrow as pa
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.paging import RowFilter, arrow_filter, decode_cursor, encode_cursor, next_cursor, sort_keys
+
+
+def _table():
+    dates = [dt.date(2021, 1, d) for d in (1, 1, 1, 2, 2, 3)]
+    return pa.table({
+        "date": pa.array(dates, pa.date32()),
+        "geo": pa.array(["A", "B", None, "A", "B", "A"]),
+        "value": pa.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0]),
+    })
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    assert decode_cursor(encode_cursor(dt.date(2021, 1, 2), "Fresno")) == (dt.date(2021, 1, 2), "Fresno")
+    assert decode_cursor(encode_cursor("2021-01-02T06:00:00", None)) == (dt.datetime(2021, 1, 2, 6), None)
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor("not-a-cursor")
+
+
+def test_from_params_validates_and_skips_empty_filters():
+    assert RowFilter.from_params() is None
+    with pytest.raises(ValueError):
+        RowFilter.from_params(start=dt.date(2021, 2, 1), end=dt.date(2021, 1, 1))
+    with pytest.raises(ValueError, match="geo_col"):
+        RowFilter.from_params(geo_in=["A"])
+    f = RowFilter.from_params(geo_in=["B", "A", "B"], geo_col="AREA")
+    assert f.geo_in == ("A", "B")
+    assert f.cache_suffix() == RowFilter(geo_in=("A", "B")).cache_suffix()
+
+
+def test_sparse_weekly_data_pages_through_every_row():
+    from app import snapshot
+
+    weeks = [dt.date(2021, 1, 4) + dt.timedelta(weeks=i) for i in range(20)]
+    raw = pa.table({
+        "DATE": pa.array([w for w in weeks for _ in "AB"], pa.date32()),
+        "AREA": pa.array(["A", "B"] * 20),
+        "CASES": pa.array(range(40), pa.int64()),
+    })
+    pages, cursor = [], None
+    while True:
+        f = RowFilter.from_params(start=weeks[0], cursor=cursor, geo_col="AREA")
+        page = snapshot.aggregate("DATE", "CASES", geo_col="AREA", limit=10, table=raw, row_filter=f)
+        assert page.num_rows == 10 or next_cursor(page, 10) is None
+        pages.append(page)
+        cursor = next_cursor(page, 10)
+        if cursor is None:
+            break
+    assert sum(p.num_rows for p in pages) == 40
+
+
+def test_keyset_pages_cover_the_table_once():
+    table = sort_keys(_table())
+    assert table["geo"].to_pylist()[:3] == ["A", "B", None]
+    pages, f, limit = [], RowFilter.from_params(start=dt.date(2021, 1, 1)), 2
+    while True:
+        page = arrow_filter(table, f, "date", "geo").slice(0, limit)
+        pages.append(page)
+        cursor = next_cursor(page, limit)
+        if cursor is None:
+            break
+        f = RowFilter.from_params(start=dt.date(2021, 1, 1), cursor=cursor)
+    assert pa.concat_tables(pages).equals(table)
+
+
+def test_arrow_filter_geo_in_and_date_range():
+    f = RowFilter(start=dt.date(2021, 1, 2), geo_in=("A",))
+    out = arrow_filter(_table(), f, "date", "geo")
+    assert out["value"].to_pylist() == [4.0, 6.0]
+
+
+def test_arrow_filter_coerces_geo_in_to_a_numeric_geo_column():
+    table = _table().set_column(1, "geo", pa.array([90001, 90002, None, 90001, 90002, 90001], pa.int64()))
+    out = arrow_filter(table, RowFilter(geo_in=("90002",)), "date", "geo")
+    assert out["value"].to_pylist() == [2.0, 5.0]
+    after = RowFilter(after=(dt.date(2021, 1, 1), "90001"))
+    assert arrow_filter(table, after, "date", "geo")["value"].to_pylist() == [2.0, 3.0, 4.0, 5.0, 6.0]
+    with pytest.raises(ValueError, match="geo_in"):
+        arrow_filter(table, RowFilter(geo_in=("Fresno",)), "date", "geo")
@@ -0,0 +1,88 @@
+import sys
+import pathlib
+import subprocess
+
+import pyarrow as pa
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from fake_snowpark import CASES_TABLE, FakeSession, california_tables
+from app import result_store
+from app.deps import SessionPool, set_session_pool
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setenv("RESULT_STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setenv("COVID_TABLE", CASES_TABLE)
+    monkeypatch.delenv("COVID_SNAPSHOT_DIR", raising=False)
+    tables, versions, sessions = california_tables(days=60), {}, []
+
+    def factory():
+        sessions.append(FakeSession(tables, versions=versions))
+        return sessions[-1]
+
+    previous = set_session_pool(SessionPool(factory, max_size=2))
+    try:
+        yield versions, (lambda: sum(s.queries for s in sessions)), tmp_path / "store"
+    finally:
+        set_session_pool(previous)
+
+
+def test_results_are_reused_until_the_table_changes(store, monkeypatch):
+    from app.data import _aggregate_compute
+
+    versions, queries, base = store
+    compute = _aggregate_compute("DATE", "CASES", "AREA", "sum", 100000)
+    before = result_store.store_stats()
+
+    first = compute()
+    after_first = queries()
+    # A new process (or a cleared in-memory cache) recomputes through the store, not the warehouse.
+    assert compute().equals(first)
+    assert queries() == after_first
+    stats = result_store.store_stats()
+    assert stats["hits"] - before["hits"] == 1 and stats["writes"] - before["writes"] == 1
+    assert stats["entries"] == 1 and len(list(base.glob("*.arrow"))) == 1
+
+    versions[CASES_TABLE.upper()] = 2
+    monkeypatch.setenv("RESULT_STORE_VERSION_SECONDS", "0")
+    assert compute().equals(first)
+    assert queries() > after_first
+    assert result_store.store_stats()["invalidations"] - before["invalidations"] == 1
+    assert len(list(base.glob("*.arrow"))) == 1
+
+
+def test_store_is_shared_with_other_processes(store):
+    table = pa.table({"date": ["2021-01-01"], "value": [1.0]})
+    key = result_store.fingerprint("aggregate", {"value": "CASES"}, [CASES_TABLE])
+    result_store.put(key, "v1", table)
+    code = (
+        "from app import result_store; "
+        f"t = result_store.get({key!r}, 'v1'); print(t.num_rows, result_store.get({key!r}, 'v2'))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ["1", "None"]
+
+
+def test_eviction_and_failed_version_checks(store, monkeypatch):
+    tables = [pa.table({"value": pa.array(range(1000), pa.int64())}) for _ in range(3)]
+    monkeypatch.setenv("RESULT_STORE_MAX_BYTES", "20000")
+    for i, table in enumerate(tables):
+        result_store.put(f"k{i}", "v", table)
+    assert result_store.get("k0", "v") is None
+    assert result_store.get("k2", "v").equals(tables[2])
+
+    def unreachable(name):
+        raise RuntimeError("warehouse down")
+
+    monkeypatch.setattr(result_store, "_query_version", unreachable)
+    monkeypatch.setenv("RESULT_STORE_VERSION_SECONDS", "0")
+    bypassed = result_store.store_stats()["bypassed"]
+    assert result_store.fetch("aggregate", {}, [CASES_TABLE], lambda: tables[0]) is tables[0]
+    assert result_store.store_stats()["bypassed"] == bypassed + 1
+    assert result_store.clear() >= 1
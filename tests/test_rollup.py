@@ -0,0 +1,95 @@
+import sys
+import pathlib
+import datetime as dt
+
+import pyarrow as pa
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import rollup
+
+
+def _daily():
+    days = [dt.date(2020, 1, 27) + dt.timedelta(days=i) for i in range(10)]
+    return pa.table({
+        "date": days,
+        "sum": [float(i) for i in range(10)],
+        "count": [2] * 10,
+        "min": [0.0] * 10,
+        "max": [float(i) for i in range(10)],
+    })
+
+
+def test_cube_rolls_up_every_grain_exactly():
+    cube = rollup.build_cube(_daily())
+    assert cube["day"].num_rows == 10
+
+    month = rollup.lookup(cube, grain="month", agg="sum").to_pylist()
+    assert month == [
+        {"date": dt.date(2020, 1, 1), "value": sum(range(5))},
+        {"date": dt.date(2020, 2, 1), "value": sum(range(5, 10))},
+    ]
+    week_avg = rollup.lookup(cube, grain="week", agg="avg").to_pylist()
+    assert week_avg[0] == {"date": dt.date(2020, 1, 27), "value": sum(range(7)) / 14}
+    week_max = rollup.lookup(cube, grain="week", agg="max", limit=1).to_pylist()
+    assert week_max == [{"date": dt.date(2020, 1, 27), "value": 6.0}]
+    month_count = rollup.lookup(cube, grain="month", agg="count").to_pylist()
+    assert [r["value"] for r in month_count] == [10, 10]
+    with pytest.raises(ValueError):
+        rollup.lookup(cube, grain="year")
+    with pytest.raises(ValueError):
+        rollup.lookup(cube, agg="median")
+
+
+def test_bounds_inside_a_bucket_select_raw_days():
+    cube = rollup.build_cube(_daily())
+    f = rollup.RowFilter(start=dt.date(2020, 1, 29), end=dt.date(2020, 2, 2))
+    month = rollup.lookup(cube, grain="month", agg="sum", row_filter=f).to_pylist()
+    assert month == [
+        {"date": dt.date(2020, 1, 1), "value": 2.0 + 3.0 + 4.0},
+        {"date": dt.date(2020, 2, 1), "value": 5.0 + 6.0},
+    ]
+    week = rollup.lookup(cube, grain="week", agg="count", row_filter=f).to_pylist()
+    assert [r["value"] for r in week] == [10]
+    aligned = rollup.RowFilter(start=dt.date(2020, 2, 1))
+    assert rollup.lookup(cube, grain="month", row_filter=aligned)["value"].to_pylist() == [sum(range(5, 10))]
+    after = rollup.RowFilter(start=dt.date(2020, 1, 29), after=(dt.date(2020, 1, 1), None))
+    assert rollup.lookup(cube, grain="month", row_filter=after)["value"].to_pylist() == [sum(range(5, 10))]
+
+
+def test_cube_from_snapshot_with_geo(tmp_path, monkeypatch):
+    from app import snapshot
+
+    monkeypatch.setenv("COVID_SNAPSHOT_DIR", str(tmp_path))
+    days = [dt.date(2020, 5, 30) + dt.timedelta(days=i) for i in range(4)]
+    snapshot.write_snapshot(pa.table({
+        "DATE": days * 2,
+        "AREA": ["Kern"] * 4 + ["Yolo"] * 4,
+        "CASES": [1, 2, 3, 4, 10, 20, 30, 40],
+    }))
+    table, cached = rollup.aggregate("DATE", "CASES", geo_col="AREA", grain="month")
+    assert not cached
+    rows = sorted(table.to_pylist(), key=lambda r: (r["date"], r["geo"]))
+    assert rows == [
+        {"date": dt.date(2020, 5, 1), "geo": "Kern", "value": 3},
+        {"date": dt.date(2020, 5, 1), "geo": "Yolo", "value": 30},
+        {"date": dt.date(2020, 6, 1), "geo": "Kern", "value": 7},
+        {"date": dt.date(2020, 6, 1), "geo": "Yolo", "value": 70},
+    ]
+    _, cached = rollup.aggregate("date", "cases", geo_col="area", grain="week")
+    assert cached
+
+
+def test_cubes_are_bounded(tmp_path, monkeypatch):
+    from app import snapshot
+
+    monkeypatch.setenv("COVID_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(rollup, "MAX_CUBES", 1)
+    snapshot.write_snapshot(pa.table({"DATE": [dt.date(2020, 6, 1)], "CASES": [1], "DEATHS": [0]}))
+    rollup.aggregate("DATE", "CASES")
+    rollup.aggregate("DATE", "DEATHS")
+    assert [c["value_col"] for c in rollup.rollup_stats()["cubes"]] == ["DEATHS"]
+    assert rollup.peek_cube("DATE", "CASES") is None
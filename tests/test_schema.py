@@ -0,0 +1,100 @@
+import sys
+import pathlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from fake_snowpark import CASES_TABLE, FakeSession, california_tables
+from app import schema
+from app.deps import SessionPool, set_session_pool
+from app.main import app
+
+
+@pytest.fixture
+def schema_client(monkeypatch, tmp_path):
+    monkeypatch.setenv("COVID_TABLE", CASES_TABLE)
+    monkeypatch.setenv("NOSQL_DIR", str(tmp_path))
+    monkeypatch.delenv("COVID_SNAPSHOT_DIR", raising=False)
+    monkeypatch.setattr(schema, "_schemas", {})
+    tables, sessions = california_tables(days=30), []
+
+    def factory():
+        sessions.append(FakeSession(tables))
+        return sessions[-1]
+
+    previous = set_session_pool(SessionPool(factory, max_size=2))
+    try:
+        yield TestClient(app), (lambda: sum(s.queries for s in sessions))
+    finally:
+        set_session_pool(previous)
+
+
+def test_columns_and_types_are_served_from_the_cache(schema_client):
+    client, queries = schema_client
+    columns = client.get("/covid/columns").json()
+    assert "CASES" in columns and "AREA" in columns
+    after = queries()
+
+    body = client.get("/covid/schema").json()
+    assert body["table"] == CASES_TABLE
+    assert "CASES" in body["numeric"] and "AREA" not in body["numeric"]
+    assert body["date"] == ["DATE"]
+    assert body["columns"]["AREA"] == "string"
+    assert client.get("/covid/columns").json() == columns
+    assert queries() == after
+    assert client.get("/covid/schema", params={"table": "nope"}).status_code == 400
+
+
+def test_bad_columns_are_rejected_before_any_query(schema_client):
+    client, queries = schema_client
+    client.get("/covid/columns")
+    after = queries()
+
+    r = client.get("/covid/aggregate", params={"date_col": "DATE", "value_col": "NOPE"})
+    assert r.status_code == 422
+    assert r.json()["detail"][0]["loc"] == ["query", "value_col"]
+    r = client.get("/covid/aggregate", params={"date_col": "AREA", "value_col": "AREA", "geo_col": "NOPE"})
+    assert r.status_code == 422
+    assert [e["loc"][1] for e in r.json()["detail"]] == ["date_col", "value_col", "geo_col"]
+    r = client.get("/covid/aggregate/batch", params={"date_col": "date", "value_col": ["cases", "NOPE"]})
+    assert r.status_code == 422
+    assert queries() == after
+
+    # Identifiers match case-insensitively, like unquoted Snowflake names.
+    assert client.get("/covid/aggregate", params={"date_col": "date", "value_col": "cases", "limit": 3}).status_code == 200
+    assert schema.schema_stats()["rejected"] >= 3
+
+
+def test_first_request_loads_the_schema_then_validates(schema_client):
+    client, _ = schema_client
+    assert schema.peek_schema(CASES_TABLE) is None
+    schema.validate_aggregate("DATE", ["NOPE"])  # nothing cached yet: no opinion
+    r = client.get("/covid/aggregate", params={"date_col": "DATE", "value_col": "NOPE"})
+    assert r.status_code == 422
+    assert schema.peek_schema(CASES_TABLE) is not None
+    assert schema.refresh_all() == 2  # COVID_TABLE is the cases table here
+
+
+def test_unknown_aggs_are_rejected_with_or_without_a_schema(schema_client):
+    client, queries = schema_client
+    with pytest.raises(schema.ColumnError) as e:
+        schema.validate_aggregate("DATE", ["CASES"], aggs=["sum", "median"])
+    assert [err["loc"] for err in e.value.errors] == [["query", "agg"]]
+    assert queries() == 0
+
+    r = client.get("/covid/aggregate", params={"date_col": "DATE", "value_col": "CASES", "agg": "median"})
+    assert r.status_code == 422
+    assert r.json()["detail"][0]["loc"] == ["query", "agg"]
+    assert client.get("/covid/aggregate", params={"date_col": "DATE", "value_col": "CASES", "agg": "count", "limit": 3}).status_code == 200
+
+
+def test_kinds_come_from_public_snowpark_types():
+    from snowflake.snowpark.types import DecimalType, DoubleType, LongType, StringType
+
+    assert [schema._kind(t) for t in (DecimalType(38, 0), DoubleType(), LongType())] == ["numeric"] * 3
+    assert schema._kind(StringType()) == "string"
@@ -0,0 +1,68 @@
+import sys
+import json
+import pathlib
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.serialize import encode_json, encode_ndjson, json_envelope
+
+
+def _table():
+    return pa.table({
+        "date": [dt.date(2020, 3, 1), dt.date(2020, 3, 2), None],
+        "geo": ["Alameda", 'Quote " and \\ \n', None],
+        "value": [1.5, np.nan, -np.inf],
+        "n": pa.array([1, None, 3], pa.int64()),
+        "ts": pa.array([dt.datetime(2020, 3, 1, 12, 30), None, dt.datetime(2020, 3, 3)], pa.timestamp("ns")),
+    })
+
+
+def test_records_match_json_module_with_nan_as_null():
+    expected = [
+        {"date": "2020-03-01", "geo": "Alameda", "value": 1.5, "n": 1, "ts": "2020-03-01T12:30:00"},
+        {"date": "2020-03-02", "geo": 'Quote " and \\ \n', "value": None, "n": None, "ts": None},
+        {"date": None, "geo": None, "value": None, "n": 3, "ts": "2020-03-03T00:00:00"},
+    ]
+    assert json.loads(encode_json(_table())) == expected
+    chunked = pa.concat_tables([_table().slice(0, 1), _table().slice(1)])
+    assert json.loads(encode_json(chunked)) == expected
+    assert [json.loads(line) for line in encode_ndjson(_table()).splitlines()] == expected
+
+
+def test_columns_orient_and_envelope():
+    out = json.loads(encode_json(_table(), orient="columns"))
+    assert out["value"] == [1.5, None, None]
+    assert out["date"] == ["2020-03-01", "2020-03-02", None]
+    assert json.loads(json_envelope({"cached": True}, "rows", _table().slice(0, 0))) == {"cached": True, "rows": []}
+    with pytest.raises(ValueError):
+        encode_json(_table(), orient="split")
+
+
+def test_dataframes_encode_like_tables():
+    df = pd.DataFrame({
+        "MONTH": pd.to_datetime(["2020-01-01", "2020-02-01"]),
+        "RETAIL": [-10.0, np.nan],
+        "mixed": [{"a": 1}, "text"],
+    })
+    assert json.loads(encode_json(df)) == [
+        {"MONTH": "2020-01-01T00:00:00", "RETAIL": -10.0, "mixed": {"a": 1}},
+        {"MONTH": "2020-02-01T00:00:00", "RETAIL": None, "mixed": "text"},
+    ]
+    assert encode_json(pd.DataFrame()) == b"[]"
+
+
+def test_timezone_aware_timestamps_match_isoformat():
+    moments = [dt.datetime(2020, 3, 1, 12, 30, tzinfo=dt.timezone.utc), dt.datetime(2020, 7, 1, 8, tzinfo=dt.timezone.utc)]
+    for tz in ("UTC", "America/Los_Angeles", "Asia/Kolkata"):
+        table = pa.table({"ts": pa.array(moments, pa.timestamp("us", tz))})
+        expected = [pd.Timestamp(m).tz_convert(tz).isoformat() for m in moments]
+        assert [r["ts"] for r in json.loads(encode_json(table))] == expected
+    assert expected == ["2020-03-01T18:00:00+05:30", "2020-07-01T13:30:00+05:30"]
@@ -0,0 +1,108 @@
+import sys
+import pathlib
+import threading
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.deps import SessionPool
+
+
+class FakeResult:
+    def __init__(self, fail: bool):
+        self.fail = fail
+
+    def collect(self):
+        if self.fail:
+            raise RuntimeError("connection reset")
+        return [(1,)]
+
+
+class FakeSession:
+    def __init__(self):
+        self.closed = False
+        self.broken = False
+
+    def sql(self, query):
+        return FakeResult(self.broken)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeFactory:
+    def __init__(self):
+        self.made = []
+
+    def __call__(self):
+        s = FakeSession()
+        self.made.append(s)
+        return s
+
+
+def test_pool_reuses_sessions():
+    factory = FakeFactory()
+    pool = SessionPool(factory, max_size=2)
+    for _ in range(5):
+        with pool.session() as s:
+            assert isinstance(s, FakeSession)
+    stats = pool.stats()
+    assert len(factory.made) == 1
+    assert stats["created"] == 1
+    assert stats["idle"] == 1
+    assert stats["in_use"] == 0
+    assert stats["acquired"] == 5
+
+
+def test_pool_is_bounded_and_times_out():
+    pool = SessionPool(FakeFactory(), max_size=1, acquire_timeout=0.05)
+    first = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    assert pool.stats()["waits"] == 1
+
+
+def test_pool_waiter_gets_released_session():
+    pool = SessionPool(FakeFactory(), max_size=1, acquire_timeout=2)
+    first = pool.acquire()
+    got = []
+    t = threading.Thread(target=lambda: got.append(pool.acquire()))
+    t.start()
+    pool.release(first)
+    t.join(2)
+    assert got == [first]
+
+
+def test_pool_recycles_broken_and_idle_sessions():
+    factory = FakeFactory()
+    pool = SessionPool(factory, max_size=2, health_check_interval=0)
+    with pool.session() as s:
+        pass
+    s.broken = True
+    with pool.session() as s2:
+        assert s2 is not s
+    assert s.closed
+    assert pool.stats()["failed_health_checks"] == 1
+
+    pool.idle_timeout = 0
+    with pool.session() as s3:
+        assert s3 is not s2
+    assert s2.closed
+
+
+def test_pool_close_shuts_down_idle_sessions():
+    factory = FakeFactory()
+    pool = SessionPool(factory, max_size=2)
+    a = pool.acquire()
+    b = pool.acquire()
+    pool.release(a)
+    pool.close()
+    assert a.closed and not b.closed
+    pool.release(b)
+    assert b.closed
+    with pytest.raises(RuntimeError):
+        pool.acquire()
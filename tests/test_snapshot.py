@@ -0,0 +1,101 @@
+import os
+import sys
+import pathlib
+import subprocess
+import datetime as dt
+
+import pyarrow as pa
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app import snapshot
+
+
+def _table(days, areas=("Alameda", "Fresno")):
+    dates, geos, cases = [], [], []
+    for i, d in enumerate(days):
+        for j, a in enumerate(areas):
+            dates.append(d)
+            geos.append(a)
+            cases.append(i * 10 + j)
+    return pa.table({"DATE": dates, "AREA": geos, "CASES": cases})
+
+
+def test_snapshot_roundtrip_and_local_aggregate(tmp_path):
+    days = [dt.date(2020, 3, 1) + dt.timedelta(days=i) for i in range(3)]
+    path = snapshot.write_snapshot(_table(days), str(tmp_path / "covid.arrow"))
+    table = snapshot.load_snapshot(path)
+    assert table.num_rows == 6
+
+    rows = snapshot.aggregate("date", "cases", table=table).to_pylist()
+    assert rows == [
+        {"date": days[0], "value": 1},
+        {"date": days[1], "value": 21},
+        {"date": days[2], "value": 41},
+    ]
+    by_geo = snapshot.aggregate("DATE", "CASES", geo_col="AREA", agg="max", limit=3, table=table).to_pylist()
+    assert len(by_geo) == 3
+    assert set(by_geo[0]) == {"date", "geo", "value"}
+    assert snapshot.aggregate("DATE", "MISSING", table=table) is None
+    counts = snapshot.aggregate("DATE", "CASES", agg="count", table=table).to_pylist()
+    assert [r["value"] for r in counts] == [2, 2, 2]
+    with pytest.raises(ValueError):
+        snapshot.aggregate("DATE", "CASES", agg="median", table=table)
+
+    from app.paging import RowFilter, encode_cursor
+    after = RowFilter(start=days[1], after=(days[1], "Alameda"))
+    page = snapshot.aggregate("DATE", "CASES", geo_col="AREA", limit=2, table=table, row_filter=after).to_pylist()
+    assert [(r["date"], r["geo"]) for r in page] == [(days[1], "Fresno"), (days[2], "Alameda")]
+    assert RowFilter.from_params(cursor=encode_cursor(days[1], "Alameda")).after == after.after
+
+
+def test_merge_increment_replaces_partial_last_day():
+    days = [dt.date(2020, 3, 1), dt.date(2020, 3, 2)]
+    existing = _table(days)
+    increment = _table([dt.date(2020, 3, 2), dt.date(2020, 3, 3)], areas=("Alameda", "Fresno", "Kern"))
+    merged = snapshot.merge_increment(existing, increment, "DATE", dt.date(2020, 3, 2))
+    assert merged.num_rows == 2 + 6
+    assert snapshot._watermark(merged, "DATE") == dt.date(2020, 3, 3)
+
+
+def test_batched_metrics_cache_each_slice(tmp_path, monkeypatch):
+    from app.data import fetch_metrics_table, peek_aggregate_table
+
+    days = [dt.date(2020, 4, 1) + dt.timedelta(days=i) for i in range(4)]
+    base = _table(days)
+    table = base.append_column("DEATHS", pa.array([c // 2 for c in base["CASES"].to_pylist()]))
+    monkeypatch.setenv("COVID_SNAPSHOT_DIR", str(tmp_path))
+    snapshot.write_snapshot(table)
+
+    combined, cached = fetch_metrics_table("DATE", ["CASES", "DEATHS"], aggs=["sum", "max"], limit=50)
+    assert not cached
+    assert combined.column_names == ["date", "cases_sum", "cases_max", "deaths_sum", "deaths_max"]
+    assert combined["cases_sum"].to_pylist() == [1, 21, 41, 61]
+
+    deaths = peek_aggregate_table("DATE", "DEATHS", agg="max", limit=50)
+    assert deaths.column_names == ["date", "value"]
+    assert deaths["value"].to_pylist() == combined["deaths_max"].to_pylist()
+
+    _, cached = fetch_metrics_table("DATE", ["DEATHS"], aggs=["sum"], limit=50)
+    assert cached
+
+
+@pytest.mark.skipif(snapshot.fcntl is None, reason="needs fcntl")
+def test_one_worker_is_elected_to_refresh(tmp_path, monkeypatch):
+    monkeypatch.setenv("COVID_SNAPSHOT_DIR", str(tmp_path))
+    code = "from app import snapshot; print(snapshot._elect_writer())"
+
+    def other_worker():
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env={**os.environ}, capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+
+    try:
+        assert snapshot._elect_writer() and snapshot._elect_writer()
+        assert snapshot.snapshot_stats()["writer"]
+        assert other_worker() == "False"
+    finally:
+        snapshot._release_writer()
+    assert other_worker() == "True"
@@ -0,0 +1,104 @@
+import sys
+import pathlib
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "benchmarks"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from fake_snowpark import CASES_TABLE, FakeSession, california_tables
+from app import warmup
+from app.deps import SessionPool, set_session_pool
+from app.main import app
+
+
+@pytest.fixture
+def fresh_warmup(monkeypatch, tmp_path):
+    monkeypatch.setenv("COVID_TABLE", CASES_TABLE)
+    monkeypatch.setenv("NOSQL_DIR", str(tmp_path))
+    monkeypatch.delenv("COVID_SNAPSHOT_DIR", raising=False)
+    monkeypatch.setattr(warmup, "_status", {"state": "pending", "started_at": None, "finished_at": None,
+                                            "seconds": None, "imports": {}, "steps": {}, "errors": {}})
+    monkeypatch.setattr(warmup, "_done", threading.Event())
+    monkeypatch.setattr(warmup, "_thread", None)
+    monkeypatch.setattr(warmup, "_retry", None)
+    tables = california_tables(days=60)
+    created = []
+
+    def factory():
+        created.append(FakeSession(tables))
+        return created[-1]
+
+    previous = set_session_pool(SessionPool(factory, max_size=3))
+    try:
+        yield created
+    finally:
+        set_session_pool(previous)
+
+
+def test_warmup_opens_sessions_and_primes_queries(fresh_warmup, monkeypatch):
+    from app.data import peek_aggregate_table
+    from app.mobility import MobilityQuery, peek_mobility_table
+
+    monkeypatch.setenv("WARMUP_MODULES", "json,no_such_module_xyz")
+    monkeypatch.setenv("WARMUP_SESSIONS", "2")
+    monkeypatch.setenv("WARMUP_QUERIES", "mobility,aggregate:DATE:REPORTED_TESTS,bogus")
+    client = TestClient(app)
+    assert client.get("/ready").status_code == 503
+
+    status = warmup.run_warmup()
+    # A bad module or query leaves a cache cold but the worker can serve.
+    assert status["ready"] and status["state"] == "degraded"
+    assert len(fresh_warmup) == 2
+    assert "json" in status["imports"]
+    assert set(status["errors"]) == {"import:no_such_module_xyz", "query:bogus"}
+    assert {"modules", "sessions", "query:mobility", "query:aggregate:DATE:REPORTED_TESTS"} <= set(status["steps"])
+    assert peek_aggregate_table("DATE", "REPORTED_TESTS") is not None
+    assert peek_mobility_table(MobilityQuery()) is not None
+
+    r = client.get("/ready")
+    assert r.status_code == 200
+    assert r.json()["seconds"] is not None
+    assert 'app_warmup_seconds{field="ready"} 1' in client.get("/metrics").text
+    assert client.get("/health").json() == {"status": "ok"}
+
+
+def test_warmup_disabled_is_ready_immediately(fresh_warmup, monkeypatch):
+    monkeypatch.setenv("WARMUP_ENABLED", "0")
+    warmup.start()
+    assert warmup.is_ready()
+    assert fresh_warmup == []
+
+
+def test_worker_without_sessions_is_not_ready_until_the_retry_succeeds(fresh_warmup, monkeypatch):
+    from app.deps import get_session_pool
+
+    down = threading.Event()
+    down.set()
+    pool = get_session_pool()
+    real_acquire = pool.acquire
+
+    def acquire(*args, **kwargs):
+        if down.is_set():
+            raise RuntimeError("warehouse unreachable")
+        return real_acquire(*args, **kwargs)
+
+    monkeypatch.setattr(pool, "acquire", acquire)
+    monkeypatch.setenv("WARMUP_MODULES", "json")
+    monkeypatch.setenv("WARMUP_QUERIES", "")
+    monkeypatch.setenv("WARMUP_RETRY_SECONDS", "0.05")
+    client = TestClient(app)
+
+    status = warmup.run_warmup()
+    assert status["state"] == "failed" and not status["ready"]
+    r = client.get("/ready")
+    assert r.status_code == 503 and r.json()["errors"]["sessions"] == "warehouse unreachable"
+
+    down.clear()
+    warmup._retry.join(timeout=5)
+    r = client.get("/ready")
+    assert r.status_code == 200 and r.json()["state"] == "ready" and r.json()["errors"] == {}